@@ -0,0 +1,188 @@
+import hashlib
+import json
+from flask import Blueprint, abort, current_app, jsonify, request, make_response
+from models import Venue, Artist
+import repository
+import search
+
+#----------------------------------------------------------------------------#
+# JSON API (/api/v1).
+#
+# Read-only JSON views over the same query layer as the HTML pages
+# (repository.py, search.py). Every response carries a strong ETag derived
+# from the row versions it was built from (plus the requested fieldset), and
+# a request whose If-None-Match matches is answered with 304 before any row
+# is serialized. Collections page with opaque keyset cursors (?cursor=) and
+# every resource supports sparse fieldsets (?fields=id,name).
+#----------------------------------------------------------------------------#
+
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+def _genre_names(entity):
+  return [genre.name for genre in entity.genres]
+
+VENUE_FIELDS = {
+  "id": lambda venue: venue.id,
+  "name": lambda venue: venue.name,
+  "city": lambda venue: venue.city,
+  "state": lambda venue: venue.state,
+  "address": lambda venue: venue.address,
+  "phone": lambda venue: venue.phone,
+  "website": lambda venue: venue.website,
+  "facebook_link": lambda venue: venue.facebook_link,
+  "image_link": lambda venue: venue.image_link,
+  "seeking_talent": lambda venue: venue.seeking_talent,
+  "seeking_description": lambda venue: venue.seeking_description,
+  "genres": _genre_names,
+  "upcoming_shows_count": lambda venue: venue.upcoming_shows_count,
+  "past_shows_count": lambda venue: venue.past_shows_count,
+}
+
+ARTIST_FIELDS = {
+  "id": lambda artist: artist.id,
+  "name": lambda artist: artist.name,
+  "city": lambda artist: artist.city,
+  "state": lambda artist: artist.state,
+  "phone": lambda artist: artist.phone,
+  "facebook_link": lambda artist: artist.facebook_link,
+  "image_link": lambda artist: artist.image_link,
+  "genres": _genre_names,
+  "upcoming_shows_count": lambda artist: artist.upcoming_shows_count,
+  "past_shows_count": lambda artist: artist.past_shows_count,
+}
+
+SHOW_FIELDS = {
+  "id": lambda show: show['show_id'],
+  "start_time": lambda show: show['start_time'].isoformat(),
+  "venue_id": lambda show: show['venue_id'],
+  "venue_name": lambda show: show['venue_name'],
+  "artist_id": lambda show: show['artist_id'],
+  "artist_name": lambda show: show['artist_name'],
+  "artist_image_link": lambda show: show['artist_image_link'],
+}
+
+SEARCH_FIELDS = {
+  "id": lambda hit: hit['id'],
+  "name": lambda hit: hit['name'],
+  "num_upcoming_shows": lambda hit: hit['num_upcoming_shows'],
+}
+
+#  Helpers
+#  ----------------------------------------------------------------
+
+def _fieldset(available):
+  requested = request.args.get('fields')
+  if not requested:
+    return sorted(available)
+  fields = [field.strip() for field in requested.split(',') if field.strip()]
+  unknown = [field for field in fields if field not in available]
+  if unknown:
+    abort(make_response(jsonify(error='unknown field(s): ' + ', '.join(unknown)), 400))
+  return fields
+
+def _limit():
+  limit = request.args.get('limit', current_app.config['API_PAGE_SIZE'], type=int)
+  return max(1, min(limit, current_app.config['API_PAGE_SIZE_MAX']))
+
+def _etag(*parts):
+  return hashlib.sha1(json.dumps(parts, default=str).encode()).hexdigest()
+
+def _not_modified(etag):
+  # 304 for a matching If-None-Match, otherwise None.
+  if etag in request.if_none_match:
+    response = make_response('', 304)
+    response.set_etag(etag)
+    return response
+  return None
+
+def _serialize(item, fields, serializers):
+  return dict((field, serializers[field](item)) for field in fields)
+
+def _respond(payload, etag):
+  response = jsonify(payload)
+  response.set_etag(etag)
+  return response
+
+def _entity_collection(model, serializers):
+  fields = _fieldset(serializers)
+  try:
+    versions, next_cursor = repository.entity_versions(model, request.args.get('cursor'), _limit())
+  except ValueError:
+    abort(400)
+  etag = _etag(model.__tablename__, fields, versions, next_cursor)
+  not_modified = _not_modified(etag)
+  if not_modified is not None:
+    return not_modified
+  entities = repository.entities_by_ids(model, [entity_id for entity_id, _ in versions])
+  return _respond({
+    "data": [_serialize(entity, fields, serializers) for entity in entities],
+    "next": next_cursor
+  }, etag)
+
+def _entity(model, entity_id, serializers):
+  fields = _fieldset(serializers)
+  version = repository.entity_version(model, entity_id)
+  if version is None:
+    abort(404)
+  etag = _etag(model.__tablename__, entity_id, fields, version)
+  not_modified = _not_modified(etag)
+  if not_modified is not None:
+    return not_modified
+  entities = repository.entities_by_ids(model, [entity_id])
+  if not entities:
+    abort(404)
+  return _respond({"data": _serialize(entities[0], fields, serializers)}, etag)
+
+#  Endpoints
+#  ----------------------------------------------------------------
+
+@api.route('/venues')
+def venues():
+  return _entity_collection(Venue, VENUE_FIELDS)
+
+@api.route('/venues/<int:venue_id>')
+def venue(venue_id):
+  return _entity(Venue, venue_id, VENUE_FIELDS)
+
+@api.route('/artists')
+def artists():
+  return _entity_collection(Artist, ARTIST_FIELDS)
+
+@api.route('/artists/<int:artist_id>')
+def artist(artist_id):
+  return _entity(Artist, artist_id, ARTIST_FIELDS)
+
+@api.route('/shows')
+def shows():
+  # upcoming shows, optionally narrowed with ?venue_id= or ?artist_id=
+  fields = _fieldset(SHOW_FIELDS)
+  try:
+    data, next_cursor = repository.upcoming_shows_page(
+      after=request.args.get('cursor'), limit=_limit(),
+      venue_id=request.args.get('venue_id', type=int),
+      artist_id=request.args.get('artist_id', type=int))
+  except ValueError:
+    abort(400)
+  etag = _etag('Show', fields, [(show['show_id'], show['versions']) for show in data], next_cursor)
+  not_modified = _not_modified(etag)
+  if not_modified is not None:
+    return not_modified
+  return _respond({
+    "data": [_serialize(show, fields, SHOW_FIELDS) for show in data],
+    "next": next_cursor
+  }, etag)
+
+@api.route('/search/<any(venues, artists):kind>')
+def search_entities(kind):
+  # ranked matches for ?q=; the ETag is taken over the results themselves
+  fields = _fieldset(SEARCH_FIELDS)
+  engine = search.search_venues if kind == 'venues' else search.search_artists
+  results = engine(request.args.get('q', ''), limit=_limit())
+  etag = _etag(kind, fields, results)
+  not_modified = _not_modified(etag)
+  if not_modified is not None:
+    return not_modified
+  return _respond({
+    "count": results['count'],
+    "data": [_serialize(hit, fields, SEARCH_FIELDS) for hit in results['data']]
+  }, etag)
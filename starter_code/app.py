@@ -2,28 +2,61 @@
 # Imports
 #----------------------------------------------------------------------------#
 
+import functools
 import json
+from datetime import datetime, timedelta
 import dateutil.parser
-import babel
-from flask import Flask, render_template, request, Response, flash, redirect, url_for
+import babel.dates
+from flask import Flask, render_template, request, Response, flash, redirect, url_for, abort, jsonify
 from flask_moment import Moment
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 import logging
 from logging import Formatter, FileHandler
-from flask_wtf import Form
+from flask_wtf import FlaskForm
 from forms import *
+from models import *
+import repository
+import search
+import counters
+import genres
+import importer
+import pooling
+import replicas
+import streaming
+import scheduling
+import availability
+import facets
+import autocomplete
+import recommendations
+import reports
+import jobs
+import assets
+from cache import PageCache
+from sqlstats import SQLStats
+from asyncdb import AsyncDB
+from api import api
 #----------------------------------------------------------------------------#
 # App Config.
 #----------------------------------------------------------------------------#
 
 app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'postgres://radovanvitek@localhost:5432/fyurr'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 moment = Moment(app)
 app.config.from_object('config')
-db = SQLAlchemy(app)
+pooling.configure(app)
+replicas.configure(app)
+db.init_app(app)
+pool_metrics = pooling.PoolMetrics(app, db)
+replica_router = replicas.ReplicaRouter(app)
+async_db = AsyncDB(app)
 migrate = Migrate(app, db)
+page_cache = PageCache(app)
+static_assets = assets.Assets(app)
+sql_stats = SQLStats(app)
+app.register_blueprint(api)
+app.register_blueprint(reports.blueprint)
+if app.config['AUTOCOMPLETE_PRELOAD']:
+  autocomplete.preload(app)
 
 # TODO: connect to a local postgresql database
 
@@ -31,138 +64,34 @@ migrate = Migrate(app, db)
 # Models.
 #----------------------------------------------------------------------------#
 
-genre_asoc_venue = db.Table('genre_asoc_venue', 
-  db.Column('Venue_id', db.Integer,db.ForeignKey('Venue.id'),primary_key = True),
-  db.Column('Genre_id', db.Integer, db.ForeignKey('Genre.id'), primary_key = True)
-)
-
-genre_asoc_art = db.Table('genre_asoc_art',
-  db.Column('Aritst_id', db.Integer,db.ForeignKey('Artist.id'),primary_key = True),
-  db.Column('Genre_id', db.Integer, db.ForeignKey('Genre.id'), primary_key = True)
-)
-
-class Venue(db.Model):
-    __tablename__ = 'Venue'
-
-    id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String())  
-    city = db.Column(db.String(120))
-    state = db.Column(db.String(120))
-    address = db.Column(db.String(120))
-    phone = db.Column(db.String(120))
-    image_link = db.Column(db.String(500))
-    facebook_link = db.Column(db.String(120))
-    website = db.Column(db.String(120))
-    seeking_talent = db.Column(db.Boolean, nullable = False,default=False)
-    seeking_description = db.Column(db.String(120))
-    genres = db.relationship('Genre',secondary = genre_asoc_venue, backref= db.backref('venue',lazy = True))
-    shows  = db.relationship('Show', backref= db.backref('venue', lazy = True))
-
-    @property
-    def past_shows(self):
-        now = datetime.now()
-        past_shows = [show for show in self.shows if datetime.strptime(
-            show.start_time, '%Y-%m-%d %H:%M:%S') < now]
-        return past_shows
-
-    @property
-    def upcoming_shows(self):
-        now = datetime.now()
-        future_shows = [show for show in self.shows if datetime.strptime(
-            show.start_time, '%Y-%m-%d %H:%M:%S') > now]
-        return future_shows
-
-    @property
-    def past_shows_count(self):
-        return len(self.past_shows)
-
-    @property
-    def upcoming_shows_count(self):
-        return len(self.upcoming_shows)
-
-
-
-    # TODO: implement any missing fields, as a database migration using Flask-Migrate
-
-class Artist(db.Model):
-    __tablename__ = 'Artist'
-
-    id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String)
-    city = db.Column(db.String(120))
-    state = db.Column(db.String(120))
-    phone = db.Column(db.String(120))
-    genres = db.Column(db.String(120))
-    image_link = db.Column(db.String(500))
-    facebook_link = db.Column(db.String(120))
-    genres = db.relationship('Genre',secondary = genre_asoc_art, backref= db.backref('artist',lazy = True))
-    shows  = db.relationship('Show', backref= db.backref('artist', lazy = True))
-
-    #Used to get show information
-
-    @property
-    def past_shows(self):
-        now = datetime.now()
-        past_shows = [show for show in self.shows if datetime.strptime(
-            show.start_time, '%Y-%m-%d %H:%M:%S') < now]
-        return past_shows
-
-    @property
-    def upcoming_shows(self):
-        now = datetime.now()
-        future_shows = [show for show in self.shows if datetime.strptime(
-            show.start_time, '%Y-%m-%d %H:%M:%S') > now]
-        return future_shows
-
-    @property
-    def past_shows_count(self):
-        return len(self.past_shows)
-
-    @property
-    def upcoming_shows_count(self):
-        return len(self.upcoming_shows)
-
-
-    
-
-
-    
-
-    # TODO: implement any missing fields, as a database migration using Flask-Migrate
-
-# TODO Implement Show and Artist models, and complete all model relationships and properties, as a database migration.
-
-class Genre(db.Model):
-  __tablename__ = 'Genre'
-
-  id = db.Column(db.Integer,primary_key = True)
-  name = db.Column(db.String(120), nullable = False)
-
-
-
-class Show(db.Model):
-    __tablename__ = 'Show'
-    
-    id = db.Column(db.Integer, primary_key=True)
-    start_time = db.Column(db.DateTime, nullable=False)
-
-    artist_id = db.Column(db.Integer, db.ForeignKey('Artist.id'), nullable = False)
-    venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id'), nullable = False)
-
-
-
+# Models live in models.py so the query layer can import them without
+# going through the app module.
 
 #----------------------------------------------------------------------------#
 # Filters.
 #----------------------------------------------------------------------------#
 
+DATETIME_FORMATS = {
+  'full': "EEEE MMMM, d, y 'at' h:mma",
+  'medium': "EE MM, dd, y h:mma"
+}
+
+@functools.lru_cache(maxsize=None)
+def datetime_formatter(locale, pattern, tz):
+  # Babel's locale, pattern and time zone resolved once per combination;
+  # the filter then only applies the parsed pattern.
+  locale = babel.Locale.parse(locale)
+  pattern = babel.dates.parse_pattern(pattern)
+  tz = babel.dates.get_timezone(tz)
+  return lambda value: pattern.apply(value.astimezone(tz), locale)
+
 def format_datetime(value, format='medium'):
-  date = dateutil.parser.parse(value)
-  if format == 'full':
-      format="EEEE MMMM, d, y 'at' h:mma"
-  elif format == 'medium':
-      format="EE MM, dd, y h:mma"
-  return babel.dates.format_datetime(date, format)
+  # start times arrive as aware UTC datetimes; strings are still accepted
+  if isinstance(value, str):
+    value = dateutil.parser.parse(value)
+  formatter = datetime_formatter(app.config['BABEL_DEFAULT_LOCALE'], DATETIME_FORMATS.get(format, format),
+                                 app.config['DISPLAY_TIMEZONE'])
+  return formatter(as_utc(value))
 
 app.jinja_env.filters['datetime'] = format_datetime
 
@@ -179,79 +108,50 @@ def index():
 #  ----------------------------------------------------------------
 
 @app.route('/venues')
+@page_cache.cached('venues')
 def venues():
-  # TODO: replace with real venues data.
-  #       num_shows should be aggregated based on number of upcoming shows per venue.
-  data = []
-  areas = Venue.query.distinct('city','state').all()
-  for area in areas:
-    venues = Venue.query.filter(Venue.city==area.city, Venue.state==area.state)
-    record = [{
-      "city": area.city,
-      "state": area.state,
-      "venues": [{
-        "id": venue.id,
-        "name": venue.name,
-        "num_upcoming_shows": Show.query.filter(Show.venue_id == venue.id, Show.start_time > datetime.utcnow()).count()
-      } for venue in venues]
-    }]
-    data += record
+  # num_upcoming_shows is aggregated in the same query that groups venues by area.
+  data = repository.venue_areas()
   return render_template('pages/venues.html', areas=data)
 
+@app.route('/venues/browse')
+def browse_venues():
+  # venues narrowed by ?genre=&state=&city=&seeking_talent=, with facet counts
+  return browse_response(facets.venues)
+
 @app.route('/venues/search', methods=['POST'])
+@replicas.read_only
 def search_venues():
-  # TODO: implement search on artists with partial string search. Ensure it is case-insensitive.
+  # ranked, case-insensitive search over venue name, genres, city and state.
   # seach for Hop should return "The Musical Hop".
   # search for "Music" should return "The Musical Hop" and "Park Square Live Music & Coffee"
-  data = request.form.get('search_term', '')
-  search_results = Venue.query.filter(Venue.name.ilike('%' + data + '%')).all()
-  response={
-    "count": len(search_results),
-    "data": [{
-      "id": venue.id,
-      "name": venue.name,
-      "num_upcoming_shows": Show.query.filter(Show.venue_id == venue.id, Show.start_time > datetime.utcnow()).count(),
-    } for venue in search_results]
-  }
-  return render_template('pages/search_venues.html', results=response, search_term=request.form.get('search_term', ''))
+  search_term = request.form.get('search_term', '')
+  response = search.search_venues(search_term, limit=app.config['SEARCH_RESULT_LIMIT'])
+  return render_template('pages/search_venues.html', results=response, search_term=search_term)
 
 @app.route('/venues/<int:venue_id>')
+@page_cache.cached('venue:{venue_id}')
 def show_venue(venue_id):
   # shows the venue page with the given venue_id
-  # TODO: replace with real venue data from the venues table, using venue_id
-  venue = Venue.query.filter_by(id=venue_id).first()
-  # use existing dictionary from sqlalchemy object, then add past and upcoming shows
-  data = venue.__dict__
-
-  data_past = []
-  past_shows = Show.query.filter(Show.venue_id == venue_id, Show.start_time < datetime.utcnow()).all()
-  for past_show in past_shows:
-    artist = Artist.query.filter_by(id=past_show.artist_id).first()
-    record = [{
-      "artist_id": artist.id,
-      "artist_name": artist.name,
-      "artist_image_link": artist.image_link,
-      "start_time": str(past_show.start_time)
-    }]
-    data_past += record
-
-  data_upcoming = []
-  upcoming_shows = Show.query.filter(Show.venue_id == venue_id, Show.start_time > datetime.utcnow()).all()
-  for upcoming_show in upcoming_shows:
-    artist = Artist.query.filter_by(id=upcoming_show.artist_id).first()
-    record = [{
-      "artist_id": artist.id,
-      "artist_name": artist.name,
-      "artist_image_link": artist.image_link,
-      "start_time": str(upcoming_show.start_time)
-    }]
-    data_upcoming += record
-
-  data["past_shows"] = data_past
-  data["upcoming_shows"] = data_upcoming
-  data["genres"] = [g.name for g in venue.genres]
+  page = repository.venue_page(venue_id, async_db)
+  if page is None:
+    abort(404)
+  # venue columns, then add genres and past and upcoming shows
+  data, genre_names, past_shows, upcoming_shows = page
+  page_cache.tag(*['artist:{}'.format(show['artist_id']) for show in past_shows + upcoming_shows])
+  data["past_shows"] = past_shows
+  data["upcoming_shows"] = upcoming_shows
+  data["past_shows_count"] = len(past_shows)
+  data["upcoming_shows_count"] = len(upcoming_shows)
+  data["genres"] = genre_names
+  data["suited_artists"] = recommendations.for_subject(
+    venue_id, [recommendations.VENUE_ARTISTS])[recommendations.VENUE_ARTISTS]
   return render_template('pages/show_venue.html', venue=data)
 
+@app.route('/venues/<int:venue_id>/calendar')
+def venue_calendar(venue_id):
+  return calendar_response(Venue, venue_id)
+
 #  Create Venue
 #  ----------------------------------------------------------------
 
@@ -273,10 +173,7 @@ def create_venue_submission():
       venue.seeking_talent=(data['seeking_talent'] == 'y')
     db.session.add(venue)
 
-    genres = data.getlist('genres')
-    for g in genres:
-      genre = Genre.query.filter(Genre.name == g).first()
-      venue.genres.append(genre)
+    venue.genres = genres.registry.resolve(data.getlist('genres'))
 
     db.session.commit()
   except:
@@ -291,6 +188,7 @@ def create_venue_submission():
   else:
     # on successful db insert, flash success
     flash('Venue ' + request.form['name'] + ' was successfully listed!')
+    page_cache.invalidate('venues')
   return render_template('pages/home.html')
 
 @app.route('/venues/<venue_id>', methods=['DELETE'])
@@ -303,7 +201,13 @@ def delete_venue(venue_id):
   
   error = False
   try:
-    Venue.query.filter_by(id=venue_id).delete()
+    venue = Venue.query.filter_by(id=venue_id).first()
+    availability.discard_venue_shows(venue.id)
+    reports.discard_venue_shows(venue.id)
+    counters.discard_venue_shows(venue.id)
+    jobs.enqueue('recommendations.discard_venue', {'venue_id': venue.id},
+                 key='recommendations.discard_venue:{}'.format(venue.id))
+    db.session.delete(venue)
     db.session.commit()
   except:
     error = True
@@ -317,74 +221,105 @@ def delete_venue(venue_id):
   else:
     # on successful db insert, flash success
     flash('Venue was successfully deleted!')
-  return None
+    page_cache.invalidate('venue:{}'.format(venue_id), 'venues', 'shows')
+  return jsonify(success=not error)
 
 #  Artists
 #  ----------------------------------------------------------------
 @app.route('/artists')
+@page_cache.cached('artists')
 def artists():
-  # TODO: replace with real data returned from querying the database
-  data = Artist.query.all()
+  # only the id and name are rendered, so only those are selected
+  if app.config['STREAM_TEMPLATES']:
+    return streaming.render('pages/artists.html',
+                            rows={'artists': repository.iter_artists(app.config['STREAM_YIELD_PER'])})
+  data = repository.artist_list()
   return render_template('pages/artists.html', artists=data)
 
+@app.route('/artists/browse')
+def browse_artists():
+  # artists narrowed by ?genre=&state=&city=, with facet counts
+  return browse_response(facets.artists)
+
+def browse_response(index):
+  # Repeat a parameter to select several values of a facet (OR); different
+  # facets combine with AND.
+  filters = {facet: request.args.getlist(facet) for facet in index.kind.facets if facet in request.args}
+  if 'seeking_talent' in filters:
+    filters['seeking_talent'] = [value.lower() in ('1', 'y', 'true') for value in filters['seeking_talent']]
+  limit = request.args.get('limit', app.config['BROWSE_PAGE_SIZE'], type=int)
+  limit = max(1, min(limit, app.config['BROWSE_PAGE_SIZE_MAX']))
+  offset = max(0, request.args.get('offset', 0, type=int))
+  return jsonify(index.browse(filters, offset, limit))
+
+@app.route('/autocomplete')
+def autocomplete_suggestions():
+  # typeahead suggestions for ?q=, optionally only of ?type=venue|artist|city|genre
+  # (repeatable), from the in-process prefix index
+  types = [name for name in request.args.getlist('type') if name in autocomplete.TYPES] or None
+  limit = request.args.get('limit', app.config['AUTOCOMPLETE_LIMIT'], type=int)
+  limit = max(1, min(limit, app.config['AUTOCOMPLETE_LIMIT_MAX']))
+  query = request.args.get('q', '')
+  return jsonify({"query": query, "suggestions": autocomplete.suggest(query, types, limit)})
+
 @app.route('/artists/search', methods=['POST'])
+@replicas.read_only
 def search_artists():
-  # TODO: implement search on artists with partial string search. Ensure it is case-insensitive.
+  # ranked, case-insensitive search over artist name, genres, city and state.
   # seach for "A" should return "Guns N Petals", "Matt Quevado", and "The Wild Sax Band".
   # search for "band" should return "The Wild Sax Band".
-  data = request.form.get('search_term', '')
-  search_results = Artist.query.filter(Artist.name.ilike('%' + data + '%')).all()
-  response={
-    "count": len(search_results),
-    "data": [{
-      "id": artist.id,
-      "name": artist.name,
-      "num_upcoming_shows": Show.query.filter(Show.artist_id == artist.id, Show.start_time > datetime.utcnow()).count(),
-    } for artist in search_results]
-  }
-  return render_template('pages/search_artists.html', results=response, search_term=request.form.get('search_term', ''))
+  search_term = request.form.get('search_term', '')
+  response = search.search_artists(search_term, limit=app.config['SEARCH_RESULT_LIMIT'])
+  return render_template('pages/search_artists.html', results=response, search_term=search_term)
 
 @app.route('/artists/<int:artist_id>')
+@page_cache.cached('artist:{artist_id}')
 def show_artist(artist_id):
-  # shows the venue page with the given venue_id
-  # TODO: replace with real venue data from the venues table, using venue_id
-  artist = Artist.query.filter_by(id=artist_id).first()
-  data = artist.__dict__
-  
-  data_past = []
-  past_shows = Show.query.filter(Show.artist_id==artist_id, Show.start_time < datetime.utcnow()).all()
-  past_shows_cnt = len(past_shows)
-  for past_show in past_shows:
-    venue = Venue.query.filter_by(id=past_show.venue_id).first()
-    record = {
-      "venue_id": venue.id,
-      "venue_name": venue.name,
-      "venue_image_link": venue.image_link,
-      "start_time": str(past_show.start_time)
-    }
-    data_past.append(record)
-
-  data_upcoming = []
-  upcoming_shows = Show.query.filter(Show.artist_id==artist_id, Show.start_time > datetime.utcnow()).all()
-  upcoming_shows_cnt = len(upcoming_shows)
-  for upcoming_show in upcoming_shows:
-    venue = Venue.query.filter_by(id=upcoming_show.venue_id).first()
-    record = {
-      "venue_id": venue.id,
-      "venue_name": venue.name,
-      "venue_image_link": venue.image_link,
-      "start_time": str(past_show.start_time)
-    }
-    data_upcoming.append(record)
-
-  data["past_shows"] = data_past
-  data["upcoming_shows"] = data_upcoming
-  data["past_shows_count"] = past_shows_cnt
-  data["upcoming_shows_count"] = upcoming_shows_cnt
-  data["genres"] = [genre.name for genre in artist.genres]
+  # shows the artist page with the given artist_id
+  page = repository.artist_page(artist_id, async_db)
+  if page is None:
+    abort(404)
+  data, genre_names, past_shows, upcoming_shows = page
+  page_cache.tag(*['venue:{}'.format(show['venue_id']) for show in past_shows + upcoming_shows])
+  data["past_shows"] = past_shows
+  data["upcoming_shows"] = upcoming_shows
+  data["past_shows_count"] = len(past_shows)
+  data["upcoming_shows_count"] = len(upcoming_shows)
+  data["genres"] = genre_names
+  recommended = recommendations.for_subject(
+    artist_id, [recommendations.SIMILAR_ARTISTS, recommendations.ARTIST_VENUES])
+  data["similar_artists"] = recommended[recommendations.SIMILAR_ARTISTS]
+  data["suited_venues"] = recommended[recommendations.ARTIST_VENUES]
 
   return render_template('pages/show_artist.html', artist=data)
 
+@app.route('/artists/<int:artist_id>/calendar')
+def artist_calendar(artist_id):
+  return calendar_response(Artist, artist_id)
+
+def calendar_response(model, entity_id):
+  # Booked and free days of a venue/artist for ?month=YYYY-MM (default: this
+  # month) or ?start=YYYY-MM-DD&end=YYYY-MM-DD, from the day buckets.
+  try:
+    if 'start' in request.args or 'end' in request.args:
+      first = datetime.strptime(request.args['start'], '%Y-%m-%d').date()
+      last = datetime.strptime(request.args['end'], '%Y-%m-%d').date()
+    else:
+      month = datetime.strptime(request.args.get('month') or utcnow().strftime('%Y-%m'), '%Y-%m')
+      first, last = availability.month_range(month.year, month.month)
+  except (KeyError, ValueError):
+    abort(400)
+  if not 0 <= (last - first).days < app.config['CALENDAR_MAX_DAYS']:
+    abort(400)
+  if db.session.query(model.id).filter_by(id=entity_id).scalar() is None:
+    abort(404)
+  booked = availability.booked_days(model, entity_id, first, last)
+  days = [first + timedelta(days=n) for n in range((last - first).days + 1)]
+  return jsonify(
+    id=entity_id, start=first.isoformat(), end=last.isoformat(), timezone=app.config['DISPLAY_TIMEZONE'],
+    booked=[{"date": day.isoformat(), "shows": shows} for day, shows in booked.items()],
+    free=[day.isoformat() for day in days if day not in booked])
+
 #  Update
 #  ----------------------------------------------------------------
 @app.route('/artists/<int:artist_id>/edit', methods=['GET'])
@@ -412,12 +347,9 @@ def edit_artist_submission(artist_id):
     artist.seeking_venue = (data['seeking_venue'] == 'y')
     artist.seeking_description = data['seeking_description']
     
-    artist.genres = []
-
-    genres = data.getlist('genres')
-    for g in genres:
-      genre = Genre.query.filter(Genre.name == g).first()
-      artist.genres.append(genre)
+    before = [genre.id for genre in artist.genres]
+    artist.genres = genres.registry.resolve(data.getlist('genres'))
+    reports.artist_genres_changed(artist.id, before, [genre.id for genre in artist.genres])
 
     db.session.commit()
   except:
@@ -432,6 +364,7 @@ def edit_artist_submission(artist_id):
   else:
     # on successful db insert, flash success
     flash('Artist ' + data['name'] + ' was successfully edited!')
+    page_cache.invalidate('artist:{}'.format(artist_id), 'artists')
 
   return redirect(url_for('show_artist', artist_id=artist_id))
 
@@ -463,13 +396,9 @@ def edit_venue_submission(venue_id):
       venue.seeking_description = data['seeking_description']
     else:
       venue.seeking_talent = False
-      venue.seeking_description = []
+      venue.seeking_description = None
     
-    venue.genres = []
-    genres = data.getlist('genres')
-    for g in genres:
-      genre = Genre.query.filter(Genre.name == g).first()
-      venue.genres.append(genre)
+    venue.genres = genres.registry.resolve(data.getlist('genres'))
 
     db.session.commit()
   except:
@@ -484,6 +413,7 @@ def edit_venue_submission(venue_id):
   else:
     # on successful db insert, flash success
     flash('Venue ' + data['name'] + ' was successfully edited!')
+    page_cache.invalidate('venue:{}'.format(venue_id), 'venues')
   return redirect(url_for('show_venue', venue_id=venue_id))
 
 #  Create Artist
@@ -514,11 +444,7 @@ def create_artist_submission():
 
     db.session.add(artist)
 
-    genres = data.getlist('genres')
-    
-    for new_gens in genres:
-      genre = Genre.query.filter(Genre.name == new_gen).first()
-      artist.genres.append(genre)
+    artist.genres = genres.registry.resolve(data.getlist('genres'))
 
     db.session.commit()
 
@@ -534,6 +460,7 @@ def create_artist_submission():
   else:
     # on successful db insert, flash success
     flash('Artist ' + data['name'] + ' was successfully listed!')
+    page_cache.invalidate('artists')
   return render_template('pages/home.html')
 
 
@@ -541,23 +468,33 @@ def create_artist_submission():
 #  ----------------------------------------------------------------
 
 @app.route('/shows')
+@page_cache.cached('shows')
 def shows():
-  # displays list of shows at /shows
-  # TODO: replace with real venues data.
-  #       num_shows should be aggregated based on number of upcoming shows per venue.
-  data = []
-  shows = Show.query.filter((Show.start_time > datetime.utcnow())).all()
-  for show in shows:
-    record = {
-      "venue_id": show.venue_id,
-      "venue_name": Venue.query.filter_by(id=show.venue_id).first().name,
-      "artist_id": show.artist_id,
-      "artist_name": Artist.query.filter_by(id=show.artist_id).first().name,
-      "artist_image_link": Artist.query.filter_by(id=show.artist_id).first().image_link,
-      "start_time": str(show.start_time)
-    }
-    data.append(record)
-  return render_template('pages/shows.html', shows=data)
+  # displays list of upcoming shows at /shows, one keyset page at a time.
+  # ?after=<cursor> continues from a previous page; ?format=json returns the
+  # same page as JSON for infinite scroll.
+  limit = min(request.args.get('limit', app.config['SHOWS_PAGE_SIZE'], type=int), app.config['SHOWS_PAGE_SIZE_MAX'])
+  if app.config['STREAM_TEMPLATES'] and request.args.get('format') != 'json':
+    try:
+      page = repository.UpcomingShowsStream(after=request.args.get('after'), limit=max(limit, 1),
+                                            yield_per=app.config['STREAM_YIELD_PER'])
+    except ValueError:
+      abort(400)
+    return streaming.render('pages/shows.html', rows={'shows': page})
+
+  try:
+    data, next_cursor = repository.upcoming_shows_page(after=request.args.get('after'), limit=max(limit, 1))
+  except ValueError:
+    abort(400)
+  page_cache.tag(*['venue:{}'.format(show['venue_id']) for show in data])
+  page_cache.tag(*['artist:{}'.format(show['artist_id']) for show in data])
+
+  if request.args.get('format') == 'json':
+    for show in data:
+      show['start_time'] = show['start_time'].isoformat()
+    return jsonify(shows=data, next=next_cursor)
+
+  return render_template('pages/shows.html', shows=data, next_cursor=next_cursor)
 
 @app.route('/shows/create')
 def create_shows():
@@ -577,24 +514,73 @@ def create_show_submission():
   # see: http://flask.pocoo.org/docs/1.0/patterns/flashing/
 
   error = False
+  conflicts = []
   try:
     data = request.form
-    show = Show(artist_id=data['artist_id'], venue_id=data['venue_id'], start_time=data['start_time'])
-    db.session.add(show)
-    db.session.commit()
-  except:
-    error = True
+    start_time = as_utc(dateutil.parser.parse(data['start_time']))
+    end_time = scheduling.show_end(start_time, dateutil.parser.parse(data['end_time']) if data.get('end_time') else None)
+    problem = scheduling.check_times(start_time, end_time)
+    if problem is not None:
+      raise ValueError(problem)
+    # double bookings of the venue or the artist
+    conflicts = scheduling.find_conflicts(data['venue_id'], data['artist_id'], start_time, end_time)
+    if not conflicts:
+      show = Show(artist_id=data['artist_id'], venue_id=data['venue_id'], start_time=start_time, end_time=end_time)
+      db.session.add(show)
+      counters.record_show(show.venue_id, show.artist_id, show.start_time)
+      availability.record_show(show.venue_id, show.artist_id, start_time, end_time)
+      reports.record_show(show.venue_id, show.artist_id, start_time, end_time)
+      db.session.commit()
+  except Exception as e:
     db.session.rollback()
+    if scheduling.is_conflict_error(e):
+      # booked concurrently, caught by the exclusion constraints
+      conflicts = scheduling.find_conflicts(data['venue_id'], data['artist_id'], start_time, end_time)
+    error = True
   finally:
     db.session.close()
+  if conflicts:
+    flash('Show could not be listed: it overlaps {}.'.format('; '.join(
+      '{} at {} ({} to {})'.format(conflict['artist_name'], conflict['venue_name'],
+                                   format_datetime(conflict['start_time']), format_datetime(conflict['end_time']))
+      for conflict in conflicts)))
+    return render_template('forms/new_show.html', form=ShowForm(request.form)), 409
   if error:
     # on unsuccessful db insert, flash error
     flash('An error occurred. Show could not be listed.')
   else:
     # on successful db insert, flash success
     flash('Show was successfully listed!')
+    page_cache.invalidate('venue:' + data['venue_id'], 'artist:' + data['artist_id'], 'venues', 'shows')
   return render_template('pages/home.html')
 
+@app.route('/cache/stats')
+def cache_stats():
+  # hit/miss counters of this worker's page cache
+  return jsonify(page_cache.stats())
+
+@app.route('/db/pool')
+def db_pool_stats():
+  # connection pool counters and utilization of this worker
+  return jsonify(pool_metrics.stats())
+
+#  CLI
+#  ----------------------------------------------------------------
+
+app.cli.add_command(counters.cli)
+app.cli.add_command(genres.cli)
+app.cli.add_command(importer.cli)
+app.cli.add_command(assets.cli)
+app.cli.add_command(availability.cli)
+app.cli.add_command(recommendations.cli)
+app.cli.add_command(reports.cli)
+app.cli.add_command(jobs.cli)
+
+@app.cli.command('search-reindex')
+def search_reindex():
+  # flask search-reindex: rebuild every venue/artist search document.
+  search.rebuild_search_vectors()
+
 @app.errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
@@ -619,6 +605,7 @@ if not app.debug:
 #----------------------------------------------------------------------------#
 
 # Default port:
+# (for the ASGI deployment, run asgi.py under uvicorn instead)
 if __name__ == '__main__':
     app.run()
 
@@ -0,0 +1,34 @@
+from concurrent.futures import ThreadPoolExecutor
+from asgiref.sync import async_to_sync, sync_to_async
+from asgiref.wsgi import WsgiToAsgi
+from app import app
+
+#----------------------------------------------------------------------------#
+# ASGI entry point.
+#
+#   ASYNC_QUERIES=1 uvicorn asgi:application --workers 4
+#
+# Runs the app under an ASGI server. Connections, keep-alive and slow
+# request bodies are handled by the server's event loop. The app itself is
+# still WSGI: each request's view runs in a worker thread, ASGI_THREADS of
+# them at once per process, so a worker serves about as many requests at a
+# time as a threaded WSGI server with that many threads. With ASYNC_QUERIES
+# on, the detail pages also run their queries concurrently (see asyncdb.py).
+#
+# asgiref's WsgiToAsgi runs the app with sync_to_async's thread-sensitive
+# default, i.e. on one shared thread, one request at a time per worker.
+# ThreadedWsgiToAsgi hands each request to a thread of its own pool first;
+# the thread-sensitive call inside then runs the app on that thread.
+#----------------------------------------------------------------------------#
+
+
+class ThreadedWsgiToAsgi(object):
+
+  def __init__(self, wsgi_application, threads):
+    self._run = sync_to_async(async_to_sync(WsgiToAsgi(wsgi_application)), thread_sensitive=False,
+                              executor=ThreadPoolExecutor(threads, thread_name_prefix='asgi'))
+
+  async def __call__(self, scope, receive, send):
+    await self._run(scope, receive, send)
+
+application = ThreadedWsgiToAsgi(app, app.config['ASGI_THREADS'])
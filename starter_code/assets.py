@@ -0,0 +1,256 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+import shutil
+import click
+from flask import current_app, abort, request, send_from_directory, url_for
+from flask.cli import AppGroup
+
+#----------------------------------------------------------------------------#
+# Static asset pipeline.
+#
+# "flask assets build" writes a production copy of static/ to static/dist:
+#
+#   * the stylesheets and scripts in BUNDLES are concatenated and minified
+#     into one file per bundle, so a page loads three files instead of nine;
+#   * every file is fingerprinted: a hash of its contents goes in the name
+#     (main.3f9c2a1b7e04.css), and url() references in stylesheets are
+#     rewritten to the fingerprinted names;
+#   * text files are precompressed next to the original (.gz, and .br when
+#     the brotli package is installed);
+#   * manifest.json maps each source name to its fingerprinted name.
+#
+# With USE_BUILT_ASSETS on, templates link to the fingerprinted files under
+# ASSETS_URL_PATH. They never change under a given name, so they are served
+# with an immutable one-year Cache-Control. Repeat page loads then come from
+# the browser cache without even a revalidation request, and a deploy that
+# changes a file changes its name. Without a build, asset_url() and
+# asset_urls() fall back to the plain /static files, so development needs no
+# build step.
+#
+# A front-end server can serve static/dist itself (nginx: gzip_static,
+# brotli_static and the same Cache-Control).
+#----------------------------------------------------------------------------#
+
+# Bundle name -> source files under static/, in load order.
+BUNDLES = {
+  'css/site.css': [
+    'css/bootstrap.min.css',
+    'css/layout.main.css',
+    'css/main.css',
+    'css/main.responsive.css',
+    'css/main.quickfix.css',
+  ],
+  # loaded in <head>, before the page renders
+  'js/head.js': [
+    'js/libs/modernizr-2.8.2.min.js',
+    'js/libs/moment.min.js',
+  ],
+  # deferred; needs jQuery, which main.html loads first
+  'js/site.js': [
+    'js/libs/bootstrap-3.1.1.min.js',
+    'js/plugins.js',
+    'js/script.js',
+  ],
+}
+
+DIST = 'dist'
+MANIFEST = 'manifest.json'
+COMPRESSIBLE = ('.css', '.js', '.json', '.svg', '.txt', '.eot', '.ttf', '.otf')
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+# A comment (group 1), or a string or url(...) (group 2) to copy verbatim
+CSS_VERBATIM = re.compile(r'''(/\*.*?\*/)|(url\(\s*(?:"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*'|[^)]*)\s*\)|"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')''', re.S | re.I)
+CSS_URL = re.compile(r'''url\(\s*(['"]?)([^'")]+)\1\s*\)''')
+SOURCE_MAP = re.compile(r'^\s*//[#@] sourceMappingURL=.*$', re.M)
+
+#  Minification
+#  ----------------------------------------------------------------
+
+def _squeeze_css(text):
+  text = re.sub(r'\s+', ' ', text)
+  # no space before ':' -- "a :hover" and "a:hover" are different selectors
+  text = re.sub(r'\s*([{};,>])\s*', r'\1', text)
+  text = re.sub(r':\s+', ':', text)
+  return text.replace(';}', '}')
+
+def minify_css(text):
+  # Drop comments and squeeze whitespace, but copy strings and url(...)
+  # as they are: content: " : " and data: urls must survive unchanged.
+  parts, pending, position = [], [], 0
+  for match in CSS_VERBATIM.finditer(text):
+    pending.append(text[position:match.start()])
+    position = match.end()
+    if match.group(2):
+      parts.append(_squeeze_css(''.join(pending)))
+      parts.append(match.group(2))
+      pending = []
+  pending.append(text[position:])
+  parts.append(_squeeze_css(''.join(pending)))
+  return ''.join(parts).strip()
+
+def minify_js(text):
+  # Source map comments point at the unfingerprinted names; drop them. The
+  # libraries are shipped minified already; our own scripts go through
+  # rjsmin when it is installed.
+  text = SOURCE_MAP.sub('', text)
+  try:
+    import rjsmin
+  except ImportError:
+    return text.strip()
+  return rjsmin.jsmin(text)
+
+#  Build
+#  ----------------------------------------------------------------
+
+def fingerprinted(name, content):
+  root, ext = posixpath.splitext(name)
+  return '{}.{}{}'.format(root, hashlib.sha256(content).hexdigest()[:12], ext)
+
+def rewrite_css_urls(text, name, manifest, base=None):
+  # Point url() references at the fingerprinted files. Relative urls are
+  # resolved against `name`, the file the stylesheet was read from, and made
+  # relative to `base`, the file it is written into (default: the same).
+  base = base or name
+  def replace(match):
+    url = match.group(2)
+    path, suffix = re.match(r'([^?#]*)(.*)', url).groups()
+    if '//' in path or path.startswith(('/', 'data:')):
+      return match.group(0)
+    source = posixpath.normpath(posixpath.join(posixpath.dirname(name), path))
+    if source not in manifest:
+      return match.group(0)
+    target = posixpath.relpath(manifest[source], posixpath.dirname(base) or '.')
+    return 'url("{}{}")'.format(target, suffix)
+  return CSS_URL.sub(replace, text)
+
+def compress(path):
+  if not path.endswith(COMPRESSIBLE):
+    return
+  with open(path, 'rb') as f:
+    content = f.read()
+  variants = [('.gz', gzip.compress(content, 9, mtime=0))]
+  try:
+    import brotli
+    variants.append(('.br', brotli.compress(content)))
+  except ImportError:
+    pass
+  for suffix, data in variants:
+    if len(data) < len(content):
+      with open(path + suffix, 'wb') as f:
+        f.write(data)
+
+def build(static_folder):
+  # Write static/dist and its manifest; returns the manifest.
+  dist = os.path.join(static_folder, DIST)
+  if os.path.isdir(dist):
+    shutil.rmtree(dist)
+  manifest = {}
+
+  def emit(name, content):
+    target = fingerprinted(name, content)
+    path = os.path.join(dist, *target.split('/'))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+      f.write(content)
+    compress(path)
+    manifest[name] = target
+
+  def read(name):
+    with open(os.path.join(static_folder, *name.split('/')), encoding='utf-8') as f:
+      return f.read()
+
+  sources = []
+  for directory, dirs, files in os.walk(static_folder):
+    dirs[:] = [d for d in dirs if os.path.join(directory, d) != dist]
+    for filename in files:
+      sources.append(os.path.relpath(os.path.join(directory, filename), static_folder).replace(os.sep, '/'))
+
+  # everything stylesheets may refer to first, so their urls can be rewritten
+  for name in sorted(sources, key=lambda name: name.endswith('.css')):
+    if name.endswith('.css'):
+      emit(name, minify_css(rewrite_css_urls(read(name), name, manifest)).encode('utf-8'))
+    elif name.endswith('.js'):
+      emit(name, minify_js(read(name)).encode('utf-8'))
+    else:
+      with open(os.path.join(static_folder, *name.split('/')), 'rb') as f:
+        emit(name, f.read())
+
+  for bundle, members in BUNDLES.items():
+    if bundle.endswith('.css'):
+      parts = [rewrite_css_urls(read(name), name, manifest, bundle) for name in members]
+      emit(bundle, minify_css('\n'.join(parts)).encode('utf-8'))
+    else:
+      emit(bundle, ';\n'.join(minify_js(read(name)) for name in members).encode('utf-8'))
+
+  with open(os.path.join(dist, MANIFEST), 'w') as f:
+    json.dump(manifest, f, indent=2, sort_keys=True)
+  return manifest
+
+#  Extension
+#  ----------------------------------------------------------------
+
+class Assets(object):
+
+  def __init__(self, app=None):
+    self.manifest = None
+    if app is not None:
+      self.init_app(app)
+
+  def init_app(self, app):
+    app.extensions['assets'] = self
+    self.dist = os.path.join(app.static_folder, DIST)
+    app.add_url_rule(app.config.get('ASSETS_URL_PATH', '/assets') + '/<path:filename>',
+                     'assets', self.serve)
+    app.jinja_env.globals.update(asset_url=self.url, asset_urls=self.urls)
+    if app.config.get('USE_BUILT_ASSETS'):
+      try:
+        with open(os.path.join(self.dist, MANIFEST)) as f:
+          self.manifest = json.load(f)
+      except FileNotFoundError:
+        app.logger.warning('USE_BUILT_ASSETS is on but %s has no build; run "flask assets build"', self.dist)
+    self.served = set(self.manifest.values()) if self.manifest else set()
+
+  def url(self, filename):
+    # url_for('static', filename=...) that prefers the fingerprinted copy
+    if self.manifest and filename in self.manifest:
+      return url_for('assets', filename=self.manifest[filename])
+    return url_for('static', filename=filename)
+
+  def urls(self, name):
+    # The file(s) to link for `name`: the built bundle, or its members
+    if name in BUNDLES and not (self.manifest and name in self.manifest):
+      return [url_for('static', filename=member) for member in BUNDLES[name]]
+    return [self.url(name)]
+
+  def serve(self, filename):
+    if filename not in self.served:
+      abort(404)
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    encoding = None
+    for name, suffix in ENCODINGS:
+      if request.accept_encodings.quality(name) and os.path.exists(os.path.join(self.dist, filename + suffix)):
+        encoding, filename = name, filename + suffix
+        break
+    response = send_from_directory(self.dist, filename, mimetype=mimetype, conditional=True)
+    if encoding:
+      response.headers['Content-Encoding'] = encoding
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = IMMUTABLE
+    return response
+
+#  CLI
+#  ----------------------------------------------------------------
+
+cli = AppGroup('assets', help='Build the fingerprinted static assets.')
+
+@cli.command('build')
+def build_command():
+  # flask assets build: run on deploy, before starting the app
+  manifest = build(current_app.static_folder)
+  click.echo('Built {} asset(s) in {}.'.format(len(manifest), os.path.join(current_app.static_folder, DIST)))
@@ -0,0 +1,133 @@
+import asyncio
+import threading
+from flask import current_app, g, has_request_context
+from sqlalchemy.engine import make_url
+from pooling import database_uri
+import sqlstats
+
+#----------------------------------------------------------------------------#
+# Async database access.
+#
+# With ASYNC_QUERIES on, pages whose queries don't depend on each other (the
+# venue and artist pages: entity row, genres, shows) run them concurrently
+# on an async SQLAlchemy engine -- asyncpg on PostgreSQL, aiosqlite for
+# SQLite -- instead of one after another on the session. The engine and its
+# connection pool live on one event loop per process, run by a background
+# thread; views hand it coroutines through gather() and block until all of
+# them are done, so the rest of the app stays synchronous.
+#
+# Needs sqlalchemy[asyncio] plus asyncpg or aiosqlite. The primary
+# (ASYNC_DATABASE_URI, derived from SQLALCHEMY_DATABASE_URI by default) and
+# each replica in SQLALCHEMY_REPLICA_URIS get an async engine. A page's
+# queries go where the session's reads would (see replicas.py): to the
+# request's replica, or to the primary once the request has written or the
+# client is pinned to it. They are counted in the request's sqlstats totals
+# and any query_budget() around them, like the session's statements.
+#
+# For the ASGI deployment see asgi.py.
+#----------------------------------------------------------------------------#
+
+ASYNC_DRIVERS = {
+  'postgresql': 'postgresql+asyncpg',
+  'sqlite': 'sqlite+aiosqlite',
+}
+
+def async_database_uri(uri):
+  url = make_url(database_uri(uri))
+  driver = ASYNC_DRIVERS.get(url.get_backend_name())
+  if driver is None:
+    raise ValueError('no async driver for {!r} databases'.format(url.get_backend_name()))
+  return url.set(drivername=driver).render_as_string(hide_password=False)
+
+def async_engine_options(config, uri):
+  # The pool settings of pooling.py, for the async engine.
+  url = make_url(uri)
+  if url.get_backend_name() == 'sqlite':
+    return {}
+  if config['DB_PGBOUNCER']:
+    from sqlalchemy.pool import NullPool
+    # asyncpg's statement cache doesn't survive transaction pooling
+    return dict(poolclass=NullPool, connect_args={'statement_cache_size': 0})
+  options = dict(
+    pool_size=config['DB_POOL_SIZE'],
+    max_overflow=config['DB_MAX_OVERFLOW'],
+    pool_timeout=config['DB_POOL_TIMEOUT'],
+    pool_recycle=config['DB_POOL_RECYCLE'],
+    pool_pre_ping=config['DB_POOL_PRE_PING'])
+  if config['DB_STATEMENT_TIMEOUT_MS']:
+    options['connect_args'] = {'server_settings': {'statement_timeout': str(config['DB_STATEMENT_TIMEOUT_MS'])}}
+  return options
+
+
+class AsyncDB(object):
+
+  def __init__(self, app=None):
+    self.enabled = False
+    self.engines = {}
+    self._loop = None
+    self._lock = threading.Lock()
+    if app is not None:
+      self.init_app(app)
+
+  def init_app(self, app):
+    # after replicas.configure(app), which names the replica binds
+    app.extensions['async_db'] = self
+    self.enabled = app.config.get('ASYNC_QUERIES', False)
+    if not self.enabled:
+      return
+    # bind key (None for the primary) -> async URI
+    self.uris = {None: app.config.get('ASYNC_DATABASE_URI') or async_database_uri(app.config['SQLALCHEMY_DATABASE_URI'])}
+    for key, uri in zip(app.config.get('DB_REPLICA_KEYS') or [], app.config.get('SQLALCHEMY_REPLICA_URIS') or []):
+      self.uris[key] = async_database_uri(uri)
+    self.options = {key: async_engine_options(app.config, uri) for key, uri in self.uris.items()}
+    self.timeout = app.config.get('ASYNC_QUERY_TIMEOUT', 30)
+
+  def _start(self):
+    # The loop and engines are created on first use, i.e. after a forking
+    # server has forked.
+    with self._lock:
+      if self._loop is None:
+        from sqlalchemy.ext.asyncio import create_async_engine
+        loop = asyncio.new_event_loop()
+        threading.Thread(target=loop.run_forever, name='async-db', daemon=True).start()
+        self.engines = {key: create_async_engine(uri, **self.options[key]) for key, uri in self.uris.items()}
+        self._loop = loop
+      return self._loop
+
+  def _bind_key(self):
+    # The replica the session would read from now, or None for the primary
+    key = g.get('db_replica') if has_request_context() else None
+    if key not in self.uris or current_app.extensions['sqlalchemy'].session.info.get('wrote'):
+      return None
+    return key
+
+  def gather(self, *coroutines):
+    # Run `coroutines` (from all() and first()) concurrently on the database
+    # loop and return their results in order.
+    async def gather_all():
+      return await asyncio.gather(*coroutines)
+    future = asyncio.run_coroutine_threadsafe(gather_all(), self._start())
+    return future.result(self.timeout)
+
+  def _execute(self, statement, fetch):
+    # Routing and query logs are picked here, on the request's thread; the
+    # coroutine runs on the loop's.
+    key = self._bind_key()
+    options = {'sqlstats_logs': sqlstats.active_logs()}
+    async def execute():
+      async with self.engines[key].connect() as conn:
+        return getattr(await conn.execute(statement, execution_options=options), fetch)()
+    return execute()
+
+  def all(self, statement):
+    return self._execute(statement, 'all')
+
+  def first(self, statement):
+    return self._execute(statement, 'first')
+
+  def close(self):
+    if self._loop is not None:
+      for engine in self.engines.values():
+        asyncio.run_coroutine_threadsafe(engine.dispose(), self._loop).result(self.timeout)
+      self._loop.call_soon_threadsafe(self._loop.stop)
+      self._loop = None
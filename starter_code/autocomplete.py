@@ -0,0 +1,228 @@
+import heapq
+import re
+import sys
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from models import Venue, Artist
+import facets
+
+#----------------------------------------------------------------------------#
+# Autocomplete.
+#
+# /autocomplete?q= answers as the user types, from venue and artist names,
+# cities and genres. Any word of a suggestion can start the match: "hop"
+# finds "The Musical Hop", and so does "the mus". Each worker keeps a sorted
+# array of keys, one per word suffix of every label ("the musical hop",
+# "musical hop", "hop"). A parallel array('i') holds the entry each key
+# belongs to. A lookup is a bisection plus a scan of every key sharing the
+# prefix, ranking as it goes, with no SQL. One- and two-letter prefixes share
+# the most keys, so their best suggestions are memoized until the next change
+# to the index. Keys and labels are interned and ids and flags live in
+# arrays: 100k venues take about 40 MB.
+#
+# Venues and artists each get a PrefixIndex, managed by facets.FacetIndex.
+# It is loaded with the same two queries per kind as the facet index, and
+# patched with the ids that create/edit/delete commits touched. Other
+# workers' changes show up after FACET_REFRESH_SECONDS. preload() builds both
+# at startup so the first keystroke doesn't pay for the load.
+#----------------------------------------------------------------------------#
+
+# Prefixes up to this long have their best suggestions memoized per kind
+MEMO_PREFIX_CHARS = 2
+
+# Entry kinds, in the order equally good suggestions of equal length are listed
+ENTITY, CITY, GENRE = 0, 1, 2
+KIND_NAMES = {CITY: 'city', GENRE: 'genre'}
+
+def normalize(text):
+  # Lowercase words separated by single spaces
+  return ' '.join(re.findall(r'\w+', text.casefold()))
+
+def _keys(label):
+  # (key, leading) per word suffix of `label`; leading for the whole label
+  words = normalize(label).split(' ')
+  return [(sys.intern(' '.join(words[n:])), n == 0) for n in range(len(words)) if words[n]]
+
+def _city_label(values):
+  city = next(iter(values.get('city') or ()), None)
+  state = next(iter(values.get('state') or ()), None)
+  if not city:
+    return None
+  return sys.intern('{}, {}'.format(city, state) if state else city)
+
+
+class PrefixIndex(object):
+  # The sorted key arrays of one kind (see the top of this module). Cities
+  # and genres are shared by many entities and counted, so they are
+  # suggested until the last venue/artist using them goes away.
+
+  def __init__(self, kind, entities):
+    self.kind = kind
+    self.type = kind.model.__name__.lower()
+    self.built_at = time.monotonic()
+    # key arrays, sorted by key
+    self.keys = []
+    self.slots = array('i')
+    self.leading = bytearray()
+    # entry arrays, by slot
+    self.kinds = bytearray()
+    self.ids = array('i')
+    self.refs = array('i')
+    self.labels = []
+    self._free = []
+    self._entities = {}
+    self._shared = {}
+    self._derived = {}
+    # (prefix, kinds) -> (limit, best) for short prefixes, see suggest()
+    self._memo = {}
+    for entity_id, (name, values) in sorted(entities.items()):
+      self._put_entity(entity_id, name, values, build=True)
+    # keys were appended unsorted while building
+    order = sorted(range(len(self.keys)), key=self.keys.__getitem__)
+    self.keys = [self.keys[n] for n in order]
+    self.slots = array('i', (self.slots[n] for n in order))
+    self.leading = bytearray(self.leading[n] for n in order)
+
+  def _add(self, kind, entity_id, label, build):
+    self._memo.clear()
+    if self._free:
+      slot = self._free.pop()
+      self.kinds[slot], self.ids[slot], self.refs[slot], self.labels[slot] = kind, entity_id, 1, label
+    else:
+      slot = len(self.labels)
+      self.kinds.append(kind)
+      self.ids.append(entity_id)
+      self.refs.append(1)
+      self.labels.append(label)
+    for key, leading in _keys(label):
+      if build:
+        index = len(self.keys)
+      else:
+        index = bisect_left(self.keys, key)
+      self.keys.insert(index, key)
+      self.slots.insert(index, slot)
+      self.leading.insert(index, leading)
+    return slot
+
+  def _drop(self, slot):
+    self._memo.clear()
+    for key, _ in _keys(self.labels[slot]):
+      index = bisect_left(self.keys, key)
+      while self.slots[index] != slot:
+        index += 1
+      del self.keys[index]
+      self.slots.pop(index)
+      del self.leading[index]
+    self.labels[slot] = ''
+    self._free.append(slot)
+
+  def _share(self, kind, label, build):
+    slot = self._shared.get((kind, label))
+    if slot is None:
+      self._shared[(kind, label)] = self._add(kind, 0, label, build)
+    else:
+      self.refs[slot] += 1
+
+  def _unshare(self, kind, label):
+    slot = self._shared[(kind, label)]
+    self.refs[slot] -= 1
+    if not self.refs[slot]:
+      del self._shared[(kind, label)]
+      self._drop(slot)
+
+  def _put_entity(self, entity_id, name, values, build=False):
+    if name:
+      self._entities[entity_id] = self._add(ENTITY, entity_id, sys.intern(name), build)
+    derived = ((CITY, _city_label(values)),) + tuple((GENRE, sys.intern(genre)) for genre in values.get('genre') or ())
+    derived = tuple((kind, label) for kind, label in derived if label)
+    for kind, label in derived:
+      self._share(kind, label, build)
+    self._derived[entity_id] = derived
+
+  def put(self, entity_id, name, values):
+    self.remove(entity_id)
+    self._put_entity(entity_id, name, values)
+
+  def remove(self, entity_id):
+    slot = self._entities.pop(entity_id, None)
+    if slot is not None:
+      self._drop(slot)
+    for kind, label in self._derived.pop(entity_id, ()):
+      self._unshare(kind, label)
+
+  def suggest(self, prefix, kinds, limit):
+    # The `limit` best (rank, suggestion) for the entries with a key starting
+    # with `prefix` (normalized), among `kinds`; whole-label matches first.
+    memo_key = (prefix, frozenset(kinds)) if len(prefix) <= MEMO_PREFIX_CHARS else None
+    memo = self._memo.get(memo_key)
+    if memo is not None and memo[0] >= limit:
+      return memo[1][:limit]
+    ranks = {}
+    index = bisect_left(self.keys, prefix)
+    while index < len(self.keys) and self.keys[index].startswith(prefix):
+      slot = self.slots[index]
+      if self.kinds[slot] in kinds:
+        rank = (not self.leading[index], len(self.labels[slot]), self.kinds[slot], self.labels[slot])
+        if slot not in ranks or rank < ranks[slot]:
+          ranks[slot] = rank
+      index += 1
+    best = []
+    for slot, rank in heapq.nsmallest(limit, ranks.items(), key=lambda item: item[1]):
+      if self.kinds[slot] == ENTITY:
+        best.append((rank, {"type": self.type, "id": self.ids[slot], "label": self.labels[slot]}))
+      else:
+        best.append((rank, {"type": KIND_NAMES[self.kinds[slot]], "label": self.labels[slot]}))
+    if memo_key is not None:
+      self._memo[memo_key] = (limit, best)
+    return best
+
+venues = facets.FacetIndex(facets.venues.kind, PrefixIndex)
+artists = facets.FacetIndex(facets.artists.kind, PrefixIndex)
+facets.track(Venue, venues)
+facets.track(Artist, artists)
+
+# ?type= values and what they select from each index
+TYPES = {
+  'venue': ((venues, ENTITY),),
+  'artist': ((artists, ENTITY),),
+  'city': ((venues, CITY), (artists, CITY)),
+  'genre': ((venues, GENRE), (artists, GENRE)),
+}
+
+def suggest(query, types=None, limit=10):
+  # Up to `limit` suggestions for what the user typed so far, best first.
+  # Cities and genres found in both indexes are listed once.
+  prefix = normalize(query)
+  if not prefix:
+    return []
+  selected = {}
+  for name in types or TYPES:
+    for index, kind in TYPES[name]:
+      selected.setdefault(index, set()).add(kind)
+  matches = []
+  for index, kinds in selected.items():
+    matches.extend(index.read(lambda prefix_index: prefix_index.suggest(prefix, kinds, limit)))
+  matches.sort(key=lambda match: (match[0], match[1]['type']))
+  suggestions, seen = [], set()
+  for _, suggestion in matches:
+    key = (suggestion['type'], suggestion.get('id'), suggestion['label'])
+    if key not in seen:
+      seen.add(key)
+      suggestions.append(suggestion)
+      if len(suggestions) == limit:
+        break
+  return suggestions
+
+def preload(app):
+  # Build both indexes in the background at startup; a failure (e.g. tables
+  # not created yet) is logged and retried by the first lookup.
+  def load():
+    try:
+      with app.app_context():
+        for index in (venues, artists):
+          index.read(lambda prefix_index: None)
+    except Exception as e:
+      app.logger.warning('autocomplete: preload skipped: %s', str(e).splitlines()[0])
+  threading.Thread(target=load, daemon=True).start()
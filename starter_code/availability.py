@@ -0,0 +1,126 @@
+import calendar
+from collections import Counter
+from datetime import date, timedelta
+import babel.dates
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy.dialects import postgresql, sqlite
+from models import db, Venue, Artist, Show, VenueDay, ArtistDay
+
+#----------------------------------------------------------------------------#
+# Availability calendars.
+#
+# venue_day and artist_day hold, per venue/artist and calendar day in
+# DISPLAY_TIMEZONE, the number of shows touching that day. A show running
+# past midnight counts on both days. Days without shows have no row, so a
+# year view is one primary-key range read of at most 366 rows per entity,
+# and every day missing from it is free. The write paths keep the buckets
+# current in the same transaction as the shows: record_show(s) when shows
+# are inserted and discard_venue_shows() before a venue's shows are deleted.
+# `flask availability rebuild` recomputes everything from Show, e.g. after
+# DISPLAY_TIMEZONE changes.
+#----------------------------------------------------------------------------#
+
+BUCKETS = ((VenueDay, VenueDay.venue_id, 'venue_id'), (ArtistDay, ArtistDay.artist_id, 'artist_id'))
+CALENDARS = {Venue: (VenueDay, VenueDay.venue_id), Artist: (ArtistDay, ArtistDay.artist_id)}
+
+def show_days(start_time, end_time):
+  # Local days [start_time, end_time) touches
+  tz = babel.dates.get_timezone(current_app.config['DISPLAY_TIMEZONE'])
+  first = start_time.astimezone(tz).date()
+  last = (end_time - timedelta(microseconds=1)).astimezone(tz).date()
+  return [first + timedelta(days=n) for n in range((last - first).days + 1)]
+
+def _deltas(shows, sign=1):
+  # {(model, entity_id, day): change} for dicts with venue_id, artist_id,
+  # start_time and end_time
+  deltas = Counter()
+  for show in shows:
+    for day in show_days(show['start_time'], show['end_time']):
+      for model, _, key in BUCKETS:
+        deltas[(model, show[key], day)] += sign
+  return deltas
+
+def _upsert(model, fk):
+  dialect = db.session.get_bind().dialect.name
+  insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+  statement = insert(model.__table__)
+  return statement.on_conflict_do_update(
+    index_elements=[fk.name, 'day'],
+    set_={'shows': model.__table__.c.shows + statement.excluded.shows})
+
+def _apply(deltas):
+  # One executemany per table for additions, and for removals an update
+  # plus a delete of the days that became free.
+  for model, fk, _ in BUCKETS:
+    table = model.__table__
+    added = [{fk.name: entity_id, 'day': day, 'shows': n}
+             for (target, entity_id, day), n in deltas.items() if target is model and n > 0]
+    removed = [{'entity_id': entity_id, 'bucket_day': day, 'n': -n}
+               for (target, entity_id, day), n in deltas.items() if target is model and n < 0]
+    if added:
+      db.session.execute(_upsert(model, fk), added)
+    if removed:
+      db.session.execute(
+        table.update()
+          .where(table.c[fk.name] == db.bindparam('entity_id'), table.c.day == db.bindparam('bucket_day'))
+          .values(shows=table.c.shows - db.bindparam('n')),
+        removed)
+      db.session.execute(table.delete().where(
+        table.c[fk.name].in_(set(row['entity_id'] for row in removed)), table.c.shows <= 0))
+
+#  Write path
+#  ----------------------------------------------------------------
+
+def record_show(venue_id, artist_id, start_time, end_time):
+  # Book a newly inserted show; call in the same transaction as the insert.
+  record_shows([{'venue_id': venue_id, 'artist_id': artist_id, 'start_time': start_time, 'end_time': end_time}])
+
+def record_shows(shows):
+  _apply(_deltas(shows))
+
+def discard_venue_shows(venue_id):
+  # Ahead of deleting a venue and its shows: free the performing artists'
+  # days and drop the venue's calendar.
+  shows = db.session.execute(
+    db.select(Show.venue_id, Show.artist_id, Show.start_time, Show.end_time).where(Show.venue_id == venue_id))
+  deltas = _deltas([row._mapping for row in shows], sign=-1)
+  _apply(Counter({key: n for key, n in deltas.items() if key[0] is ArtistDay}))
+  VenueDay.query.filter_by(venue_id=venue_id).delete(synchronize_session=False)
+
+def rebuild(chunk_size=10000):
+  # Recompute every bucket from Show.
+  for model, _, _ in BUCKETS:
+    db.session.execute(model.__table__.delete())
+  deltas = _deltas(row._mapping for row in db.session.execute(
+    db.select(Show.venue_id, Show.artist_id, Show.start_time, Show.end_time)
+    .execution_options(yield_per=chunk_size)))
+  _apply(deltas)
+  db.session.commit()
+
+#  Read path
+#  ----------------------------------------------------------------
+
+def month_range(year, month):
+  return date(year, month, 1), date(year, month, calendar.monthrange(year, month)[1])
+
+def booked_days(model, entity_id, first, last):
+  # {day: shows} for the booked days in [first, last]
+  bucket, fk = CALENDARS[model]
+  rows = db.session.execute(
+    db.select(bucket.day, bucket.shows)
+    .where(fk == entity_id, bucket.day >= first, bucket.day <= last)
+    .order_by(bucket.day))
+  return {day: shows for day, shows in rows}
+
+#  CLI
+#  ----------------------------------------------------------------
+
+cli = AppGroup('availability', help='Maintain the venue/artist availability calendars.')
+
+@cli.command('rebuild')
+def rebuild_command():
+  # flask availability rebuild: full recompute from Show
+  rebuild()
+  click.echo('Availability calendars rebuilt.')
@@ -0,0 +1,409 @@
+#----------------------------------------------------------------------------#
+# Benchmarks.
+#
+#   python bench.py --scale 1000 --out bench-results.json
+#   python bench.py --baseline bench-baseline.json      (exit 1 on regression;
+#                                                        written if missing)
+#
+# Seeds a throwaway database (a local SQLite file unless --database-url says
+# otherwise; it is dropped and recreated) with synthetic venues, artists,
+# genre links and shows, then drives every route through the Flask test
+# client and, for GET routes, through a concurrent HTTP load generator
+# against a local threaded server. Per route it records p50/p95/p99
+# latency, throughput and SQL statements per request, and writes the
+# results as JSON so runs can be compared. With --explain it also checks the
+# query plans of the hot routes (EXPLAIN / EXPLAIN QUERY PLAN) and fails if
+# any of them scans Show instead of using its indexes.
+#----------------------------------------------------------------------------#
+
+import argparse
+import json
+import os
+import platform
+import random
+import re
+import shutil
+import sys
+import threading
+import time
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+def parse_args(argv=None):
+  parser = argparse.ArgumentParser(description='Seed a synthetic dataset and benchmark every route.')
+  parser.add_argument('--database-url', default='sqlite:///' + os.path.abspath('bench.db'),
+                      help='database to seed; it is dropped and recreated (default: ./bench.db)')
+  parser.add_argument('--scale', type=int, default=1000,
+                      help='venues and artists to create; shows are 10x this (default: 1000)')
+  parser.add_argument('--iterations', type=int, default=50,
+                      help='test-client requests per route (default: 50)')
+  parser.add_argument('--http-requests', type=int, default=200,
+                      help='HTTP requests per GET route in the load phase, 0 to skip (default: 200)')
+  parser.add_argument('--concurrency', type=int, default=8,
+                      help='concurrent HTTP clients in the load phase (default: 8)')
+  parser.add_argument('--cache', action='store_true',
+                      help='keep the page cache on (off by default so the database path is measured)')
+  parser.add_argument('--reuse', action='store_true',
+                      help='benchmark the existing data instead of reseeding')
+  parser.add_argument('--out', default='bench-results.json', help='where to write the results')
+  parser.add_argument('--baseline', help='results file to compare against')
+  parser.add_argument('--explain', action='store_true',
+                      help='fail if the hot queries read Show without an index')
+  parser.add_argument('--tolerance', type=float, default=0.25,
+                      help='allowed p95 slowdown over the baseline, as a fraction (default: 0.25)')
+  return parser.parse_args(argv)
+
+#  Seeding
+#  ----------------------------------------------------------------
+
+CITIES = [('San Francisco', 'CA'), ('New York', 'NY'), ('Austin', 'TX'), ('Seattle', 'WA'),
+          ('Chicago', 'IL'), ('Nashville', 'TN'), ('Denver', 'CO'), ('Boston', 'MA')]
+WORDS = ['Blue', 'Velvet', 'Electric', 'Silver', 'Midnight', 'Golden', 'Hollow', 'Wild',
+         'Crimson', 'Lucky', 'Iron', 'Neon', 'Echo', 'Static', 'Paper', 'Stone']
+
+def _name(rng, suffix):
+  return '{} {} {}'.format(rng.choice(WORDS), rng.choice(WORDS), suffix)
+
+def _insert(db, table, rows, chunk_size=5000):
+  for start in range(0, len(rows), chunk_size):
+    db.session.execute(table.insert(), rows[start:start + chunk_size])
+
+def seed(scale, rng):
+  from models import db, Venue, Artist, Show, Genre, genre_asoc_venue, genre_asoc_art
+  from forms import GENRE_CHOICES
+  import availability
+  import counters
+  import reports
+  import search
+
+  db.drop_all()
+  db.create_all()
+  _insert(db, Genre.__table__, [{"id": i + 1, "name": name} for i, (name, _) in enumerate(GENRE_CHOICES)])
+  genre_ids = list(range(1, len(GENRE_CHOICES) + 1))
+
+  venues, artists, venue_genres, artist_genres = [], [], [], []
+  for entity_id in range(1, scale + 1):
+    city, state = rng.choice(CITIES)
+    venues.append({"id": entity_id, "name": _name(rng, 'Hall'), "city": city, "state": state,
+                   "address": '{} Main St'.format(entity_id), "phone": '555-0100',
+                   "seeking_talent": rng.random() < 0.5, "version": 1})
+    city, state = rng.choice(CITIES)
+    artists.append({"id": entity_id, "name": _name(rng, 'Band'), "city": city, "state": state,
+                    "phone": '5550100000', "version": 1})
+    venue_genres += [{"Venue_id": entity_id, "Genre_id": g} for g in rng.sample(genre_ids, rng.randint(1, 3))]
+    artist_genres += [{"Aritst_id": entity_id, "Genre_id": g} for g in rng.sample(genre_ids, rng.randint(1, 3))]
+  _insert(db, Venue.__table__, venues)
+  _insert(db, Artist.__table__, artists)
+  _insert(db, genre_asoc_venue, venue_genres)
+  _insert(db, genre_asoc_art, artist_genres)
+
+  # two-hour slots; a venue or artist is never booked twice in one slot,
+  # which the overlap constraints on Show would reject
+  now = datetime.utcnow()
+  shows, booked = [], set()
+  while len(shows) < scale * 10:
+    venue_id, artist_id, slot = rng.randint(1, scale), rng.randint(1, scale), rng.randint(-12 * 365, 12 * 365)
+    if ('venue', venue_id, slot) in booked or ('artist', artist_id, slot) in booked:
+      continue
+    booked.update((('venue', venue_id, slot), ('artist', artist_id, slot)))
+    start_time = now + timedelta(hours=2 * slot)
+    shows.append({"venue_id": venue_id, "artist_id": artist_id, "start_time": start_time,
+                  "end_time": start_time + timedelta(hours=2), "version": 1})
+  _insert(db, Show.__table__, shows)
+  db.session.commit()
+
+  counters.rebuild(now)
+  availability.rebuild()
+  reports.rebuild()
+  search.rebuild_search_vectors()
+
+#  Routes
+#  ----------------------------------------------------------------
+
+def routes(scale, rng, now):
+  # (name, method, url factory, form data factory); factories pick fresh
+  # ids per request so the detail pages aren't measured on one hot row.
+  from forms import GENRE_CHOICES
+  venue = lambda: rng.randint(1, scale)
+  artist = lambda: rng.randint(1, scale)
+  venue_form = lambda: {"name": _name(rng, 'Hall'), "city": 'Austin', "state": 'TX', "address": '1 Main St',
+                        "phone": '555-0100', "image_link": 'https://example.com/i.png', "facebook_link": 'https://facebook.com/x', "website_link": 'https://example.com', "website": 'https://example.com',
+                        "seeking_talent": 'y', "seeking_description": 'Looking for bands',
+                        "genres": ['Jazz', 'Blues']}
+  artist_form = lambda: {"name": _name(rng, 'Band'), "city": 'Austin', "state": 'TX', "phone": '5550100000',
+                         "image_link": 'https://example.com/i.png', "facebook_link": 'https://facebook.com/x', "website_link": 'https://example.com', "website": 'https://example.com', "seeking_venue": 'y',
+                         "seeking_description": 'Looking for gigs', "genres": ['Jazz', 'Blues']}
+  show_form = lambda: {"venue_id": str(venue()), "artist_id": str(artist()),
+                       "start_time": str(now + timedelta(days=rng.randint(1, 90)))}
+  term = lambda: rng.choice(WORDS)[:3]
+  facets = lambda: urllib.parse.urlencode({"genre": rng.choice(GENRE_CHOICES)[0], "state": rng.choice(CITIES)[1]})
+  # each DELETE takes another venue, from the top down; the route is last so
+  # the other routes' ids still exist
+  doomed = iter(range(scale, 0, -1))
+  year = (now.date().isoformat(), (now.date() + timedelta(days=364)).isoformat())
+  return [
+    ('GET /', 'GET', lambda: '/', None),
+    ('GET /venues', 'GET', lambda: '/venues', None),
+    ('GET /venues/<id>', 'GET', lambda: '/venues/{}'.format(venue()), None),
+    ('GET /venues/browse', 'GET', lambda: '/venues/browse?' + facets(), None),
+    ('POST /venues/search', 'POST', lambda: '/venues/search', lambda: {"search_term": term()}),
+    ('GET /venues/create', 'GET', lambda: '/venues/create', None),
+    ('POST /venues/create', 'POST', lambda: '/venues/create', venue_form),
+    ('GET /venues/<id>/edit', 'GET', lambda: '/venues/{}/edit'.format(venue()), None),
+    ('POST /venues/<id>/edit', 'POST', lambda: '/venues/{}/edit'.format(venue()), venue_form),
+    ('GET /venues/<id>/calendar', 'GET', lambda: '/venues/{}/calendar?start={}&end={}'.format(venue(), *year), None),
+    ('GET /artists', 'GET', lambda: '/artists', None),
+    ('GET /artists/<id>', 'GET', lambda: '/artists/{}'.format(artist()), None),
+    ('GET /artists/browse', 'GET', lambda: '/artists/browse?' + facets(), None),
+    ('POST /artists/search', 'POST', lambda: '/artists/search', lambda: {"search_term": term()}),
+    ('GET /artists/<id>/calendar', 'GET', lambda: '/artists/{}/calendar?start={}&end={}'.format(artist(), *year), None),
+    ('GET /artists/create', 'GET', lambda: '/artists/create', None),
+    ('POST /artists/create', 'POST', lambda: '/artists/create', artist_form),
+    ('GET /artists/<id>/edit', 'GET', lambda: '/artists/{}/edit'.format(artist()), None),
+    ('POST /artists/<id>/edit', 'POST', lambda: '/artists/{}/edit'.format(artist()), artist_form),
+    ('GET /shows', 'GET', lambda: '/shows', None),
+    ('GET /shows?format=json', 'GET', lambda: '/shows?format=json', None),
+    ('GET /reports', 'GET', lambda: '/reports/?start={}&end={}'.format(*year), None),
+    ('GET /shows/create', 'GET', lambda: '/shows/create', None),
+    ('POST /shows/create', 'POST', lambda: '/shows/create', show_form),
+    ('GET /api/v1/venues', 'GET', lambda: '/api/v1/venues', None),
+    ('GET /api/v1/venues/<id>', 'GET', lambda: '/api/v1/venues/{}'.format(venue()), None),
+    ('GET /api/v1/artists', 'GET', lambda: '/api/v1/artists', None),
+    ('GET /api/v1/artists/<id>', 'GET', lambda: '/api/v1/artists/{}'.format(artist()), None),
+    ('GET /api/v1/shows', 'GET', lambda: '/api/v1/shows', None),
+    ('GET /api/v1/search/venues', 'GET', lambda: '/api/v1/search/venues?q=' + term(), None),
+    ('GET /api/v1/search/artists', 'GET', lambda: '/api/v1/search/artists?q=' + term(), None),
+    ('GET /autocomplete', 'GET', lambda: '/autocomplete?q=' + term().lower(), None),
+    ('DELETE /venues/<id>', 'DELETE', lambda: '/venues/{}'.format(next(doomed)), None),
+  ]
+
+#  Measurement
+#  ----------------------------------------------------------------
+
+def percentile(samples, fraction):
+  # nearest-rank percentile of an already sorted list
+  if not samples:
+    return None
+  index = max(0, min(len(samples) - 1, int(round(fraction * len(samples) + 0.5)) - 1))
+  return samples[index]
+
+def summarize(latencies, elapsed):
+  latencies = sorted(latencies)
+  return {
+    "requests": len(latencies),
+    "p50_ms": percentile(latencies, 0.50) * 1000,
+    "p95_ms": percentile(latencies, 0.95) * 1000,
+    "p99_ms": percentile(latencies, 0.99) * 1000,
+    "mean_ms": sum(latencies) / len(latencies) * 1000,
+    "throughput_rps": len(latencies) / elapsed if elapsed else None,
+  }
+
+class QueryCounter(object):
+
+  def __init__(self, engine):
+    from sqlalchemy import event
+    self.count = 0
+    event.listen(engine, 'before_cursor_execute', self._count)
+
+  def _count(self, *args):
+    self.count += 1
+
+def bench_client(app, route, iterations, counter):
+  name, method, url, form = route
+  client = app.test_client()
+  for _ in range(3):
+    client.open(url(), method=method, data=form() if form else None)
+  latencies, statements, statuses = [], [], set()
+  started = time.perf_counter()
+  for _ in range(iterations):
+    before = counter.count
+    t0 = time.perf_counter()
+    response = client.open(url(), method=method, data=form() if form else None)
+    latencies.append(time.perf_counter() - t0)
+    statements.append(counter.count - before)
+    statuses.add(response.status_code)
+  result = summarize(latencies, time.perf_counter() - started)
+  result["queries_per_request"] = sum(statements) / len(statements)
+  result["max_queries"] = max(statements)
+  result["statuses"] = sorted(statuses)
+  return result
+
+def _quiet_handler():
+  # werkzeug's request handler without the per-request access log line
+  from werkzeug.serving import WSGIRequestHandler
+  class QuietHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+      pass
+  return QuietHandler
+
+def bench_http(base_url, route, total, concurrency):
+  name, method, url, form = route
+
+  def fetch(_):
+    t0 = time.perf_counter()
+    with urllib.request.urlopen(base_url + url()) as response:
+      response.read()
+    return time.perf_counter() - t0
+
+  started = time.perf_counter()
+  with ThreadPoolExecutor(max_workers=concurrency) as pool:
+    latencies = list(pool.map(fetch, range(total)))
+  result = summarize(latencies, time.perf_counter() - started)
+  result["concurrency"] = concurrency
+  return result
+
+def compare(results, baseline, tolerance):
+  # Regression messages for routes slower or chattier than the baseline.
+  failures = []
+  for name, current in results["routes"].items():
+    previous = baseline.get("routes", {}).get(name)
+    if not previous:
+      continue
+    for phase in ('client', 'http'):
+      now_p95 = current.get(phase, {}).get('p95_ms')
+      then_p95 = previous.get(phase, {}).get('p95_ms')
+      if now_p95 is not None and then_p95 is not None and now_p95 > then_p95 * (1 + tolerance):
+        failures.append('{} [{}]: p95 {:.1f}ms vs baseline {:.1f}ms'.format(name, phase, now_p95, then_p95))
+    now_queries = current['client']['max_queries']
+    then_queries = previous['client']['max_queries']
+    if now_queries > then_queries:
+      failures.append('{}: {} queries per request vs baseline {}'.format(name, now_queries, then_queries))
+  return failures
+
+#  Query plans
+#  ----------------------------------------------------------------
+
+# Routes whose statements must reach Show through an index, and the tables
+# that may never be read with a full scan on them.
+EXPLAIN_ROUTES = [
+  ('GET /venues/<id>', lambda scale: '/venues/{}'.format(scale // 2)),
+  ('GET /artists/<id>', lambda scale: '/artists/{}'.format(scale // 2)),
+  ('GET /shows', lambda scale: '/shows'),
+  ('GET /api/v1/shows?venue_id=', lambda scale: '/api/v1/shows?venue_id={}'.format(scale // 2)),
+  ('GET /api/v1/shows?artist_id=', lambda scale: '/api/v1/shows?artist_id={}'.format(scale // 2)),
+]
+NO_FULL_SCANS = ('Show',)
+
+def _full_scans(dialect, plan):
+  # tables in NO_FULL_SCANS that the plan reads without an index
+  scanned = []
+  for line in plan:
+    for table in NO_FULL_SCANS:
+      if dialect == 'postgresql':
+        if re.search(r'Seq Scan on "?{}"?\b'.format(table), line):
+          scanned.append(table)
+      elif re.match(r'SCAN "?{}"?\b'.format(table), line.strip()) and 'INDEX' not in line:
+        scanned.append(table)
+  return scanned
+
+def explain_hot_paths(app, db, scale):
+  # EXPLAIN every SELECT the hot routes issue, with the parameters they
+  # actually ran with. Returns ({route: [plans]}, [failures]).
+  from sqlalchemy import event
+  dialect = db.engine.dialect.name
+  prefix = 'EXPLAIN ' if dialect == 'postgresql' else 'EXPLAIN QUERY PLAN '
+  if dialect == 'postgresql':
+    db.session.execute(db.text('ANALYZE'))
+    db.session.commit()
+  captured = []
+  def capture(conn, cursor, statement, parameters, context, executemany):
+    if statement.lstrip().upper().startswith('SELECT') and not executemany:
+      captured.append((statement, parameters))
+  event.listen(db.engine, 'before_cursor_execute', capture)
+  plans, failures = {}, []
+  client = app.test_client()
+  try:
+    for name, url in EXPLAIN_ROUTES:
+      del captured[:]
+      client.get(url(scale))
+      statements = list(captured)
+      del captured[:]
+      plans[name] = []
+      with db.engine.connect() as conn:
+        for statement, parameters in statements:
+          rows = conn.exec_driver_sql(prefix + statement, parameters).fetchall()
+          plan = [row[0] if dialect == 'postgresql' else row[-1] for row in rows]
+          plans[name].append({"sql": ' '.join(statement.split()), "plan": plan})
+          for table in _full_scans(dialect, plan):
+            failures.append('{}: full scan of {} in {}'.format(name, table, ' '.join(statement.split())[:120]))
+  finally:
+    event.remove(db.engine, 'before_cursor_execute', capture)
+  return plans, failures
+
+#  Driver
+#  ----------------------------------------------------------------
+
+def main(argv=None):
+  args = parse_args(argv)
+  # configure the app before it is imported
+  os.environ['DATABASE_URL'] = args.database_url
+  os.environ.setdefault('CACHE_BACKEND', 'memory' if args.cache else 'null')
+  from werkzeug.serving import make_server
+  from app import app, db
+
+  rng = random.Random(0)
+  now = datetime.utcnow()
+  app.logger.disabled = True
+  # the write routes are posted without a CSRF token
+  app.config['WTF_CSRF_ENABLED'] = False
+  with app.app_context():
+    if not args.reuse:
+      print('Seeding {} venues/artists and {} shows...'.format(args.scale, args.scale * 10))
+      seed(args.scale, rng)
+    counter = QueryCounter(db.engine)
+    server = None
+    if args.http_requests:
+      server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=_quiet_handler())
+      threading.Thread(target=server.serve_forever, daemon=True).start()
+    results = {
+      "meta": {
+        "scale": args.scale,
+        "database": db.engine.dialect.name,
+        "cache": os.environ['CACHE_BACKEND'],
+        "python": platform.python_version(),
+        "timestamp": datetime.utcnow().isoformat()
+      },
+      "routes": {}
+    }
+    try:
+      for route in routes(args.scale, rng, now):
+        name, method = route[0], route[1]
+        result = {"client": bench_client(app, route, args.iterations, counter)}
+        if server is not None and method == 'GET':
+          result["http"] = bench_http('http://127.0.0.1:{}'.format(server.server_port), route,
+                                      args.http_requests, args.concurrency)
+        results["routes"][name] = result
+        print('{:<28} p50 {:7.2f}ms  p95 {:7.2f}ms  p99 {:7.2f}ms  {:5.1f} queries'.format(
+          name, result['client']['p50_ms'], result['client']['p95_ms'], result['client']['p99_ms'],
+          result['client']['queries_per_request']))
+    finally:
+      if server is not None:
+        server.shutdown()
+    explain_failures = []
+    if args.explain:
+      results["explain"], explain_failures = explain_hot_paths(app, db, args.scale)
+
+  for failure in explain_failures:
+    print('FULL SCAN ' + failure)
+
+  with open(args.out, 'w') as f:
+    json.dump(results, f, indent=2, sort_keys=True)
+  print('Results written to {}'.format(args.out))
+
+  if args.baseline and not os.path.exists(args.baseline):
+    # first run: nothing to compare against, so this run becomes the baseline
+    shutil.copyfile(args.out, args.baseline)
+    print('No baseline at {}; wrote this run there'.format(args.baseline))
+  elif args.baseline:
+    with open(args.baseline) as f:
+      failures = compare(results, json.load(f), args.tolerance)
+    for failure in failures:
+      print('REGRESSION ' + failure)
+    if failures:
+      return 1
+  return 1 if explain_failures else 0
+
+if __name__ == '__main__':
+  sys.exit(main())
@@ -0,0 +1,206 @@
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import g, request, session, make_response
+
+#----------------------------------------------------------------------------#
+# Page cache.
+#
+# Caches the rendered response of read-heavy GET views. Each entry is keyed
+# by endpoint, view arguments and query string, and carries a set of tags
+# naming the rows it was built from ('venue:7', 'artist:3', 'venues', ...).
+# The create/edit/delete handlers invalidate the tags they touched after a
+# successful commit, which evicts exactly the pages that showed those rows.
+# Entries also expire after CACHE_TTL seconds, which bounds how stale
+# anything changed outside the handlers (counter rolls, imports) can get.
+#
+# Backends: 'memory' (per-process LRU, the default), 'redis' (shared by all
+# workers, needs the redis package) and 'null' (caching off).
+#----------------------------------------------------------------------------#
+
+class NullBackend(object):
+
+  def get(self, key):
+    return None
+
+  def set(self, key, value, tags, ttl):
+    pass
+
+  def invalidate(self, tags):
+    pass
+
+  def clear(self):
+    pass
+
+
+class MemoryBackend(object):
+
+  def __init__(self, max_entries=1024):
+    self.max_entries = max_entries
+    self._entries = OrderedDict()  # key -> (expires_at, value, tags)
+    self._tagged = {}              # tag -> set of keys
+    self._lock = threading.Lock()
+
+  def get(self, key):
+    with self._lock:
+      entry = self._entries.get(key)
+      if entry is None:
+        return None
+      if entry[0] < time.monotonic():
+        self._remove(key)
+        return None
+      self._entries.move_to_end(key)
+      return entry[1]
+
+  def set(self, key, value, tags, ttl):
+    with self._lock:
+      if key in self._entries:
+        self._remove(key)
+      self._entries[key] = (time.monotonic() + ttl, value, tags)
+      for tag in tags:
+        self._tagged.setdefault(tag, set()).add(key)
+      while len(self._entries) > self.max_entries:
+        self._remove(next(iter(self._entries)))
+
+  def invalidate(self, tags):
+    with self._lock:
+      for tag in tags:
+        for key in self._tagged.pop(tag, ()):
+          self._remove(key)
+
+  def clear(self):
+    with self._lock:
+      self._entries.clear()
+      self._tagged.clear()
+
+  def _remove(self, key):
+    entry = self._entries.pop(key, None)
+    if entry is None:
+      return
+    for tag in entry[2]:
+      keys = self._tagged.get(tag)
+      if keys is not None:
+        keys.discard(key)
+        if not keys:
+          del self._tagged[tag]
+
+
+class RedisBackend(object):
+  # Entries are plain keys with an expiry; every tag is a set of the keys
+  # carrying it, so invalidation is SMEMBERS + DEL.
+
+  def __init__(self, url, prefix='fyyur:page:'):
+    try:
+      import redis
+    except ImportError:
+      raise RuntimeError('CACHE_BACKEND = "redis" requires the redis package')
+    self._redis = redis.Redis.from_url(url)
+    self.prefix = prefix
+
+  def get(self, key):
+    raw = self._redis.get(self.prefix + key)
+    return pickle.loads(raw) if raw is not None else None
+
+  def set(self, key, value, tags, ttl):
+    pipe = self._redis.pipeline()
+    pipe.set(self.prefix + key, pickle.dumps(value), ex=ttl)
+    for tag in tags:
+      pipe.sadd(self.prefix + 'tag:' + tag, key)
+      pipe.expire(self.prefix + 'tag:' + tag, ttl)
+    pipe.execute()
+
+  def invalidate(self, tags):
+    for tag in tags:
+      tag_key = self.prefix + 'tag:' + tag
+      keys = self._redis.smembers(tag_key)
+      pipe = self._redis.pipeline()
+      pipe.delete(tag_key, *[self.prefix + key.decode() for key in keys])
+      pipe.execute()
+
+  def clear(self):
+    keys = list(self._redis.scan_iter(self.prefix + '*'))
+    if keys:
+      self._redis.delete(*keys)
+
+
+class PageCache(object):
+
+  def __init__(self, app=None):
+    self.backend = NullBackend()
+    self.ttl = 60
+    self.hits = 0
+    self.misses = 0
+    self._stats_lock = threading.Lock()
+    if app is not None:
+      self.init_app(app)
+
+  def init_app(self, app):
+    kind = app.config.get('CACHE_BACKEND', 'memory')
+    self.ttl = app.config.get('CACHE_TTL', 60)
+    if kind == 'memory':
+      self.backend = MemoryBackend(app.config.get('CACHE_MAX_ENTRIES', 1024))
+    elif kind == 'redis':
+      self.backend = RedisBackend(app.config['CACHE_REDIS_URL'])
+    elif kind == 'null':
+      self.backend = NullBackend()
+    else:
+      raise ValueError('unknown CACHE_BACKEND {!r}'.format(kind))
+    app.extensions['page_cache'] = self
+
+  def tag(self, *tags):
+    # Called from a cached view to name the rows the page was built from.
+    g.setdefault('page_cache_tags', set()).update(tags)
+
+  def invalidate(self, *tags):
+    self.backend.invalidate(tags)
+
+  def cached(self, *tags):
+    # Cache a GET view's response under its endpoint, arguments and query
+    # string. `tags` are format strings filled from the view arguments,
+    # e.g. @page_cache.cached('venue:{venue_id}'); the view can add more
+    # with tag(). Pages rendered while a flash message is pending are
+    # neither served from nor stored in the cache.
+    def decorator(view):
+      @wraps(view)
+      def wrapper(**kwargs):
+        if request.method != 'GET' or '_flashes' in session:
+          return view(**kwargs)
+
+        key = '{}:{}?{}'.format(
+          request.endpoint,
+          ','.join('{}={}'.format(k, kwargs[k]) for k in sorted(kwargs)),
+          request.query_string.decode())
+        cached = self.backend.get(key)
+        if cached is not None:
+          self._count(hit=True)
+          body, status, mimetype = cached
+          return make_response(body, status, {'Content-Type': mimetype})
+
+        self._count(hit=False)
+        g.page_cache_tags = set(tag.format(**kwargs) for tag in tags)
+        response = make_response(view(**kwargs))
+        if response.status_code == 200 and not response.is_streamed and '_flashes' not in session:
+          self.backend.set(key, (response.get_data(), 200, response.content_type),
+                           g.page_cache_tags, self.ttl)
+        return response
+      return wrapper
+    return decorator
+
+  def _count(self, hit):
+    with self._stats_lock:
+      if hit:
+        self.hits += 1
+      else:
+        self.misses += 1
+
+  def stats(self):
+    with self._stats_lock:
+      lookups = self.hits + self.misses
+      return {
+        "backend": type(self.backend).__name__,
+        "hits": self.hits,
+        "misses": self.misses,
+        "hit_ratio": (self.hits / lookups) if lookups else None
+      }
@@ -1,13 +1,154 @@
 import os
-SECRET_KEY = os.urandom(32)
+# Signs the session cookie, which also carries the read-replica stickiness
+# (see replicas.py), so every worker must share it: set SECRET_KEY outside
+# development. The random fallback changes on every restart.
+SECRET_KEY = os.environ.get('SECRET_KEY') or os.urandom(32)
 # Grabs the folder where the script runs.
 basedir = os.path.abspath(os.path.dirname(__file__))
 
 # Enable debug mode.
 DEBUG = True
 
-# Connect to the database
+# Connect to the database (DATABASE_URL overrides the local default, e.g. for
+# bench.py's throwaway database)
+SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', 'postgres://radovanvitek@localhost:5432/fyurr')
+SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+# Run the independent queries of the detail pages concurrently on an async
+# engine (see asyncdb.py; needs asyncpg or aiosqlite). ASYNC_DATABASE_URI
+# defaults to SQLALCHEMY_DATABASE_URI with the async driver swapped in
+ASYNC_QUERIES = os.environ.get('ASYNC_QUERIES', '0') == '1'
+ASYNC_DATABASE_URI = os.environ.get('ASYNC_DATABASE_URL')
+ASYNC_QUERY_TIMEOUT = 30
 
-# TODO IMPLEMENT DATABASE URL
-SQLALCHEMY_DATABASE_URI = 'postgres://radovanvitek@localhost:5432/fyurr'
+# Read replicas (see replicas.py): comma-separated URLs that read-only requests
+# are served from; a client that just wrote reads from the primary for
+# DB_REPLICA_STICKY_SECONDS
+SQLALCHEMY_REPLICA_URIS = [uri for uri in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if uri]
+DB_REPLICA_STICKY_SECONDS = int(os.environ.get('DB_REPLICA_STICKY_SECONDS', 10))
+
+# Connection pool per worker (see pooling.py); keep
+# workers x (DB_POOL_SIZE + DB_MAX_OVERFLOW) below the server's max_connections
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5))
+DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 5))
+DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT', 10))
+DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', '1') == '1'
+DB_STATEMENT_TIMEOUT_MS = int(os.environ.get('DB_STATEMENT_TIMEOUT_MS', 5000))
+# Set when connecting through PgBouncer in transaction pooling mode
+DB_PGBOUNCER = os.environ.get('DB_PGBOUNCER', '0') == '1'
+# Views run at once per worker under the ASGI server (see asgi.py); more
+# than the pool can serve just queue on DB_POOL_TIMEOUT
+ASGI_THREADS = int(os.environ.get('ASGI_THREADS', DB_POOL_SIZE + DB_MAX_OVERFLOW))
+
+# Locale and time zone show times are displayed in (stored times are UTC)
+BABEL_DEFAULT_LOCALE = os.environ.get('BABEL_DEFAULT_LOCALE', 'en_US')
+DISPLAY_TIMEZONE = os.environ.get('DISPLAY_TIMEZONE', 'UTC')
+
+# Number of shows per /shows page (keyset paginated), and the most a client
+# may ask for with ?limit=
+SHOWS_PAGE_SIZE = 30
+SHOWS_PAGE_SIZE_MAX = 200
+
+# Length of a show entered without an end time, and the longest a show may
+# be (bounds the conflict checks in scheduling.py)
+SHOW_DEFAULT_MINUTES = 120
+SHOW_MAX_MINUTES = 24 * 60
+
+# Page size of /venues/browse and /artists/browse (?limit= up to the max), and
+# how old a worker's facet index may get before it is rebuilt in the
+# background to pick up other workers' changes (see facets.py)
+BROWSE_PAGE_SIZE = 50
+BROWSE_PAGE_SIZE_MAX = 200
+FACET_REFRESH_SECONDS = 60
+
+# Suggestions per /autocomplete response (?limit= up to the max), and whether
+# to build the prefix index at startup rather than on the first lookup
+AUTOCOMPLETE_LIMIT = 10
+AUTOCOMPLETE_LIMIT_MAX = 50
+AUTOCOMPLETE_PRELOAD = os.environ.get('AUTOCOMPLETE_PRELOAD', '1') == '1'
+
+# Longest range the /venues|artists/<id>/calendar endpoints answer at once
+CALENDAR_MAX_DAYS = 366
+
+# Length of each recommendation list, and how much shared genres and shared
+# venues count towards similarity (see recommendations.py)
+RECOMMENDATIONS_TOP_K = 6
+RECOMMENDATION_GENRE_WEIGHT = 1.0
+RECOMMENDATION_VENUE_WEIGHT = 1.0
+
+# /reports: range shown when ?start= is missing, the longest range a report
+# may cover, and rows per venue/artist report (?limit= up to the max)
+REPORT_DEFAULT_DAYS = 30
+REPORT_MAX_DAYS = 3 * 366
+REPORT_PAGE_SIZE = 50
+REPORT_PAGE_SIZE_MAX = 500
+
+# Background jobs (see jobs.py): jobs a `flask jobs worker` runs at once, its
+# idle poll interval, the first retry delay (doubling per attempt up to the
+# max), and how long a job may stay claimed before it is presumed lost. With
+# JOBS_EAGER=1 jobs run inline when enqueued, without a worker.
+JOBS_CONCURRENCY = 4
+JOBS_POLL_SECONDS = 1.0
+JOB_RETRY_SECONDS = 10
+JOB_RETRY_MAX_SECONDS = 3600
+JOB_LOCK_TIMEOUT = 15 * 60
+JOBS_EAGER = os.environ.get('JOBS_EAGER', '0') == '1'
+
+# Stream /artists and /shows to the client as they render instead of building
+# the page in memory (see streaming.py); streamed pages bypass the page cache
+STREAM_TEMPLATES = os.environ.get('STREAM_TEMPLATES', '0') == '1'
+STREAM_BUFFER_SIZE = 16384
+STREAM_YIELD_PER = 500
+
+# Maximum number of hits returned by the venue/artist search pages
+SEARCH_RESULT_LIMIT = 50
+
+# Link the fingerprinted, precompressed assets built by "flask assets build"
+# (see assets.py), served with an immutable Cache-Control under ASSETS_URL_PATH
+USE_BUILT_ASSETS = os.environ.get('USE_BUILT_ASSETS', '0') == '1'
+ASSETS_URL_PATH = '/assets'
+
+# Page cache for the listing and detail pages (see cache.py):
+# 'memory' (per worker LRU), 'redis' (shared, needs CACHE_REDIS_URL) or 'null'
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'memory')
+CACHE_TTL = int(os.environ.get('CACHE_TTL', 60))
+CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', 1024))
+CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL', 'redis://localhost:6379/0')
+
+# Default and maximum page size of the /api/v1 collections
+API_PAGE_SIZE = 50
+API_PAGE_SIZE_MAX = 500
+
+# Rows per transaction for `flask import ...` (see importer.py)
+IMPORT_CHUNK_SIZE = int(os.environ.get('IMPORT_CHUNK_SIZE', 1000))
+
+# Per-request SQL instrumentation (see sqlstats.py): Server-Timing headers and
+# a JSON log line per request, with suspected N+1 patterns flagged once the
+# same statement shape repeats SQL_N_PLUS_ONE_THRESHOLD times
+SQL_INSTRUMENTATION = os.environ.get('SQL_INSTRUMENTATION', '1') == '1'
+SQL_SLOWEST_STATEMENTS = 3
+SQL_N_PLUS_ONE_THRESHOLD = 5
+
+# Most statements each read endpoint may issue; exceeding a budget fails the
+# request under app.testing and logs a warning otherwise
+SQL_QUERY_BUDGETS = {
+  'index': 0,
+  'venues': 1,
+  'show_venue': 4,
+  'search_venues': 1,
+  'artists': 1,
+  'show_artist': 4,
+  'search_artists': 1,
+  'shows': 1,
+  'api.venues': 3,
+  'api.venue': 3,
+  'api.artists': 3,
+  'api.artist': 3,
+  'api.shows': 1,
+  'api.search_entities': 1,
+  'reports.dashboard': 4,
+  'reports.venues': 1,
+  'reports.genres': 1,
+  'reports.artists': 1,
+}
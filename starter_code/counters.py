@@ -0,0 +1,154 @@
+import click
+from flask.cli import AppGroup
+from models import db, Venue, Artist, Show, CounterState, utcnow, as_utc
+
+#----------------------------------------------------------------------------#
+# Show counters.
+#
+# Venue/Artist.upcoming_shows_count and past_shows_count are persisted so the
+# listing and search pages never count Show rows. A show is "upcoming" while
+# its start_time is after counter_state.rolled_until; `flask counters roll`
+# (run from cron every few minutes) advances that watermark and moves the
+# shows that started in between from the upcoming to the past counters.
+# Writes classify new shows against the same watermark, under a share lock
+# on it that a roll waits for, so a show is counted exactly once whichever
+# side of it it lands on.
+#----------------------------------------------------------------------------#
+
+COUNTED = ((Venue, Show.venue_id), (Artist, Show.artist_id))
+
+def _state(lock):
+  # The counter_state row. Writers classifying shows read it with
+  # lock='share', and roll()/rebuild() take it with lock='update' before
+  # reading any shows. A show is then recorded either before a roll, which
+  # moves it, or after it against the new watermark, never against a
+  # watermark that is being moved.
+  query = CounterState.query.filter_by(id=1)
+  if lock == 'update':
+    # a no-op write: the row lock on PostgreSQL, and on SQLite the database
+    # write lock, which FOR UPDATE doesn't take
+    query.update({CounterState.rolled_until: CounterState.rolled_until}, synchronize_session=False)
+  else:
+    query = query.with_for_update(read=True)
+  state = query.first()
+  if state is None:
+    # fresh database: nothing has been counted yet, start the clock now
+    state = CounterState(id=1, rolled_until=utcnow())
+    db.session.add(state)
+    db.session.flush()
+  return state
+
+def _bump(model, entity_id, column, delta):
+  # Counter updates bypass the ORM, so they bump the row version themselves.
+  counter = getattr(model, column)
+  model.query.filter_by(id=entity_id).update(
+    {counter: counter + delta, model.version: model.version + 1}, synchronize_session=False)
+
+#  Write path
+#  ----------------------------------------------------------------
+
+def record_show(venue_id, artist_id, start_time):
+  # Count a newly inserted show; call in the same transaction as the insert.
+  if as_utc(start_time) > _state('share').rolled_until:
+    column = 'upcoming_shows_count'
+  else:
+    column = 'past_shows_count'
+  _bump(Venue, venue_id, column, 1)
+  _bump(Artist, artist_id, column, 1)
+
+def record_shows(shows):
+  # Count a batch of newly inserted shows (dicts with venue_id, artist_id
+  # and start_time): one executemany per table, whatever the batch size.
+  rolled_until = _state('share').rolled_until
+  deltas = {}
+  for show in shows:
+    upcoming = as_utc(show['start_time']) > rolled_until
+    for model, key in ((Venue, 'venue_id'), (Artist, 'artist_id')):
+      delta = deltas.setdefault((model, show[key]), [0, 0])
+      delta[0 if upcoming else 1] += 1
+  for model, _ in COUNTED:
+    params = [{'entity_id': entity_id, 'upcoming': upcoming, 'past': past}
+              for (target, entity_id), (upcoming, past) in deltas.items() if target is model]
+    if params:
+      table = model.__table__
+      db.session.execute(
+        table.update().where(table.c.id == db.bindparam('entity_id')).values(
+          upcoming_shows_count=table.c.upcoming_shows_count + db.bindparam('upcoming'),
+          past_shows_count=table.c.past_shows_count + db.bindparam('past'),
+          version=table.c.version + 1),
+        params)
+
+def discard_venue_shows(venue_id):
+  # Delete every show at a venue ahead of deleting the venue itself, taking
+  # them off the performing artists' counters first.
+  rolled_until = _state('share').rolled_until
+  is_upcoming = Show.start_time > rolled_until
+  rows = db.session.query(
+      Show.artist_id,
+      db.func.count(Show.id).filter(is_upcoming),
+      db.func.count(Show.id).filter(db.not_(is_upcoming))
+    ).filter(Show.venue_id == venue_id).group_by(Show.artist_id).all()
+  for artist_id, upcoming, past in rows:
+    _bump(Artist, artist_id, 'upcoming_shows_count', -upcoming)
+    _bump(Artist, artist_id, 'past_shows_count', -past)
+  Show.query.filter_by(venue_id=venue_id).delete(synchronize_session=False)
+
+#  Periodic jobs
+#  ----------------------------------------------------------------
+
+def roll(now=None):
+  # Move shows that started since the last roll from upcoming to past. Only
+  # venues/artists with such shows are touched, one executemany per table.
+  now = as_utc(now) if now else utcnow()
+  state = _state('update')
+  if now <= state.rolled_until:
+    db.session.commit()
+    return 0
+  started = db.and_(Show.start_time > state.rolled_until, Show.start_time <= now)
+  moved = db.session.query(db.func.count(Show.id)).filter(started).scalar()
+  for model, show_fk in COUNTED:
+    rows = db.session.query(show_fk, db.func.count(Show.id)).filter(started).group_by(show_fk).all()
+    if rows:
+      table = model.__table__
+      db.session.execute(
+        table.update().where(table.c.id == db.bindparam('entity_id')).values(
+          upcoming_shows_count=table.c.upcoming_shows_count - db.bindparam('moved'),
+          past_shows_count=table.c.past_shows_count + db.bindparam('moved'),
+          version=table.c.version + 1),
+        [{'entity_id': entity_id, 'moved': n} for entity_id, n in rows])
+  state.rolled_until = now
+  db.session.commit()
+  return moved
+
+def rebuild(now=None):
+  # Recount everything from Show, e.g. after rows were changed outside the
+  # app. Resets the watermark to `now`.
+  now = as_utc(now) if now else utcnow()
+  state = _state('update')
+  for model, show_fk in COUNTED:
+    table = model.__table__
+    count = lambda condition: db.select(db.func.count(Show.id)).where(
+      show_fk == table.c.id, condition).scalar_subquery()
+    db.session.execute(table.update().values(
+      upcoming_shows_count=count(Show.start_time > now),
+      past_shows_count=count(Show.start_time <= now),
+      version=table.c.version + 1))
+  state.rolled_until = now
+  db.session.commit()
+
+#  CLI
+#  ----------------------------------------------------------------
+
+cli = AppGroup('counters', help='Maintain the persisted show counters.')
+
+@cli.command('roll')
+def roll_command():
+  # flask counters roll: schedule every few minutes
+  moved = roll()
+  click.echo('Rolled {} show(s) from upcoming to past.'.format(moved))
+
+@cli.command('rebuild')
+def rebuild_command():
+  # flask counters rebuild: full recount from Show
+  rebuild()
+  click.echo('Show counters rebuilt.')
@@ -6,13 +6,22 @@ from fabric.contrib.console import confirm
 
 def test():
     with settings(warn_only=True):
-        result = local(
-            "python test_tasks.py -v && python test_users.py -v", capture=True
-        )
+        result = local("python -m pytest -q tests")
     if result.failed and not confirm("Tests failed. Continue?"):
         abort("Aborted at user request.")
 
 
+def bench(baseline='bench-baseline.json', scale='1000'):
+    # fails (non-zero exit, no prompt) when a route's p95 or query count
+    # regresses against the baseline, so CI can gate on it
+    with settings(warn_only=True):
+        result = local(
+            "python bench.py --scale {} --explain --out bench-results.json --baseline {}".format(scale, baseline)
+        )
+    if result.failed:
+        abort("Benchmarks regressed against {}; see bench-results.json.".format(baseline))
+
+
 def commit():
     message = raw_input("Enter a git commit message: ")
     local("git add . && git commit -am '{}'".format(message))
@@ -39,9 +48,7 @@ def heroku():
 
 
 def heroku_test():
-    local(
-        "heroku run python test_tasks.py -v && heroku run python test_users.py -v"
-    )
+    local("heroku run python -m pytest -q tests")
 
 
 def deploy():
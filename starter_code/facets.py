@@ -0,0 +1,275 @@
+import threading
+import time
+from flask import current_app
+from sqlalchemy import event
+from models import db, Venue, Artist, Genre, genre_asoc_venue, genre_asoc_art
+from replicas import RoutingSession
+
+#----------------------------------------------------------------------------#
+# Faceted browsing.
+#
+# /venues/browse and /artists/browse filter by genre, state, city (and
+# seeking_talent for venues), and return the matching entities together with
+# live counts for every facet value ("Jazz (412)", "NY (88)"). They read from
+# an in-process bitmap index, not from the database. Every entity has a bit
+# position, every facet value has an int whose set bits are the entities
+# with that value, and a filter is an OR within a facet and an AND across
+# facets. A count is the popcount of one more AND. At 100k venues a bitmap
+# is 12.5 kB, so a filter change costs a few hundred big-int operations and
+# no SQL.
+#
+# Counts are disjunctive: a facet's counts ignore that facet's own selection,
+# so picking "Jazz" still shows how many venues "Blues" would add.
+#
+# Keeping it current: the index is loaded on first use with two queries per
+# kind. After that, commits that insert, update or delete a Venue/Artist
+# through the ORM (create/edit/delete handlers, imports) mark those ids.
+# The next browse request in this worker reloads just them. Other workers
+# pick up changes when their copy is older than FACET_REFRESH_SECONDS: they
+# rebuild it in a background thread and keep serving the old copy until then.
+#----------------------------------------------------------------------------#
+
+# More changed ids than this (e.g. after an import) reload the whole index
+RELOAD_ALL_AFTER = 1000
+
+class FacetKind(object):
+  # What to index for one model: plain columns, plus genre names through
+  # an association table.
+
+  def __init__(self, model, columns, genre_table, genre_fk):
+    self.model = model
+    self.columns = columns
+    self.genre_table = genre_table
+    self.genre_fk = genre_fk
+    self.facets = ('genre',) + columns
+
+  def load(self, ids=None):
+    # {id: (name, {facet: values})} for `ids` (default: every row)
+    columns = [getattr(self.model, column) for column in self.columns]
+    query = db.select(self.model.id, self.model.name, *columns).order_by(self.model.id)
+    genre_query = (
+      db.select(self.genre_table.c[self.genre_fk], Genre.name)
+      .join(Genre, Genre.id == self.genre_table.c.Genre_id))
+    if ids is not None:
+      query = query.where(self.model.id.in_(ids))
+      genre_query = genre_query.where(self.genre_table.c[self.genre_fk].in_(ids))
+    entities = {}
+    for row in db.session.execute(query):
+      values = {'genre': set()}
+      for column, value in zip(self.columns, row[2:]):
+        values[column] = {value} if value is not None else set()
+      entities[row[0]] = (row[1], values)
+    for entity_id, genre in db.session.execute(genre_query):
+      if entity_id in entities:
+        entities[entity_id][1]['genre'].add(genre)
+    return entities
+
+
+class BitmapIndex(object):
+
+  def __init__(self, kind, entities):
+    self.kind = kind
+    self.built_at = time.monotonic()
+    self.positions = {}
+    self.ids = []
+    self.names = []
+    self.values = []
+    self.live = 0
+    self.bits = {facet: {} for facet in kind.facets}
+    for entity_id, (name, values) in entities.items():
+      self.put(entity_id, name, values)
+
+  def put(self, entity_id, name, values):
+    position = self.positions.get(entity_id)
+    if position is None:
+      position = self.positions[entity_id] = len(self.ids)
+      self.ids.append(entity_id)
+      self.names.append(name)
+      self.values.append({})
+    else:
+      self._clear(position)
+    bit = 1 << position
+    self.names[position] = name
+    self.values[position] = values
+    for facet, facet_values in values.items():
+      for value in facet_values:
+        self.bits[facet][value] = self.bits[facet].get(value, 0) | bit
+    self.live |= bit
+
+  def remove(self, entity_id):
+    position = self.positions.get(entity_id)
+    if position is not None:
+      self._clear(position)
+      self.values[position] = {}
+
+  def _clear(self, position):
+    bit = 1 << position
+    for facet, facet_values in self.values[position].items():
+      for value in facet_values:
+        remaining = self.bits[facet][value] & ~bit
+        if remaining:
+          self.bits[facet][value] = remaining
+        else:
+          del self.bits[facet][value]
+    self.live &= ~bit
+
+  def _selected(self, facet, values):
+    bitmap = 0
+    for value in values:
+      bitmap |= self.bits[facet].get(value, 0)
+    return bitmap
+
+  def browse(self, filters, offset, limit):
+    # Matching entities and the facet counts for `filters` ({facet: values})
+    selected = {facet: self._selected(facet, values) for facet, values in filters.items() if values}
+    matches = self.live
+    for bitmap in selected.values():
+      matches &= bitmap
+
+    facets = {}
+    for facet in self.kind.facets:
+      # everything but this facet's own selection
+      base = self.live
+      for other, bitmap in selected.items():
+        if other != facet:
+          base &= bitmap
+      chosen = set(filters.get(facet) or ())
+      counts = [{"value": value, "count": (base & bitmap).bit_count(), "selected": value in chosen}
+                for value, bitmap in self.bits[facet].items()]
+      facets[facet] = sorted([count for count in counts if count['count'] or count['selected']],
+                             key=lambda count: (-count['count'], str(count['value'])))
+
+    # bits in ascending position order, i.e. by id
+    digits = bin(matches)[:1:-1]
+    results = []
+    index = digits.find('1')
+    for _ in range(offset):
+      if index < 0:
+        break
+      index = digits.find('1', index + 1)
+    while index >= 0 and len(results) < limit:
+      results.append({"id": self.ids[index], "name": self.names[index]})
+      index = digits.find('1', index + 1)
+    return {"total": matches.bit_count(), "offset": offset, "results": results, "facets": facets}
+
+
+class FacetIndex(object):
+  # The bitmap index of one kind in this worker, kept current as described
+  # at the top of this module. Other in-process indexes (autocomplete.py)
+  # reuse this through index_class: anything with put(), remove() and
+  # built_at, constructed from (kind, entities).
+
+  def __init__(self, kind, index_class=BitmapIndex):
+    self.kind = kind
+    self.index_class = index_class
+    self._index = None
+    self._pending = set()
+    self._replay = set()
+    # _lock guards the fields above and every read of the index; it is never
+    # held across SQL or a full build, so lookups and changed() (called on
+    # commit) don't wait for them. _load_lock lets one thread at a time load
+    # and apply changes, so they land in the order they were read.
+    self._lock = threading.Lock()
+    self._load_lock = threading.Lock()
+    self._rebuilding = False
+
+  def changed(self, ids):
+    with self._lock:
+      self._pending.update(ids)
+
+  def _update(self):
+    # Load the changed ids (or the whole index) outside _lock, then patch or
+    # swap in the result under it.
+    with self._lock:
+      if self._index is not None and not self._pending:
+        return
+    with self._load_lock:
+      with self._lock:
+        full = self._index is None or len(self._pending) > RELOAD_ALL_AFTER
+        ids, self._pending = self._pending, set()
+        if self._rebuilding:
+          # the copy being built may have been read before these changes
+          self._replay.update(ids)
+      if not full and not ids:
+        # another thread loaded them while this one waited
+        return
+      try:
+        if full:
+          index = self.index_class(self.kind, self.kind.load())
+        else:
+          entities = self.kind.load(ids)
+      except Exception:
+        with self._lock:
+          self._pending.update(ids)
+        raise
+      with self._lock:
+        if full:
+          # changes committed while loading are still pending
+          self._index = index
+          return
+        for entity_id in ids:
+          if entity_id in entities:
+            self._index.put(entity_id, *entities[entity_id])
+          else:
+            self._index.remove(entity_id)
+
+  def _current(self):
+    # The index, with a background rebuild started when it is too old;
+    # called under _lock after _update().
+    if not self._rebuilding and time.monotonic() - self._index.built_at > current_app.config['FACET_REFRESH_SECONDS']:
+      self._rebuilding = True
+      self._replay = set()
+      threading.Thread(target=self._rebuild, args=(current_app._get_current_object(),), daemon=True).start()
+    return self._index
+
+  def _rebuild(self, app):
+    try:
+      with app.app_context():
+        entities = self.kind.load()
+      index = self.index_class(self.kind, entities)
+      with self._lock:
+        # changes committed while loading are reloaded on the next request
+        self._index = index
+        self._pending.update(self._replay)
+    finally:
+      self._rebuilding = False
+
+  def read(self, function):
+    # function(index) on the current index, under the lock
+    self._update()
+    with self._lock:
+      return function(self._current())
+
+  def browse(self, filters, offset=0, limit=50):
+    return self.read(lambda index: index.browse(filters, offset, limit))
+
+
+venues = FacetIndex(FacetKind(Venue, ('state', 'city', 'seeking_talent'), genre_asoc_venue, 'Venue_id'))
+artists = FacetIndex(FacetKind(Artist, ('state', 'city'), genre_asoc_art, 'Aritst_id'))
+INDEXES = [(Venue, venues), (Artist, artists)]
+
+def track(model, index):
+  # Have commits touching `model` mark their ids changed in `index` too.
+  INDEXES.append((model, index))
+
+#  Change tracking
+#  ----------------------------------------------------------------
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _flushed(db_session, flush_context):
+  changed = db_session.info.setdefault('facet_changes', set())
+  for entity in list(db_session.new) + list(db_session.dirty) + list(db_session.deleted):
+    if isinstance(entity, (Venue, Artist)):
+      identity = db.inspect(entity).identity
+      changed.add((type(entity), identity[0] if identity else entity.id))
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _committed(db_session):
+  changed = db_session.info.pop('facet_changes', None)
+  if changed:
+    for model, index in INDEXES:
+      index.changed(entity_id for target, entity_id in changed if target is model)
+
+@event.listens_for(RoutingSession, 'after_rollback')
+def _rolled_back(db_session):
+  db_session.info.pop('facet_changes', None)
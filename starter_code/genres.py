@@ -0,0 +1,115 @@
+import threading
+import click
+from flask.cli import AppGroup
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import make_transient_to_detached
+from models import db, Genre
+from forms import GENRE_CHOICES
+
+#----------------------------------------------------------------------------#
+# Genre registry.
+#
+# The genre vocabulary is small and practically fixed (it mirrors the
+# choices in forms.py), so the name -> id map is loaded once per process and
+# the form handlers resolve the selected names from memory. Genre instances
+# are attached to the session with merge(load=False), which costs no query.
+# Names the map doesn't know yet are fetched together in one IN query. Any
+# insert, rename or delete of a Genre row through the ORM drops the map.
+#
+# Loading the map also inserts the forms.py genres the table lacks (e.g. a
+# fresh database nobody ran `flask genres seed` on), so every name the forms
+# offer resolves. A name that is neither in the table nor in forms.py raises
+# UnknownGenreError rather than being dropped from the venue or artist.
+#----------------------------------------------------------------------------#
+
+class UnknownGenreError(ValueError):
+  pass
+
+
+class GenreRegistry(object):
+
+  def __init__(self):
+    self._ids = None
+    self._lock = threading.Lock()
+
+  def _load(self):
+    with self._lock:
+      if self._ids is None:
+        # no autoflush: on SQLite a flushed pending venue would lock out the
+        # insert below
+        with db.session.no_autoflush:
+          ids = dict(db.session.query(Genre.name, Genre.id).all())
+        missing = [value for value, _ in GENRE_CHOICES if value not in ids]
+        if missing:
+          ids.update(self._insert(missing))
+        self._ids = ids
+      return self._ids
+
+  def _insert(self, names):
+    # {name: id} for `names`, inserted if need be in a transaction of their
+    # own, so the caller's rollback doesn't take them back out of the map
+    with db.engine.begin() as connection:
+      insert = postgresql.insert if connection.dialect.name == 'postgresql' else sqlite.insert
+      connection.execute(insert(Genre.__table__).on_conflict_do_nothing(index_elements=['name']),
+                         [{"name": name} for name in names])
+      return dict(connection.execute(db.select(Genre.name, Genre.id).where(Genre.name.in_(names))).all())
+
+  def invalidate(self):
+    with self._lock:
+      self._ids = None
+
+  def resolve(self, names):
+    # Genre instances for `names`, in order. Raises UnknownGenreError for
+    # names that don't exist.
+    ids = self._load()
+    missing = [name for name in names if name not in ids]
+    if missing:
+      found = db.session.query(Genre.name, Genre.id).filter(Genre.name.in_(missing)).all()
+      with self._lock:
+        ids.update(found)
+      unknown = [name for name in missing if name not in ids]
+      if unknown:
+        raise UnknownGenreError('unknown genre(s): {}'.format(', '.join(unknown)))
+    return [self._attach(ids[name], name) for name in names]
+
+  def _attach(self, genre_id, name):
+    genre = Genre(id=genre_id, name=name)
+    make_transient_to_detached(genre)
+    return db.session.merge(genre, load=False)
+
+  def seed(self, names=None):
+    # Insert any of `names` (default: the forms.py choices) not yet in the
+    # Genre table. Returns the number of rows added.
+    names = names or [value for value, _ in GENRE_CHOICES]
+    existing = {name for name, in db.session.query(Genre.name).filter(Genre.name.in_(names))}
+    added = [Genre(name=name) for name in names if name not in existing]
+    db.session.add_all(added)
+    db.session.commit()
+    return len(added)
+
+registry = GenreRegistry()
+
+def _genre_added_or_removed(mapper, connection, target):
+  registry.invalidate()
+
+def _genre_updated(mapper, connection, target):
+  # Genres attached to a venue/artist also flush as "updated" because their
+  # backref collection changed; only a rename matters here.
+  if db.inspect(target).attrs.name.history.has_changes():
+    registry.invalidate()
+
+event.listen(Genre, 'after_insert', _genre_added_or_removed)
+event.listen(Genre, 'after_delete', _genre_added_or_removed)
+event.listen(Genre, 'after_update', _genre_updated)
+
+#  CLI
+#  ----------------------------------------------------------------
+
+cli = AppGroup('genres', help='Manage the genre vocabulary.')
+
+@cli.command('seed')
+def seed_command():
+  # flask genres seed: create the genres offered by the forms
+  added = registry.seed()
+  click.echo('Added {} genre(s).'.format(added))
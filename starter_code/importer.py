@@ -0,0 +1,275 @@
+import csv
+import io
+import json
+import os
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy.exc import SQLAlchemyError
+from werkzeug.datastructures import MultiDict
+from wtforms import BooleanField, SelectMultipleField
+from forms import VenueForm, ArtistForm, ShowForm
+from models import db, Venue, Artist, Show, as_utc
+import availability
+import counters
+import genres
+import reports
+import scheduling
+
+#----------------------------------------------------------------------------#
+# Bulk import.
+#
+#   flask import venues venues.csv
+#   flask import artists artists.ndjson --chunk-size 5000
+#   flask import shows shows.csv --errors rejected.ndjson
+#
+# Files are streamed row by row (CSV with a header line, or one JSON object
+# per line) so memory use doesn't depend on file size. Every row goes
+# through the same WTForms validators as the HTML forms, so columns are
+# named after the form fields (website_link, seeking_talent, ...); genres
+# are a list in NDJSON or ';'-separated in CSV. Valid rows are written in
+# chunks: genres come from the genre registry, show foreign keys are checked
+# with one IN query per chunk, shows that would double-book a venue or an
+# artist are rejected (scheduling.check_batch), and shows are inserted with
+# executemany (COPY on PostgreSQL/psycopg2). A row that fails validation or insertion is
+# reported with its line number and the load carries on.
+#----------------------------------------------------------------------------#
+
+GENRE_SEPARATOR = ';'
+FALSE_VALUES = ('', '0', 'n', 'no', 'f', 'false', 'off')
+
+class ImportReport(object):
+
+  def __init__(self, errors_path=None):
+    self.imported = 0
+    self.rejected = 0
+    self._sink = open(errors_path, 'w') if errors_path else None
+
+  def reject(self, line_no, message):
+    self.rejected += 1
+    if self._sink is not None:
+      self._sink.write(json.dumps({"line": line_no, "error": message}) + '\n')
+    else:
+      click.echo('line {}: {}'.format(line_no, message), err=True)
+
+  def close(self):
+    if self._sink is not None:
+      self._sink.close()
+
+#  Reading and validation
+#  ----------------------------------------------------------------
+
+def read_rows(stream, fmt):
+  # Yields (line_no, row, error) with exactly one of row/error set.
+  if fmt == 'csv':
+    for line_no, row in enumerate(csv.DictReader(stream), start=2):
+      yield line_no, row, None
+    return
+  for line_no, line in enumerate(stream, start=1):
+    if not line.strip():
+      continue
+    try:
+      row = json.loads(line)
+    except ValueError as e:
+      yield line_no, None, 'invalid JSON: {}'.format(e)
+      continue
+    if not isinstance(row, dict):
+      yield line_no, None, 'expected a JSON object'
+      continue
+    yield line_no, row, None
+
+def _formdata(row, form_class):
+  data = MultiDict()
+  for name, value in row.items():
+    if value is None:
+      continue
+    field_class = getattr(getattr(form_class, name, None), 'field_class', type(None))
+    if issubclass(field_class, SelectMultipleField):
+      values = value if isinstance(value, list) else str(value).split(GENRE_SEPARATOR)
+      data.setlist(name, [v.strip() for v in values if str(v).strip()])
+    elif issubclass(field_class, BooleanField):
+      if str(value).strip().lower() not in FALSE_VALUES:
+        data[name] = 'y'
+    else:
+      data[name] = str(value)
+  return data
+
+def validate(form_class, row):
+  # (form, None) for a valid row, (None, message) otherwise.
+  form = form_class(formdata=_formdata(row, form_class), meta={'csrf': False})
+  if form.validate():
+    return form, None
+  errors = '; '.join('{}: {}'.format(field, ', '.join(messages))
+                     for field, messages in sorted(form.errors.items()))
+  return None, errors
+
+#  Writers
+#  ----------------------------------------------------------------
+
+def _commit_entities(chunk, report):
+  # Insert a chunk of ORM objects in one transaction; if that fails, retry
+  # them one at a time so only the offending rows are rejected.
+  db.session.add_all([entity for _, entity in chunk])
+  try:
+    db.session.commit()
+    report.imported += len(chunk)
+    return
+  except SQLAlchemyError:
+    db.session.rollback()
+  for line_no, entity in chunk:
+    db.session.add(entity)
+    try:
+      db.session.commit()
+      report.imported += 1
+    except SQLAlchemyError as e:
+      db.session.rollback()
+      report.reject(line_no, str(e.orig if hasattr(e, 'orig') else e))
+
+def write_venues(chunk, report):
+  entities = []
+  for line_no, form in chunk:
+    venue = Venue(name=form.name.data, city=form.city.data, state=form.state.data,
+                  address=form.address.data, phone=form.phone.data,
+                  image_link=form.image_link.data, facebook_link=form.facebook_link.data,
+                  website=form.website_link.data, seeking_talent=form.seeking_talent.data,
+                  seeking_description=form.seeking_description.data)
+    venue.genres = genres.registry.resolve(form.genres.data)
+    entities.append((line_no, venue))
+  _commit_entities(entities, report)
+
+def write_artists(chunk, report):
+  entities = []
+  for line_no, form in chunk:
+    artist = Artist(name=form.name.data, city=form.city.data, state=form.state.data,
+                    phone=form.phone.data, image_link=form.image_link.data,
+                    facebook_link=form.facebook_link.data)
+    artist.genres = genres.registry.resolve(form.genres.data)
+    entities.append((line_no, artist))
+  _commit_entities(entities, report)
+
+def _existing_ids(model, ids):
+  if not ids:
+    return set()
+  return set(entity_id for entity_id, in db.session.query(model.id).filter(model.id.in_(ids)))
+
+def _copy_shows(rows):
+  # COPY the chunk on psycopg2; returns False when COPY isn't available.
+  if db.session.get_bind().dialect.name != 'postgresql':
+    return False
+  cursor = db.session.connection().connection.cursor()
+  if not hasattr(cursor, 'copy_expert'):
+    return False
+  buffer = io.StringIO()
+  for row in rows:
+    buffer.write('{}\t{}\t{}\t{}\t1\n'.format(row['start_time'].isoformat(' '), row['end_time'].isoformat(' '),
+                                               row['artist_id'], row['venue_id']))
+  buffer.seek(0)
+  cursor.copy_expert('COPY "Show" (start_time, end_time, artist_id, venue_id, version) FROM STDIN', buffer)
+  return True
+
+def _insert_shows(rows, use_copy):
+  if not (use_copy and _copy_shows(rows)):
+    db.session.execute(Show.__table__.insert(), [dict(row, version=1) for row in rows])
+  counters.record_shows(rows)
+  availability.record_shows(rows)
+  reports.record_shows(rows)
+
+def write_shows(chunk, report, use_copy=True):
+  rows = []
+  for line_no, form in chunk:
+    try:
+      row = {
+        "venue_id": int(form.venue_id.data),
+        "artist_id": int(form.artist_id.data),
+        "start_time": as_utc(form.start_time.data)
+      }
+    except ValueError:
+      report.reject(line_no, 'venue_id and artist_id must be integers')
+      continue
+    row['end_time'] = scheduling.show_end(row['start_time'], form.end_time.data)
+    problem = scheduling.check_times(row['start_time'], row['end_time'])
+    if problem is not None:
+      report.reject(line_no, problem)
+    else:
+      rows.append((line_no, row))
+  venues = _existing_ids(Venue, set(row['venue_id'] for _, row in rows))
+  artists = _existing_ids(Artist, set(row['artist_id'] for _, row in rows))
+  valid = []
+  for line_no, row in rows:
+    if row['venue_id'] not in venues:
+      report.reject(line_no, 'venue_id: no venue {}'.format(row['venue_id']))
+    elif row['artist_id'] not in artists:
+      report.reject(line_no, 'artist_id: no artist {}'.format(row['artist_id']))
+    else:
+      valid.append((line_no, row))
+  valid, conflicting = scheduling.check_batch(valid)
+  for line_no, conflicts in conflicting:
+    report.reject(line_no, 'overlaps ' + '; '.join(scheduling.describe(conflict) for conflict in conflicts))
+  if not valid:
+    return
+
+  try:
+    _insert_shows([row for _, row in valid], use_copy)
+    db.session.commit()
+    report.imported += len(valid)
+    return
+  except SQLAlchemyError:
+    db.session.rollback()
+  for line_no, row in valid:
+    try:
+      _insert_shows([row], use_copy=False)
+      db.session.commit()
+      report.imported += 1
+    except SQLAlchemyError as e:
+      db.session.rollback()
+      report.reject(line_no, str(e.orig if hasattr(e, 'orig') else e))
+
+#  Driver
+#  ----------------------------------------------------------------
+
+def run_import(path, form_class, writer, fmt=None, chunk_size=None, errors_path=None):
+  # Stream `path` through validation into `writer` chunk by chunk.
+  fmt = fmt or ('csv' if os.path.splitext(path)[1].lower() == '.csv' else 'ndjson')
+  chunk_size = chunk_size or current_app.config['IMPORT_CHUNK_SIZE']
+  report = ImportReport(errors_path)
+  try:
+    with open(path, newline='', encoding='utf-8') as stream:
+      chunk = []
+      for line_no, row, error in read_rows(stream, fmt):
+        if error is None:
+          form, error = validate(form_class, row)
+        if error is not None:
+          report.reject(line_no, error)
+          continue
+        chunk.append((line_no, form))
+        if len(chunk) >= chunk_size:
+          writer(chunk, report)
+          chunk = []
+      if chunk:
+        writer(chunk, report)
+  finally:
+    report.close()
+  return report
+
+#  CLI
+#  ----------------------------------------------------------------
+
+cli = AppGroup('import', help='Bulk-load venues, artists and shows from CSV or NDJSON.')
+
+def _import_command(name, form_class, writer):
+  @cli.command(name, help='Import {} from PATH.'.format(name))
+  @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+  @click.option('--format', 'fmt', type=click.Choice(['csv', 'ndjson']),
+                help='Input format; guessed from the file extension by default.')
+  @click.option('--chunk-size', type=click.IntRange(min=1),
+                help='Rows per transaction (default: IMPORT_CHUNK_SIZE).')
+  @click.option('--errors', 'errors_path', type=click.Path(dir_okay=False),
+                help='Write rejected rows here as NDJSON instead of to stderr.')
+  def command(path, fmt, chunk_size, errors_path):
+    report = run_import(path, form_class, writer, fmt, chunk_size, errors_path)
+    click.echo('Imported {} {}, rejected {} row(s).'.format(report.imported, name, report.rejected))
+  return command
+
+_import_command('venues', VenueForm, write_venues)
+_import_command('artists', ArtistForm, write_artists)
+_import_command('shows', ShowForm, write_shows)
@@ -0,0 +1,237 @@
+import json
+import os
+import signal
+import socket
+import threading
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import timedelta
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy.dialects import postgresql, sqlite
+from models import db, Job, utcnow
+
+#----------------------------------------------------------------------------#
+# Background jobs.
+#
+# Handlers call enqueue() for work that shouldn't hold up the response, and
+# `flask jobs worker` runs it. There is no broker: a job is a row in the job
+# table, inserted in the handler's own transaction. So it exists only if the
+# handler commits, and workers see it only once the handler has committed.
+#
+# A worker claims due jobs, lowest priority number first, by flipping them
+# from queued to running with UPDATE ... RETURNING. On PostgreSQL the
+# candidates are picked with FOR UPDATE SKIP LOCKED, so any number of
+# workers can poll the same table. It runs each job in a thread pool,
+# inside its own app context and session. The job's writes and the job's
+# "done" are committed together, so a job that succeeds takes effect
+# exactly once. A job that raises is retried with exponential backoff
+# (JOB_RETRY_SECONDS, doubling up to JOB_RETRY_MAX_SECONDS). After its
+# task's max_attempts it stays failed until `flask jobs retry`. A worker
+# that dies mid-job leaves it running. Another worker requeues it once its
+# lock is JOB_LOCK_TIMEOUT old, so tasks should be safe to run twice.
+#
+# Idempotency keys: enqueueing a key that is already in the table is a
+# no-op, until `flask jobs prune` deletes the finished job.
+#
+# With JOBS_EAGER set (tests, quick local runs) enqueue() runs the task on
+# the spot, in the caller's transaction, and no worker is needed.
+#----------------------------------------------------------------------------#
+
+QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+
+# Priorities: lower numbers are claimed first
+HIGH, NORMAL, LOW = 10, 50, 90
+
+TASKS = {}
+
+
+class Task(object):
+
+  def __init__(self, name, function, priority, max_attempts):
+    self.name = name
+    self.function = function
+    self.priority = priority
+    self.max_attempts = max_attempts
+
+
+def task(name, priority=NORMAL, max_attempts=5):
+  # Register a function as the job `name`; it is called with the payload's
+  # items as keyword arguments.
+  def register(function):
+    TASKS[name] = Task(name, function, priority, max_attempts)
+    return function
+  return register
+
+def enqueue(name, payload=None, priority=None, key=None, delay=0):
+  # Queue job `name` in the current transaction, `delay` seconds from now.
+  # `payload` must be JSON-serializable. With `key`, a job already queued
+  # under the same key wins and this call does nothing.
+  if name not in TASKS:
+    raise ValueError('unknown job {!r}'.format(name))
+  task = TASKS[name]
+  payload = payload or {}
+  if current_app.config['JOBS_EAGER']:
+    task.function(**payload)
+    return
+  now = utcnow()
+  dialect = db.session.get_bind().dialect.name
+  insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+  statement = insert(Job.__table__).values(
+    name=name, payload=json.dumps(payload), status=QUEUED,
+    priority=task.priority if priority is None else priority,
+    attempts=0, max_attempts=task.max_attempts,
+    run_at=now + timedelta(seconds=delay), created_at=now, idempotency_key=key)
+  if key is not None:
+    statement = statement.on_conflict_do_nothing(index_elements=['idempotency_key'])
+  db.session.execute(statement)
+
+def _backoff(attempts):
+  config = current_app.config
+  return timedelta(seconds=min(config['JOB_RETRY_SECONDS'] * 2 ** (attempts - 1), config['JOB_RETRY_MAX_SECONDS']))
+
+#  Worker
+#  ----------------------------------------------------------------
+
+class Worker(object):
+
+  def __init__(self, app, concurrency=4, poll_interval=1.0, name=None):
+    self.app = app
+    self.concurrency = concurrency
+    self.poll_interval = poll_interval
+    self.name = name or '{}:{}'.format(socket.gethostname(), os.getpid())
+    self._stopping = threading.Event()
+
+  def stop(self):
+    # Claim nothing more; run() returns once the running jobs finish.
+    self._stopping.set()
+
+  def _requeue_stale(self, now):
+    # Jobs whose worker died: retry them, or fail them when out of attempts.
+    table = Job.__table__
+    stale = db.and_(table.c.status == RUNNING,
+                    table.c.locked_at < now - timedelta(seconds=current_app.config['JOB_LOCK_TIMEOUT']))
+    db.session.execute(table.update().where(stale, table.c.attempts >= table.c.max_attempts)
+                       .values(status=FAILED, finished_at=now, last_error='worker lost'))
+    db.session.execute(table.update().where(stale)
+                       .values(status=QUEUED, run_at=now, locked_at=None, locked_by=None))
+
+  def claim(self, limit):
+    # Up to `limit` due jobs, now marked running by this worker
+    table = Job.__table__
+    with self.app.app_context():
+      now = utcnow()
+      self._requeue_stale(now)
+      due = (db.select(table.c.id)
+             .where(table.c.status == QUEUED, table.c.run_at <= now)
+             .order_by(table.c.priority, table.c.run_at, table.c.id)
+             .limit(limit)
+             .with_for_update(skip_locked=True))
+      # the status check keeps two workers from claiming the same job where
+      # there is no SKIP LOCKED
+      claimed = db.session.execute(
+        table.update()
+          .where(table.c.id.in_(due.scalar_subquery()), table.c.status == QUEUED)
+          .values(status=RUNNING, locked_at=now, locked_by=self.name, attempts=table.c.attempts + 1)
+          .returning(table.c.id, table.c.name, table.c.payload, table.c.attempts, table.c.max_attempts)).all()
+      db.session.commit()
+      return sorted(claimed, key=lambda job: job.id)
+
+  def execute(self, job):
+    table = Job.__table__
+    mine = db.and_(table.c.id == job.id, table.c.locked_by == self.name, table.c.status == RUNNING)
+    with self.app.app_context():
+      try:
+        if job.name not in TASKS:
+          raise LookupError('no task registered as {!r}'.format(job.name))
+        TASKS[job.name].function(**json.loads(job.payload))
+        db.session.execute(table.update().where(mine).values(status=DONE, finished_at=utcnow(), last_error=None))
+        db.session.commit()
+        return True
+      except Exception:
+        db.session.rollback()
+        error = traceback.format_exc()
+        now = utcnow()
+        if job.attempts >= job.max_attempts:
+          values = {'status': FAILED, 'finished_at': now}
+          self.app.logger.error('job %s (%s) failed for good:\n%s', job.id, job.name, error)
+        else:
+          values = {'status': QUEUED, 'run_at': now + _backoff(job.attempts), 'locked_at': None, 'locked_by': None}
+          self.app.logger.warning('job %s (%s) failed, attempt %s of %s:\n%s',
+                                  job.id, job.name, job.attempts, job.max_attempts, error)
+        db.session.execute(table.update().where(mine).values(last_error=error, **values))
+        db.session.commit()
+        return False
+
+  def run(self, burst=False):
+    # Claim and run jobs until stop(); with `burst`, until none are due.
+    running = set()
+    with ThreadPoolExecutor(self.concurrency, thread_name_prefix='job') as pool:
+      while not self._stopping.is_set():
+        running = set(future for future in running if not future.done())
+        claimed = self.claim(self.concurrency - len(running)) if len(running) < self.concurrency else []
+        for job in claimed:
+          running.add(pool.submit(self.execute, job))
+        if claimed:
+          continue
+        if burst and not running:
+          break
+        if running:
+          wait(running, timeout=self.poll_interval, return_when=FIRST_COMPLETED)
+        else:
+          self._stopping.wait(self.poll_interval)
+
+#  CLI
+#  ----------------------------------------------------------------
+
+cli = AppGroup('jobs', help='Run and inspect background jobs.')
+
+@cli.command('worker')
+@click.option('--concurrency', type=int, default=None, help='Jobs run at once (default JOBS_CONCURRENCY).')
+@click.option('--poll', 'poll_interval', type=float, default=None,
+              help='Seconds between polls when idle (default JOBS_POLL_SECONDS).')
+@click.option('--burst', is_flag=True, help='Exit once no job is due.')
+def worker_command(concurrency, poll_interval, burst):
+  # flask jobs worker: run jobs until SIGINT/SIGTERM
+  config = current_app.config
+  worker = Worker(current_app._get_current_object(),
+                  concurrency=concurrency or config['JOBS_CONCURRENCY'],
+                  poll_interval=poll_interval or config['JOBS_POLL_SECONDS'])
+  for signum in (signal.SIGINT, signal.SIGTERM):
+    signal.signal(signum, lambda *args: worker.stop())
+  click.echo('Worker {} running {} jobs at a time.'.format(worker.name, worker.concurrency))
+  worker.run(burst=burst)
+
+@cli.command('status')
+def status_command():
+  # flask jobs status: jobs per status, and how long the oldest due one waited
+  counts = db.session.execute(db.select(Job.status, db.func.count()).group_by(Job.status)).all()
+  for status, count in sorted(counts):
+    click.echo('{:8} {}'.format(status, count))
+  oldest = db.session.execute(db.select(db.func.min(Job.run_at))
+                              .where(Job.status == QUEUED, Job.run_at <= utcnow())).scalar()
+  if oldest is not None:
+    click.echo('oldest due job waiting {}'.format(utcnow() - oldest))
+
+@cli.command('retry')
+@click.argument('ids', nargs=-1, type=int)
+def retry_command(ids):
+  # flask jobs retry [ID...]: queue failed jobs (all of them by default) again
+  table = Job.__table__
+  query = table.update().where(table.c.status == FAILED)
+  if ids:
+    query = query.where(table.c.id.in_(ids))
+  result = db.session.execute(query.values(status=QUEUED, attempts=0, run_at=utcnow(), finished_at=None,
+                                           locked_at=None, locked_by=None))
+  db.session.commit()
+  click.echo('{} jobs queued again.'.format(result.rowcount))
+
+@cli.command('prune')
+@click.option('--days', type=int, default=7, help='Keep finished jobs this many days.')
+def prune_command(days):
+  # flask jobs prune: delete done jobs finished more than --days ago
+  result = db.session.execute(Job.__table__.delete().where(
+    Job.status == DONE, Job.finished_at < utcnow() - timedelta(days=days)))
+  db.session.commit()
+  click.echo('{} jobs deleted.'.format(result.rowcount))
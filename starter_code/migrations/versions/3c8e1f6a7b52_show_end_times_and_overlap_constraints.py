@@ -0,0 +1,81 @@
+"""show end times and overlap constraints
+
+Revision ID: 3c8e1f6a7b52
+Revises: 5f0b7c2d9a41
+Create Date: 2026-10-18 15:02:44.318920
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c8e1f6a7b52'
+down_revision = '5f0b7c2d9a41'
+branch_labels = None
+depends_on = None
+
+
+# Existing shows get config.SHOW_DEFAULT_MINUTES
+DEFAULT_MINUTES = 120
+
+# (constraint, column) of the PostgreSQL exclusion constraints
+OVERLAP_CONSTRAINTS = (
+    ('ex_Show_venue_overlap', 'venue_id'),
+    ('ex_Show_artist_overlap', 'artist_id'),
+)
+
+# Pairs of existing shows that the constraint on `column` would reject
+OVERLAPPING_SHOWS = """
+SELECT a.id, b.id FROM "Show" a JOIN "Show" b
+  ON a.{column} = b.{column} AND a.id < b.id
+ AND a.start_time < b.end_time AND b.start_time < a.end_time
+LIMIT 20
+"""
+
+
+def backfill_end_times():
+    bind = op.get_bind()
+    if bind.dialect.name == 'postgresql':
+        op.execute("UPDATE \"Show\" SET end_time = start_time + interval '{} minutes'".format(DEFAULT_MINUTES))
+    else:
+        # keep SQLAlchemy's "YYYY-MM-DD HH:MM:SS.ffffff" storage format
+        op.execute("UPDATE \"Show\" SET end_time = datetime(start_time, '+{} minutes') || substr(start_time, 20)"
+                   .format(DEFAULT_MINUTES))
+
+
+def check_no_overlaps(column):
+    pairs = op.get_bind().execute(sa.text(OVERLAPPING_SHOWS.format(column=column))).all()
+    if pairs:
+        raise RuntimeError(
+            'Shows overlap on {}: {}. Move or shorten them (UPDATE "Show" SET end_time = ...) '
+            'and run the upgrade again.'.format(column, ', '.join('{}/{}'.format(a, b) for a, b in pairs)))
+
+
+def upgrade():
+    with op.batch_alter_table('Show', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('end_time', sa.DateTime(timezone=True), nullable=True))
+
+    backfill_end_times()
+
+    with op.batch_alter_table('Show', schema=None) as batch_op:
+        batch_op.alter_column('end_time', existing_type=sa.DateTime(timezone=True), nullable=False)
+        batch_op.create_check_constraint('ck_Show_end_after_start', 'end_time > start_time')
+
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+    for name, column in OVERLAP_CONSTRAINTS:
+        check_no_overlaps(column)
+        op.create_exclude_constraint(name, 'Show', (column, '='),
+                                     (sa.text('tstzrange(start_time, end_time)'), '&&'), using='gist')
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        for name, _ in OVERLAP_CONSTRAINTS:
+            op.drop_constraint(name, 'Show')
+
+    with op.batch_alter_table('Show', schema=None) as batch_op:
+        batch_op.drop_constraint('ck_Show_end_after_start', type_='check')
+        batch_op.drop_column('end_time')
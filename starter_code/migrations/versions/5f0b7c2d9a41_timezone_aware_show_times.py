@@ -0,0 +1,47 @@
+"""timezone aware show times
+
+Revision ID: 5f0b7c2d9a41
+Revises: ad4768e1d91c
+Create Date: 2026-10-18 14:40:12.204117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5f0b7c2d9a41'
+down_revision = 'ad4768e1d91c'
+branch_labels = None
+depends_on = None
+
+
+# (table, column) of every UTCDateTime column; the stored values are UTC
+UTC_COLUMNS = (
+    ('Show', 'start_time'),
+    ('counter_state', 'rolled_until'),
+)
+
+
+def upgrade():
+    # Only PostgreSQL has a zoned timestamp type; elsewhere the column keeps
+    # storing naive UTC and models.UTCDateTime attaches the zone on load.
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    for table, column in UTC_COLUMNS:
+        op.alter_column(table, column,
+                        existing_type=sa.DateTime(),
+                        type_=sa.DateTime(timezone=True),
+                        existing_nullable=False,
+                        postgresql_using="{} AT TIME ZONE 'UTC'".format(column))
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    for table, column in UTC_COLUMNS:
+        op.alter_column(table, column,
+                        existing_type=sa.DateTime(timezone=True),
+                        type_=sa.DateTime(),
+                        existing_nullable=False,
+                        postgresql_using="{} AT TIME ZONE 'UTC'".format(column))
@@ -0,0 +1,267 @@
+from datetime import datetime, timedelta, timezone
+from flask import current_app
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import DDL, event, inspect
+from sqlalchemy.dialects.postgresql import ExcludeConstraint, TSVECTOR
+from replicas import RoutingSession
+
+# Reads in read-only requests may go to a replica (see replicas.py).
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+# Weighted full-text document for venue/artist search (see search.py). A real
+# tsvector on PostgreSQL; plain lowercased text on other databases, where the
+# search fallback matches it with LIKE.
+SearchVector = db.Text().with_variant(TSVECTOR(), 'postgresql')
+
+def utcnow():
+  return datetime.now(timezone.utc)
+
+def as_utc(value):
+  # Aware UTC datetime for `value`; naive datetimes are taken to be UTC.
+  if value.tzinfo is None:
+    return value.replace(tzinfo=timezone.utc)
+  return value.astimezone(timezone.utc)
+
+class UTCDateTime(db.TypeDecorator):
+  # Timezone-aware UTC datetimes both ways: TIMESTAMP WITH TIME ZONE on
+  # PostgreSQL, naive UTC in databases without a zoned timestamp type.
+  impl = db.DateTime(timezone=True)
+  cache_ok = True
+
+  def process_bind_param(self, value, dialect):
+    if value is None:
+      return None
+    value = as_utc(value)
+    return value if dialect.name == 'postgresql' else value.replace(tzinfo=None)
+
+  def process_result_value(self, value, dialect):
+    return as_utc(value) if value is not None else None
+
+def default_end_time(context):
+  # Shows inserted without an end time last SHOW_DEFAULT_MINUTES.
+  start_time = context.get_current_parameters()['start_time']
+  return start_time + timedelta(minutes=current_app.config['SHOW_DEFAULT_MINUTES'])
+
+# The trigram indexes below need pg_trgm, and the Show exclusion constraints
+# btree_gist; make sure they exist when the schema is built with
+# db.create_all() rather than through the migrations.
+event.listen(db.metadata, 'before_create',
+  DDL('CREATE EXTENSION IF NOT EXISTS pg_trgm').execute_if(dialect='postgresql'))
+event.listen(db.metadata, 'before_create',
+  DDL('CREATE EXTENSION IF NOT EXISTS btree_gist').execute_if(dialect='postgresql'))
+
+#----------------------------------------------------------------------------#
+# Models.
+#----------------------------------------------------------------------------#
+
+genre_asoc_venue = db.Table('genre_asoc_venue', 
+  db.Column('Venue_id', db.Integer,db.ForeignKey('Venue.id'),primary_key = True),
+  db.Column('Genre_id', db.Integer, db.ForeignKey('Genre.id'), primary_key = True)
+)
+
+genre_asoc_art = db.Table('genre_asoc_art',
+  db.Column('Aritst_id', db.Integer,db.ForeignKey('Artist.id'),primary_key = True),
+  db.Column('Genre_id', db.Integer, db.ForeignKey('Genre.id'), primary_key = True)
+)
+
+class Venue(db.Model):
+    __tablename__ = 'Venue'
+    __table_args__ = (
+        db.Index('ix_Venue_search_vector', 'search_vector', postgresql_using='gin'),
+        db.Index('ix_Venue_name_trgm', 'name', postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+        # venues grouped by area (repository.venue_areas); covering on PostgreSQL
+        db.Index('ix_Venue_state_city', 'state', 'city', 'id', postgresql_include=['name', 'upcoming_shows_count']),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String())  
+    city = db.Column(db.String(120))
+    state = db.Column(db.String(120))
+    address = db.Column(db.String(120))
+    phone = db.Column(db.String(120))
+    image_link = db.Column(db.String(500))
+    facebook_link = db.Column(db.String(120))
+    website = db.Column(db.String(120))
+    seeking_talent = db.Column(db.Boolean, nullable = False,default=False)
+    seeking_description = db.Column(db.String(120))
+    # Show counters maintained by counters.py, split at counter_state.rolled_until
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    search_vector = db.deferred(db.Column(SearchVector))
+    # Row version, bumped by every UPDATE; the API derives its ETags from it
+    version = db.Column(db.Integer, nullable=False, server_default='1')
+    __mapper_args__ = {'version_id_col': version}
+    genres = db.relationship('Genre',secondary = genre_asoc_venue, backref= db.backref('venue',lazy = True))
+    shows  = db.relationship('Show', backref= db.backref('venue', lazy = True))
+
+    # TODO: implement any missing fields, as a database migration using Flask-Migrate
+
+class Artist(db.Model):
+    __tablename__ = 'Artist'
+    __table_args__ = (
+        db.Index('ix_Artist_search_vector', 'search_vector', postgresql_using='gin'),
+        db.Index('ix_Artist_name_trgm', 'name', postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+        # the /artists listing (repository.artist_list); covering on PostgreSQL
+        db.Index('ix_Artist_id_name', 'id', postgresql_include=['name']),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String)
+    city = db.Column(db.String(120))
+    state = db.Column(db.String(120))
+    phone = db.Column(db.String(120))
+    genres = db.Column(db.String(120))
+    image_link = db.Column(db.String(500))
+    facebook_link = db.Column(db.String(120))
+    # Show counters maintained by counters.py, split at counter_state.rolled_until
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    search_vector = db.deferred(db.Column(SearchVector))
+    # Row version, bumped by every UPDATE; the API derives its ETags from it
+    version = db.Column(db.Integer, nullable=False, server_default='1')
+    __mapper_args__ = {'version_id_col': version}
+    genres = db.relationship('Genre',secondary = genre_asoc_art, backref= db.backref('artist',lazy = True))
+    shows  = db.relationship('Show', backref= db.backref('artist', lazy = True))
+
+    # TODO: implement any missing fields, as a database migration using Flask-Migrate
+
+# TODO Implement Show and Artist models, and complete all model relationships and properties, as a database migration.
+
+class Genre(db.Model):
+  __tablename__ = 'Genre'
+  __table_args__ = (
+    db.Index('ix_Genre_name', 'name', unique=True),
+  )
+
+  id = db.Column(db.Integer,primary_key = True)
+  name = db.Column(db.String(120), nullable = False)
+
+# A genre edit only writes the association table and leaves the Venue/Artist
+# row itself clean, so its version (and the API's ETag) would not move. Bump
+# it explicitly whenever the genres collection has changed.
+@event.listens_for(RoutingSession, 'before_flush')
+def _bump_version_on_genre_edit(session, flush_context, instances):
+  for entity in session.dirty:
+    if isinstance(entity, (Venue, Artist)) and inspect(entity).attrs.genres.history.has_changes():
+      entity.version = entity.version + 1
+
+
+
+class CounterState(db.Model):
+    __tablename__ = 'counter_state'
+
+    # Single row: the instant up to which shows have been rolled from the
+    # upcoming to the past counters.
+    id = db.Column(db.Integer, primary_key=True)
+    rolled_until = db.Column(UTCDateTime, nullable=False)
+
+
+class VenueDay(db.Model):
+    __tablename__ = 'venue_day'
+
+    # Shows touching each local calendar day, maintained by availability.py;
+    # days without shows have no row.
+    venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    shows = db.Column(db.Integer, nullable=False)
+
+
+class ArtistDay(db.Model):
+    __tablename__ = 'artist_day'
+
+    artist_id = db.Column(db.Integer, db.ForeignKey('Artist.id'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    shows = db.Column(db.Integer, nullable=False)
+
+
+class ReportVenueDay(db.Model):
+    __tablename__ = 'report_venue_day'
+
+    # Daily rollups behind /reports, maintained by reports.py: shows and
+    # booked minutes per local start day and venue/artist/genre.
+    day = db.Column(db.Date, primary_key=True)
+    venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id'), primary_key=True)
+    shows = db.Column(db.Integer, nullable=False)
+    minutes = db.Column(db.Integer, nullable=False)
+
+
+class ReportArtistDay(db.Model):
+    __tablename__ = 'report_artist_day'
+
+    day = db.Column(db.Date, primary_key=True)
+    artist_id = db.Column(db.Integer, db.ForeignKey('Artist.id'), primary_key=True)
+    shows = db.Column(db.Integer, nullable=False)
+    minutes = db.Column(db.Integer, nullable=False)
+
+
+class ReportGenreDay(db.Model):
+    __tablename__ = 'report_genre_day'
+
+    day = db.Column(db.Date, primary_key=True)
+    genre_id = db.Column(db.Integer, db.ForeignKey('Genre.id'), primary_key=True)
+    shows = db.Column(db.Integer, nullable=False)
+    minutes = db.Column(db.Integer, nullable=False)
+
+
+class Recommendation(db.Model):
+    __tablename__ = 'recommendation'
+
+    # Top-k lists computed in batch by recommendations.py. target_id is an
+    # artist or a venue depending on kind, so it has no foreign key.
+    kind = db.Column(db.String(20), primary_key=True)
+    subject_id = db.Column(db.Integer, primary_key=True)
+    rank = db.Column(db.SmallInteger, primary_key=True)
+    target_id = db.Column(db.Integer, nullable=False)
+    score = db.Column(db.Float, nullable=False)
+
+
+class Job(db.Model):
+    __tablename__ = 'job'
+    __table_args__ = (
+        # the worker's claim: due queued jobs, lowest priority number first
+        db.Index('ix_job_status_priority_run_at', 'status', 'priority', 'run_at'),
+        # at most one job per idempotency key
+        db.Index('ix_job_idempotency_key', 'idempotency_key', unique=True),
+    )
+
+    # Deferred work run by jobs.py's worker.
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    payload = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(10), nullable=False)
+    priority = db.Column(db.Integer, nullable=False)
+    attempts = db.Column(db.Integer, nullable=False)
+    max_attempts = db.Column(db.Integer, nullable=False)
+    run_at = db.Column(UTCDateTime, nullable=False)
+    created_at = db.Column(UTCDateTime, nullable=False)
+    locked_at = db.Column(UTCDateTime)
+    locked_by = db.Column(db.String(100))
+    finished_at = db.Column(UTCDateTime)
+    last_error = db.Column(db.Text)
+    idempotency_key = db.Column(db.String(200))
+
+
+class Show(db.Model):
+    __tablename__ = 'Show'
+    __table_args__ = (
+        # a venue's/artist's shows by time (detail pages, filtered feeds)
+        db.Index('ix_Show_venue_id_start_time', 'venue_id', 'start_time'),
+        db.Index('ix_Show_artist_id_start_time', 'artist_id', 'start_time'),
+        # the keyset-paginated upcoming feed and the counter roll
+        db.Index('ix_Show_start_time_id', 'start_time', 'id'),
+        db.CheckConstraint('end_time > start_time', name='ck_Show_end_after_start'),
+        # no two shows overlap at a venue or for an artist (see scheduling.py)
+        ExcludeConstraint(('venue_id', '='), (db.text('tstzrange(start_time, end_time)'), '&&'),
+                          name='ex_Show_venue_overlap', using='gist').ddl_if(dialect='postgresql'),
+        ExcludeConstraint(('artist_id', '='), (db.text('tstzrange(start_time, end_time)'), '&&'),
+                          name='ex_Show_artist_overlap', using='gist').ddl_if(dialect='postgresql'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    start_time = db.Column(UTCDateTime, nullable=False)
+    end_time = db.Column(UTCDateTime, nullable=False, default=default_end_time)
+
+    artist_id = db.Column(db.Integer, db.ForeignKey('Artist.id'), nullable = False)
+    venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id'), nullable = False)
+    version = db.Column(db.Integer, nullable=False, server_default='1')
+    __mapper_args__ = {'version_id_col': version}
@@ -0,0 +1,121 @@
+import threading
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import NullPool
+
+#----------------------------------------------------------------------------#
+# Connection pooling.
+#
+# configure(app) turns the DB_* settings in config.py into
+# SQLALCHEMY_ENGINE_OPTIONS and must run before db.init_app(app):
+#
+#   DB_POOL_SIZE / DB_MAX_OVERFLOW   connections kept open / allowed on top
+#   DB_POOL_TIMEOUT                  seconds to wait for a free connection
+#   DB_POOL_RECYCLE                  reconnect connections older than this
+#   DB_POOL_PRE_PING                 test connections on checkout
+#   DB_STATEMENT_TIMEOUT_MS          PostgreSQL statement_timeout (0 = off)
+#   DB_PGBOUNCER                     running behind PgBouncer in transaction
+#                                    pooling mode: PgBouncer does the pooling
+#                                    (NullPool here), and the statement timeout
+#                                    is set per transaction with SET LOCAL
+#                                    because session state doesn't survive
+#                                    between transactions.
+#
+# Size the pool so workers x (DB_POOL_SIZE + DB_MAX_OVERFLOW) stays below the
+# server's max_connections. PoolMetrics counts connects, checkouts and
+# invalidations per engine and reports the pool's current utilization at
+# /db/pool.
+#----------------------------------------------------------------------------#
+
+def database_uri(uri):
+  # SQLAlchemy dropped the "postgres://" alias that Heroku-style URLs use.
+  if uri.startswith('postgres://'):
+    return 'postgresql://' + uri[len('postgres://'):]
+  return uri
+
+def engine_options(config):
+  url = make_url(config['SQLALCHEMY_DATABASE_URI'])
+  options = {}
+  connect_args = {}
+  if url.get_backend_name() == 'sqlite':
+    # SQLite connections are local and Flask-SQLAlchemy picks the pool
+    return options
+
+  if config['DB_PGBOUNCER']:
+    options['poolclass'] = NullPool
+    if url.get_driver_name() == 'psycopg':
+      # server-side prepared statements don't survive transaction pooling
+      connect_args['prepare_threshold'] = None
+  else:
+    options.update(
+      pool_size=config['DB_POOL_SIZE'],
+      max_overflow=config['DB_MAX_OVERFLOW'],
+      pool_timeout=config['DB_POOL_TIMEOUT'],
+      pool_recycle=config['DB_POOL_RECYCLE'],
+      pool_pre_ping=config['DB_POOL_PRE_PING'])
+    if url.get_backend_name() == 'postgresql' and config['DB_STATEMENT_TIMEOUT_MS']:
+      connect_args['options'] = '-c statement_timeout={:d}'.format(config['DB_STATEMENT_TIMEOUT_MS'])
+
+  if connect_args:
+    options['connect_args'] = connect_args
+  return options
+
+def configure(app):
+  app.config['SQLALCHEMY_DATABASE_URI'] = database_uri(app.config['SQLALCHEMY_DATABASE_URI'])
+  app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config))
+
+
+class PoolMetrics(object):
+
+  def __init__(self, app=None, db=None):
+    self._counters = {}
+    self._lock = threading.Lock()
+    self._engines = {}
+    if app is not None:
+      self.init_app(app, db)
+
+  def init_app(self, app, db):
+    app.extensions['pool_metrics'] = self
+    timeout = app.config.get('DB_STATEMENT_TIMEOUT_MS')
+    with app.app_context():
+      for name, engine in db.engines.items():
+        self.watch(name or 'default', engine)
+        if app.config.get('DB_PGBOUNCER') and timeout and engine.dialect.name == 'postgresql':
+          self._set_local_timeout(engine, timeout)
+
+  def watch(self, name, engine):
+    self._engines[name] = engine
+    counters = self._counters[name] = dict(connects=0, checkouts=0, checkins=0, invalidations=0)
+
+    def count(key):
+      def listener(*args):
+        with self._lock:
+          counters[key] += 1
+      return listener
+
+    event.listen(engine.pool, 'connect', count('connects'))
+    event.listen(engine.pool, 'checkout', count('checkouts'))
+    event.listen(engine.pool, 'checkin', count('checkins'))
+    event.listen(engine.pool, 'invalidate', count('invalidations'))
+
+  def _set_local_timeout(self, engine, timeout):
+    @event.listens_for(engine, 'begin')
+    def set_statement_timeout(conn):
+      conn.exec_driver_sql('SET LOCAL statement_timeout = {:d}'.format(timeout))
+
+  def stats(self):
+    # counters since start-up plus the pools' current utilization
+    report = {}
+    for name, engine in self._engines.items():
+      pool = engine.pool
+      with self._lock:
+        entry = dict(self._counters[name])
+      entry['pool'] = type(pool).__name__
+      for gauge in ('size', 'checkedin', 'checkedout', 'overflow'):
+        if hasattr(pool, gauge):
+          entry[gauge] = getattr(pool, gauge)()
+      if 'size' in entry and 'checkedout' in entry:
+        capacity = entry['size'] + max(getattr(pool, '_max_overflow', 0), 0)
+        entry['utilization'] = entry['checkedout'] / capacity if capacity else None
+      report[name] = entry
+    return report
@@ -0,0 +1,224 @@
+import time
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from models import db, Venue, Artist, Show, Recommendation, genre_asoc_venue, genre_asoc_art
+import jobs
+
+#----------------------------------------------------------------------------#
+# Recommendations.
+#
+# "Artists like this one" and "venues that suit this artist" on the artist
+# page, and "artists that suit this venue" on the venue page. Each page reads
+# its lists with one primary-key range read of the recommendation table.
+# `flask recommendations rebuild` fills the table in batch (e.g. nightly
+# from cron). It needs numpy and scipy, which the web app does not.
+#
+# Every artist is a sparse vector with two halves:
+#
+#   genres   its genres, L2-normalized and scaled by RECOMMENDATION_GENRE_WEIGHT
+#   venues   log(1 + shows played) per venue, L2-normalized and scaled by
+#            RECOMMENDATION_VENUE_WEIGHT
+#
+# The whole vector is then normalized. A venue lives in the same space: its
+# genre half is its own genres, and its venue half is the sum of the venue
+# halves of the artists who played it. So a venue is close to an artist who
+# plays where that venue's artists play. Scores are cosine similarities. Each
+# kind's top RECOMMENDATIONS_TOP_K is taken a block of rows at a time. The
+# genre halves are dense and multiply through BLAS. The venue halves are
+# sparse products. At 50k artists this runs in minutes and stays within a
+# few hundred MB.
+#----------------------------------------------------------------------------#
+
+SIMILAR_ARTISTS = 'similar_artist'
+ARTIST_VENUES = 'artist_venue'
+VENUE_ARTISTS = 'venue_artist'
+
+# kind: the model the targets are rows of
+TARGETS = {SIMILAR_ARTISTS: Artist, ARTIST_VENUES: Venue, VENUE_ARTISTS: Artist}
+
+# Rows of the score matrix computed at once (block x columns float32s)
+BLOCK_ROWS = 512
+
+# Rows per INSERT executemany
+CHUNK_SIZE = 10000
+
+def _libraries():
+  try:
+    import numpy
+    import scipy.sparse
+  except ImportError:
+    raise RuntimeError('flask recommendations rebuild requires the numpy and scipy packages')
+  return numpy, scipy.sparse
+
+#  Batch
+#  ----------------------------------------------------------------
+
+def _positions(model):
+  ids = [entity_id for entity_id, in db.session.execute(db.select(model.id).order_by(model.id))]
+  return ids, {entity_id: n for n, entity_id in enumerate(ids)}
+
+def _normalized(np, sparse, matrix):
+  # `matrix` with every nonzero row scaled to unit L2 norm
+  norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+  norms[norms == 0] = 1
+  return sparse.diags(1 / norms) @ matrix
+
+def _genre_matrix(np, sparse, table, fk, rows, genres):
+  pairs = [(rows[entity_id], genres[genre_id]) for entity_id, genre_id in db.session.execute(
+    db.select(table.c[fk], table.c.Genre_id)) if entity_id in rows and genre_id in genres]
+  data = np.ones(len(pairs), dtype=np.float32)
+  matrix = sparse.csr_matrix(
+    (data, ([row for row, _ in pairs], [column for _, column in pairs])),
+    shape=(len(rows), len(genres)), dtype=np.float32)
+  # duplicate association rows would otherwise count twice
+  matrix.data[:] = 1
+  return matrix
+
+def features():
+  # (artist ids, venue ids, artist vectors, venue vectors). Vectors are
+  # (dense genre half, sparse venue half) pairs whose rows jointly have
+  # unit norm.
+  np, sparse = _libraries()
+  config = current_app.config
+  genre_weight = config['RECOMMENDATION_GENRE_WEIGHT']
+  venue_weight = config['RECOMMENDATION_VENUE_WEIGHT']
+
+  artist_ids, artist_rows = _positions(Artist)
+  venue_ids, venue_rows = _positions(Venue)
+  genre_ids = [genre_id for genre_id, in db.session.execute(
+    db.select(genre_asoc_art.c.Genre_id).union(db.select(genre_asoc_venue.c.Genre_id)))]
+  genres = {genre_id: n for n, genre_id in enumerate(sorted(genre_ids))}
+
+  plays = [(artist_rows[artist_id], venue_rows[venue_id], count) for artist_id, venue_id, count in db.session.execute(
+    db.select(Show.artist_id, Show.venue_id, db.func.count()).group_by(Show.artist_id, Show.venue_id))
+    if artist_id in artist_rows and venue_id in venue_rows]
+  played = sparse.csr_matrix(
+    (np.log1p(np.array([count for _, _, count in plays], dtype=np.float32)),
+     ([row for row, _, _ in plays], [column for _, column, _ in plays])),
+    shape=(len(artist_ids), len(venue_ids)), dtype=np.float32)
+
+  artist_genres = genre_weight * _normalized(np, sparse,
+    _genre_matrix(np, sparse, genre_asoc_art, 'Aritst_id', artist_rows, genres))
+  artist_venues = venue_weight * _normalized(np, sparse, played)
+  venue_genres = genre_weight * _normalized(np, sparse,
+    _genre_matrix(np, sparse, genre_asoc_venue, 'Venue_id', venue_rows, genres))
+  # a venue's venue half: the venue halves of the artists who played it
+  venue_venues = venue_weight * _normalized(np, sparse, (played > 0).astype(np.float32).T @ artist_venues)
+
+  def vectors(genre_half, venue_half):
+    norms = np.sqrt(np.asarray(genre_half.multiply(genre_half).sum(axis=1)).ravel() +
+                    np.asarray(venue_half.multiply(venue_half).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    scale = sparse.diags(1 / norms)
+    return np.asarray((scale @ genre_half).todense(), dtype=np.float32), sparse.csr_matrix(scale @ venue_half)
+
+  return (artist_ids, venue_ids,
+          vectors(artist_genres, artist_venues), vectors(venue_genres, venue_venues))
+
+def top_k(subjects, targets, k, exclude_self=False):
+  # Yield (subject row, [(target column, score), ...]) with the k best
+  # positive scores per subject, best first.
+  np, _ = _libraries()
+  subject_genres, subject_venues = subjects
+  target_genres, target_venues = targets
+  columns = target_genres.shape[0]
+  if not columns:
+    return
+  k = min(k, columns - 1 if exclude_self else columns)
+  target_venues_t = target_venues.T.tocsc()
+  for start in range(0, subject_genres.shape[0], BLOCK_ROWS):
+    stop = min(start + BLOCK_ROWS, subject_genres.shape[0])
+    scores = subject_genres[start:stop] @ target_genres.T
+    scores += (subject_venues[start:stop] @ target_venues_t).toarray()
+    if exclude_self:
+      rows = np.arange(stop - start)
+      scores[rows, rows + start] = -1
+    if k <= 0:
+      continue
+    best = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    best_scores = np.take_along_axis(scores, best, axis=1)
+    order = np.argsort(-best_scores, axis=1, kind='stable')
+    best = np.take_along_axis(best, order, axis=1)
+    best_scores = np.take_along_axis(best_scores, order, axis=1)
+    for row in range(stop - start):
+      yield start + row, [(int(column), float(score))
+                          for column, score in zip(best[row], best_scores[row]) if score > 0]
+
+def _store(kind, lists, subject_ids, target_ids):
+  # Replace every list of `kind` with `lists` (from top_k()).
+  table = Recommendation.__table__
+  db.session.execute(table.delete().where(table.c.kind == kind))
+  rows, stored = [], 0
+  for subject, targets in lists:
+    for rank, (column, score) in enumerate(targets, 1):
+      rows.append({'kind': kind, 'subject_id': subject_ids[subject], 'rank': rank,
+                   'target_id': target_ids[column], 'score': round(score, 6)})
+    if len(rows) >= CHUNK_SIZE:
+      db.session.execute(table.insert(), rows)
+      stored += len(rows)
+      rows = []
+  if rows:
+    db.session.execute(table.insert(), rows)
+    stored += len(rows)
+  return stored
+
+def rebuild():
+  # Recompute every list in one transaction, so pages see either the old or
+  # the new lists. Returns {kind: rows stored}.
+  k = current_app.config['RECOMMENDATIONS_TOP_K']
+  artist_ids, venue_ids, artists, venues = features()
+  stored = {
+    SIMILAR_ARTISTS: _store(SIMILAR_ARTISTS, top_k(artists, artists, k, exclude_self=True), artist_ids, artist_ids),
+    ARTIST_VENUES: _store(ARTIST_VENUES, top_k(artists, venues, k), artist_ids, venue_ids),
+    VENUE_ARTISTS: _store(VENUE_ARTISTS, top_k(venues, artists, k), venue_ids, artist_ids),
+  }
+  db.session.commit()
+  return stored
+
+@jobs.task('recommendations.discard_venue', priority=jobs.LOW)
+def discard_venue(venue_id):
+  # Drop the lists of, and the entries pointing at, a deleted venue. Pages
+  # already skip them, so delete_venue() leaves this to a background job.
+  table = Recommendation.__table__
+  venue_kinds = [kind for kind, model in TARGETS.items() if model is Venue]
+  db.session.execute(table.delete().where(db.or_(
+    db.and_(table.c.kind == VENUE_ARTISTS, table.c.subject_id == venue_id),
+    db.and_(table.c.kind.in_(venue_kinds), table.c.target_id == venue_id))))
+
+#  Read path
+#  ----------------------------------------------------------------
+
+def for_subject(subject_id, kinds):
+  # {kind: [{id, name, image_link, score}, ...]} for a venue or artist page,
+  # best first. Targets deleted since the last rebuild are skipped.
+  recommended_artist = db.and_(Recommendation.kind.in_([kind for kind in kinds if TARGETS[kind] is Artist]),
+                               Artist.id == Recommendation.target_id)
+  recommended_venue = db.and_(Recommendation.kind.in_([kind for kind in kinds if TARGETS[kind] is Venue]),
+                              Venue.id == Recommendation.target_id)
+  rows = db.session.execute(
+    db.select(Recommendation.kind, Recommendation.target_id, Recommendation.score,
+              db.func.coalesce(Artist.name, Venue.name),
+              db.func.coalesce(Artist.image_link, Venue.image_link))
+    .outerjoin(Artist, recommended_artist)
+    .outerjoin(Venue, recommended_venue)
+    .where(Recommendation.kind.in_(kinds), Recommendation.subject_id == subject_id)
+    .order_by(Recommendation.kind, Recommendation.rank))
+  lists = {kind: [] for kind in kinds}
+  for kind, target_id, score, name, image_link in rows:
+    if name is not None:
+      lists[kind].append({"id": target_id, "name": name, "image_link": image_link, "score": score})
+  return lists
+
+#  CLI
+#  ----------------------------------------------------------------
+
+cli = AppGroup('recommendations', help='Compute the artist/venue recommendations.')
+
+@cli.command('rebuild')
+def rebuild_command():
+  # flask recommendations rebuild: full batch recompute
+  started = time.monotonic()
+  stored = rebuild()
+  click.echo('Recommendations rebuilt in {:.1f}s: {}.'.format(
+    time.monotonic() - started, ', '.join('{} {}'.format(n, kind) for kind, n in stored.items())))
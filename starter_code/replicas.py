@@ -0,0 +1,103 @@
+import random
+import time
+from flask import current_app, g, has_request_context, request, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.sql.dml import UpdateBase
+from pooling import database_uri
+
+#----------------------------------------------------------------------------#
+# Read replicas.
+#
+# With SQLALCHEMY_REPLICA_URIS set, each replica becomes an extra engine
+# (bind 'replica_0', 'replica_1', ...) and read-only requests -- GET/HEAD,
+# plus POST views marked @read_only such as the search forms -- pick one at
+# random for their SELECTs. Everything else stays on the primary: writes,
+# flushes, SELECT ... FOR UPDATE, reads later in a request that has already
+# written, and anything outside a request (CLI, imports).
+#
+# Read-your-writes: when a request commits changes, the client is pinned to
+# the primary for DB_REPLICA_STICKY_SECONDS (through the session cookie), so
+# e.g. the redirect to show_venue after edit_venue_submission() renders what
+# was just saved even if the replica is lagging.
+#----------------------------------------------------------------------------#
+
+STICKY_KEY = 'db_primary_until'
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+def read_only(view):
+  # Mark a non-GET view as safe to serve from a replica.
+  view.replica_reads = True
+  return view
+
+def _writes(clause):
+  return isinstance(clause, UpdateBase) or getattr(clause, '_for_update_arg', None) is not None
+
+
+class RoutingSession(Session):
+  # Flask-SQLAlchemy's session, sending this request's reads to the replica
+  # chosen in ReplicaRouter._route.
+
+  def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+    engine = super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+    if bind is not None or not has_request_context() or g.get('db_replica') is None:
+      return engine
+    if engine is not self._db.engines.get(None):
+      return engine
+    if self._flushing or self.info.get('wrote') or _writes(clause):
+      self.info['wrote'] = True
+      return engine
+    return self._db.engines[g.db_replica]
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _flushed(db_session, flush_context):
+  db_session.info['wrote'] = True
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _committed(db_session):
+  if db_session.info.pop('wrote', False) and has_request_context():
+    g.db_committed_writes = True
+
+@event.listens_for(RoutingSession, 'after_rollback')
+def _rolled_back(db_session):
+  db_session.info.pop('wrote', None)
+
+#  Extension
+#  ----------------------------------------------------------------
+
+def configure(app):
+  # Register the replicas as binds; must run before db.init_app(app).
+  uris = app.config.get('SQLALCHEMY_REPLICA_URIS') or []
+  binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+  for index, uri in enumerate(uris):
+    binds['replica_{}'.format(index)] = database_uri(uri)
+  app.config['SQLALCHEMY_BINDS'] = binds
+  app.config['DB_REPLICA_KEYS'] = ['replica_{}'.format(index) for index in range(len(uris))]
+
+
+class ReplicaRouter(object):
+
+  def __init__(self, app=None):
+    if app is not None:
+      self.init_app(app)
+
+  def init_app(self, app):
+    app.extensions['replica_router'] = self
+    if not app.config.get('DB_REPLICA_KEYS'):
+      return
+    app.before_request(self._route)
+    app.after_request(self._stick)
+
+  def _route(self):
+    view = current_app.view_functions.get(request.endpoint)
+    if request.method not in READ_METHODS and not getattr(view, 'replica_reads', False):
+      return
+    if session.get(STICKY_KEY, 0) > time.time():
+      return
+    g.db_replica = random.choice(current_app.config['DB_REPLICA_KEYS'])
+
+  def _stick(self, response):
+    if g.get('db_committed_writes'):
+      session[STICKY_KEY] = time.time() + current_app.config.get('DB_REPLICA_STICKY_SECONDS', 10)
+    return response
@@ -0,0 +1,282 @@
+from collections import defaultdict
+from datetime import date, timedelta
+import babel.dates
+import click
+from flask import Blueprint, abort, current_app, jsonify, render_template, request
+from flask.cli import AppGroup
+from sqlalchemy.dialects import postgresql, sqlite
+from models import (db, Venue, Artist, Genre, Show, ReportVenueDay, ReportArtistDay, ReportGenreDay,
+                    genre_asoc_venue, genre_asoc_art, utcnow)
+
+#----------------------------------------------------------------------------#
+# Reports.
+#
+# Venue utilization, shows per genre per month and top artists, served under
+# /reports. Every report reads only the daily rollup tables: report_venue_day,
+# report_artist_day and report_genre_day. It joins them to Venue/Artist/Genre
+# for names and dimension filters, and never scans Show. A rollup row holds
+# the shows starting on one local day (DISPLAY_TIMEZONE) and their booked
+# minutes. A show counts towards its artist's current genres.
+#
+# The rollups are kept current the same way as the availability calendars. In
+# the transaction that writes shows, record_show(s) adds them, and
+# discard_venue_shows() runs before a venue's shows are deleted. When an
+# artist's genres are edited, artist_genres_changed() moves the artist's shows
+# from the dropped genres' rollups to the added ones'. Run `flask reports
+# rebuild` to recompute everything from Show, e.g. after DISPLAY_TIMEZONE
+# changes.
+#----------------------------------------------------------------------------#
+
+ROLLUPS = ((ReportVenueDay, 'venue_id'), (ReportArtistDay, 'artist_id'), (ReportGenreDay, 'genre_id'))
+
+# Artist ids per IN list when looking up genres
+CHUNK_SIZE = 1000
+
+blueprint = Blueprint('reports', __name__, url_prefix='/reports')
+
+def local_day(start_time):
+  tz = babel.dates.get_timezone(current_app.config['DISPLAY_TIMEZONE'])
+  return start_time.astimezone(tz).date()
+
+def _artist_genres(artist_ids=None):
+  # {artist_id: [genre_id, ...]} for `artist_ids` (default: every artist)
+  query = db.select(genre_asoc_art.c.Aritst_id, genre_asoc_art.c.Genre_id)
+  if artist_ids is None:
+    chunks = [query]
+  else:
+    artist_ids = sorted(artist_ids)
+    chunks = [query.where(genre_asoc_art.c.Aritst_id.in_(artist_ids[n:n + CHUNK_SIZE]))
+              for n in range(0, len(artist_ids), CHUNK_SIZE)]
+  genres = defaultdict(set)
+  for chunk in chunks:
+    for artist_id, genre_id in db.session.execute(chunk):
+      genres[artist_id].add(genre_id)
+  return genres
+
+def _deltas(shows, genres, sign=1):
+  # {(model, key, day): [shows, minutes]} for dicts with venue_id,
+  # artist_id, start_time and end_time
+  deltas = defaultdict(lambda: [0, 0])
+  for show in shows:
+    day = local_day(show['start_time'])
+    minutes = int((show['end_time'] - show['start_time']).total_seconds() // 60)
+    keys = [(ReportVenueDay, show['venue_id']), (ReportArtistDay, show['artist_id'])]
+    keys += [(ReportGenreDay, genre_id) for genre_id in genres.get(show['artist_id'], ())]
+    for model, key in keys:
+      delta = deltas[(model, key, day)]
+      delta[0] += sign
+      delta[1] += sign * minutes
+  return deltas
+
+def _upsert(model, key):
+  dialect = db.session.get_bind().dialect.name
+  insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+  table = model.__table__
+  statement = insert(table)
+  return statement.on_conflict_do_update(
+    index_elements=['day', key],
+    set_={'shows': table.c.shows + statement.excluded.shows,
+          'minutes': table.c.minutes + statement.excluded.minutes})
+
+def _apply(deltas):
+  # One executemany per table for additions, and for removals an update
+  # plus a delete of the rows that dropped to zero shows.
+  for model, key in ROLLUPS:
+    table = model.__table__
+    added = [{'day': day, key: entity_id, 'shows': shows, 'minutes': minutes}
+             for (target, entity_id, day), (shows, minutes) in deltas.items() if target is model and shows > 0]
+    removed = [{'rollup_day': day, 'entity_id': entity_id, 'n': -shows, 'm': -minutes}
+               for (target, entity_id, day), (shows, minutes) in deltas.items() if target is model and shows < 0]
+    if added:
+      db.session.execute(_upsert(model, key), added)
+    if removed:
+      db.session.execute(
+        table.update()
+          .where(table.c.day == db.bindparam('rollup_day'), table.c[key] == db.bindparam('entity_id'))
+          .values(shows=table.c.shows - db.bindparam('n'), minutes=table.c.minutes - db.bindparam('m')),
+        removed)
+      db.session.execute(table.delete().where(
+        table.c.day.in_(set(row['rollup_day'] for row in removed)), table.c.shows <= 0))
+
+#  Write path
+#  ----------------------------------------------------------------
+
+def record_show(venue_id, artist_id, start_time, end_time):
+  # Roll up a newly inserted show; call in the same transaction as the insert.
+  # The ids may still be the form's strings.
+  record_shows([{'venue_id': int(venue_id), 'artist_id': int(artist_id),
+                 'start_time': start_time, 'end_time': end_time}])
+
+def record_shows(shows):
+  genres = _artist_genres(set(show['artist_id'] for show in shows))
+  _apply(_deltas(shows, genres))
+
+def discard_venue_shows(venue_id):
+  # Ahead of deleting a venue and its shows: take them out of the artist
+  # and genre rollups and drop the venue's.
+  shows = [row._mapping for row in db.session.execute(
+    db.select(Show.venue_id, Show.artist_id, Show.start_time, Show.end_time).where(Show.venue_id == venue_id))]
+  genres = _artist_genres(set(show['artist_id'] for show in shows))
+  deltas = _deltas(shows, genres, sign=-1)
+  _apply({target: delta for target, delta in deltas.items() if target[0] is not ReportVenueDay})
+  ReportVenueDay.query.filter_by(venue_id=venue_id).delete(synchronize_session=False)
+
+def artist_genres_changed(artist_id, before, after):
+  # Move the artist's shows between genre rollups after its genres went from
+  # `before` to `after` (genre ids); call in the same transaction.
+  dropped, added = set(before) - set(after), set(after) - set(before)
+  if not dropped and not added:
+    return
+  shows = [row._mapping for row in db.session.execute(
+    db.select(Show.venue_id, Show.artist_id, Show.start_time, Show.end_time).where(Show.artist_id == artist_id))]
+  deltas = dict(_deltas(shows, {artist_id: dropped}, sign=-1))
+  deltas.update(_deltas(shows, {artist_id: added}))
+  _apply({target: delta for target, delta in deltas.items() if target[0] is ReportGenreDay})
+
+def rebuild(chunk_size=10000):
+  # Recompute every rollup from Show.
+  for model, _ in ROLLUPS:
+    db.session.execute(model.__table__.delete())
+  shows = (row._mapping for row in db.session.execute(
+    db.select(Show.venue_id, Show.artist_id, Show.start_time, Show.end_time)
+    .execution_options(yield_per=chunk_size)))
+  _apply(_deltas(shows, _artist_genres()))
+  db.session.commit()
+
+#  Report queries
+#  ----------------------------------------------------------------
+
+def _genre_members(table, fk, genre):
+  return db.select(table.c[fk]).join(Genre, Genre.id == table.c.Genre_id).where(Genre.name == genre)
+
+def venue_utilization(first, last, state=None, city=None, genre=None, limit=50, offset=0):
+  # Venues by booked minutes in [first, last]. utilization is the share of
+  # the range's days with at least one show starting.
+  days = (last - first).days + 1
+  shows = db.func.sum(ReportVenueDay.shows)
+  minutes = db.func.sum(ReportVenueDay.minutes)
+  query = (
+    db.select(Venue.id, Venue.name, Venue.city, Venue.state, shows, minutes, db.func.count())
+    .join(Venue, Venue.id == ReportVenueDay.venue_id)
+    .where(ReportVenueDay.day >= first, ReportVenueDay.day <= last)
+    .group_by(Venue.id, Venue.name, Venue.city, Venue.state)
+    .order_by(minutes.desc(), Venue.id)
+    .limit(limit).offset(offset))
+  if state:
+    query = query.where(Venue.state == state)
+  if city:
+    query = query.where(Venue.city == city)
+  if genre:
+    query = query.where(ReportVenueDay.venue_id.in_(_genre_members(genre_asoc_venue, 'Venue_id', genre)))
+  return [{"venue_id": venue_id, "name": name, "city": venue_city, "state": venue_state,
+           "shows": int(venue_shows), "booked_minutes": int(booked), "booked_days": booked_days,
+           "utilization": round(booked_days / days, 4)}
+          for venue_id, name, venue_city, venue_state, venue_shows, booked, booked_days in db.session.execute(query)]
+
+def genre_months(first, last, genre=None):
+  # Shows per genre per calendar month in [first, last], by month then
+  # most shows. Aggregating the at most days x genres rows is cheap.
+  query = (
+    db.select(Genre.name, ReportGenreDay.day, ReportGenreDay.shows)
+    .join(Genre, Genre.id == ReportGenreDay.genre_id)
+    .where(ReportGenreDay.day >= first, ReportGenreDay.day <= last))
+  if genre:
+    query = query.where(Genre.name == genre)
+  months = defaultdict(int)
+  for name, day, shows in db.session.execute(query):
+    months[(day.strftime('%Y-%m'), name)] += shows
+  rows = [{"month": month, "genre": name, "shows": shows} for (month, name), shows in months.items()]
+  return sorted(rows, key=lambda row: (row['month'], -row['shows'], row['genre']))
+
+def top_artists(first, last, state=None, city=None, genre=None, limit=50, offset=0):
+  # Artists by number of shows starting in [first, last].
+  shows = db.func.sum(ReportArtistDay.shows)
+  query = (
+    db.select(Artist.id, Artist.name, Artist.city, Artist.state, shows, db.func.sum(ReportArtistDay.minutes))
+    .join(Artist, Artist.id == ReportArtistDay.artist_id)
+    .where(ReportArtistDay.day >= first, ReportArtistDay.day <= last)
+    .group_by(Artist.id, Artist.name, Artist.city, Artist.state)
+    .order_by(shows.desc(), Artist.id)
+    .limit(limit).offset(offset))
+  if state:
+    query = query.where(Artist.state == state)
+  if city:
+    query = query.where(Artist.city == city)
+  if genre:
+    query = query.where(ReportArtistDay.artist_id.in_(_genre_members(genre_asoc_art, 'Aritst_id', genre)))
+  return [{"artist_id": artist_id, "name": name, "city": artist_city, "state": artist_state,
+           "shows": int(artist_shows), "booked_minutes": int(booked)}
+          for artist_id, name, artist_city, artist_state, artist_shows, booked in db.session.execute(query)]
+
+#  Views
+#  ----------------------------------------------------------------
+
+def _filters():
+  # Date range and dimensions from the query string: ?start=&end= (default:
+  # the last REPORT_DEFAULT_DAYS days), ?state=, ?city=, ?genre=, ?limit=,
+  # ?offset=. Aborts with 400 on malformed or oversized input.
+  config = current_app.config
+  try:
+    last = date.fromisoformat(request.args['end']) if request.args.get('end') else local_day(utcnow())
+    if request.args.get('start'):
+      first = date.fromisoformat(request.args['start'])
+    else:
+      first = last - timedelta(days=config['REPORT_DEFAULT_DAYS'] - 1)
+    limit = int(request.args.get('limit', config['REPORT_PAGE_SIZE']))
+    offset = int(request.args.get('offset', 0))
+  except ValueError:
+    abort(400)
+  if first > last or (last - first).days + 1 > config['REPORT_MAX_DAYS'] or offset < 0 or limit < 1:
+    abort(400)
+  return {"first": first, "last": last,
+          "state": request.args.get('state') or None,
+          "city": request.args.get('city') or None,
+          "genre": request.args.get('genre') or None,
+          "limit": min(limit, config['REPORT_PAGE_SIZE_MAX']),
+          "offset": offset}
+
+def _range(filters):
+  return {"start": filters['first'].isoformat(), "end": filters['last'].isoformat()}
+
+def _dimensions(filters, *names):
+  return dict((name, filters[name]) for name in names)
+
+@blueprint.route('/')
+def dashboard():
+  filters = _filters()
+  first, last, genre = filters['first'], filters['last'], filters['genre']
+  return render_template('pages/reports.html', filters=filters,
+    genres=[name for name, in db.session.execute(db.select(Genre.name).order_by(Genre.name))],
+    venues=venue_utilization(first, last, **_dimensions(filters, 'state', 'city', 'genre', 'limit', 'offset')),
+    genre_months=genre_months(first, last, genre),
+    artists=top_artists(first, last, **_dimensions(filters, 'state', 'city', 'genre', 'limit', 'offset')))
+
+@blueprint.route('/venues')
+def venues():
+  filters = _filters()
+  rows = venue_utilization(filters['first'], filters['last'],
+                           **_dimensions(filters, 'state', 'city', 'genre', 'limit', 'offset'))
+  return jsonify(dict(_range(filters), offset=filters['offset'], venues=rows))
+
+@blueprint.route('/genres')
+def genres():
+  filters = _filters()
+  return jsonify(dict(_range(filters), genres=genre_months(filters['first'], filters['last'], filters['genre'])))
+
+@blueprint.route('/artists')
+def artists():
+  filters = _filters()
+  rows = top_artists(filters['first'], filters['last'],
+                     **_dimensions(filters, 'state', 'city', 'genre', 'limit', 'offset'))
+  return jsonify(dict(_range(filters), offset=filters['offset'], artists=rows))
+
+#  CLI
+#  ----------------------------------------------------------------
+
+cli = AppGroup('reports', help='Maintain the reporting rollups.')
+
+@cli.command('rebuild')
+def rebuild_command():
+  # flask reports rebuild: full recompute from Show
+  rebuild()
+  click.echo('Report rollups rebuilt.')
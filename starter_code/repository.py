@@ -0,0 +1,294 @@
+import base64
+import json
+from datetime import datetime
+from models import db, Venue, Artist, Genre, Show, genre_asoc_venue, genre_asoc_art, utcnow, as_utc
+
+#----------------------------------------------------------------------------#
+# Repository.
+#
+# Read queries used by the views. Each function issues a fixed number of
+# SQL statements no matter how many rows come back, so the pages built on
+# top of them don't degrade into one query per venue/artist/show.
+#----------------------------------------------------------------------------#
+
+def venue_areas():
+  # Venues grouped by city/state with their upcoming show counts, shaped the
+  # way pages/venues.html expects. The counts are the persisted counters on
+  # Venue (see counters.py), so this is one query that never touches Show.
+  rows = db.session.query(
+      Venue.city, Venue.state, Venue.id, Venue.name, Venue.upcoming_shows_count
+    ).order_by(
+      Venue.state, Venue.city, Venue.id
+    ).all()
+
+  areas = []
+  for city, state, venue_id, name, upcoming in rows:
+    if not areas or (areas[-1]['city'], areas[-1]['state']) != (city, state):
+      areas.append({
+        "city": city,
+        "state": state,
+        "venues": []
+      })
+    areas[-1]['venues'].append({
+      "id": venue_id,
+      "name": name,
+      "num_upcoming_shows": upcoming
+    })
+  return areas
+
+def artist_list():
+  # (id, name) of every artist for the /artists page, read straight off
+  # ix_Artist_id_name without touching the table on PostgreSQL.
+  return db.session.query(Artist.id, Artist.name).order_by(Artist.id).all()
+
+def iter_artists(yield_per=500):
+  # artist_list() for streamed pages: rows come off a server-side cursor
+  # yield_per at a time instead of being loaded up front.
+  query = db.select(Artist.id, Artist.name).order_by(Artist.id)
+  result = db.session.execute(query, execution_options={'yield_per': yield_per})
+  try:
+    for row in result:
+      yield row
+  finally:
+    result.close()
+
+def venue_detail(venue_id):
+  # Venue with its genres: one query for the venue, one for the genres. Its
+  # shows come from venue_shows().
+  return Venue.query.options(
+    db.selectinload(Venue.genres)
+  ).filter_by(id=venue_id).first()
+
+def artist_detail(artist_id):
+  # Same as venue_detail, for an artist; its shows come from artist_shows().
+  return Artist.query.options(
+    db.selectinload(Artist.genres)
+  ).filter_by(id=artist_id).first()
+
+VENUE_SHOW_KEYS = ('start_time', 'artist_id', 'artist_name', 'artist_image_link')
+ARTIST_SHOW_KEYS = ('start_time', 'venue_id', 'venue_name', 'venue_image_link')
+
+def _split_shows(rows, keys):
+  # (past, upcoming) records from rows of (is_upcoming, *values).
+  past, upcoming = [], []
+  for is_upcoming, *values in rows:
+    (upcoming if is_upcoming else past).append(dict(zip(keys, values)))
+  return past, upcoming
+
+def _venue_shows_statement(venue_id, now):
+  return db.select(
+      Show.start_time > now, Show.start_time, Artist.id, Artist.name, Artist.image_link
+    ).join(
+      Artist, Artist.id == Show.artist_id
+    ).where(Show.venue_id == venue_id).order_by(Show.start_time, Show.id)
+
+def _artist_shows_statement(artist_id, now):
+  return db.select(
+      Show.start_time > now, Show.start_time, Venue.id, Venue.name, Venue.image_link
+    ).join(
+      Venue, Venue.id == Show.venue_id
+    ).where(Show.artist_id == artist_id).order_by(Show.start_time, Show.id)
+
+def venue_shows(venue_id, now=None):
+  # (past, upcoming) shows at a venue with the performing artists, in
+  # start_time order. The split is computed by the database in the same
+  # query, so no start time is compared in Python.
+  rows = db.session.execute(_venue_shows_statement(venue_id, now or utcnow())).all()
+  return _split_shows(rows, VENUE_SHOW_KEYS)
+
+def artist_shows(artist_id, now=None):
+  # Same as venue_shows, from the artist's side of Show.
+  rows = db.session.execute(_artist_shows_statement(artist_id, now or utcnow())).all()
+  return _split_shows(rows, ARTIST_SHOW_KEYS)
+
+#  Detail pages
+#  ----------------------------------------------------------------
+
+def _detail_columns(model):
+  # The mapped columns a detail page shows; search_vector is deferred and
+  # only feeds search.
+  return [column for column in model.__table__.c if column.key != 'search_vector']
+
+def _entity_statement(model, entity_id):
+  return db.select(*_detail_columns(model)).where(model.id == entity_id)
+
+def _fields(entity):
+  # The same fields as a row of _entity_statement(), off a loaded entity
+  return {column.key: getattr(entity, column.key) for column in _detail_columns(type(entity))}
+
+def _genre_names_statement(assoc, fk, entity_id):
+  return db.select(Genre.name).join(
+      assoc, assoc.c.Genre_id == Genre.id
+    ).where(assoc.c[fk] == entity_id).order_by(Genre.name)
+
+def _concurrent_page(async_db, entity, genres, shows, keys):
+  # The three independent queries of a detail page, run at the same time.
+  row, genre_rows, show_rows = async_db.gather(
+    async_db.first(entity), async_db.all(genres), async_db.all(shows))
+  if row is None:
+    return None
+  return (dict(row._mapping), [name for name, in genre_rows]) + _split_shows(show_rows, keys)
+
+def venue_page(venue_id, async_db=None, now=None):
+  # (venue fields, genre names, past shows, upcoming shows) for the venue
+  # page, or None. With async_db enabled the venue, genre and show queries
+  # run concurrently; otherwise one after another on the session.
+  now = now or utcnow()
+  if async_db is not None and async_db.enabled:
+    return _concurrent_page(async_db,
+      _entity_statement(Venue, venue_id),
+      _genre_names_statement(genre_asoc_venue, 'Venue_id', venue_id),
+      _venue_shows_statement(venue_id, now), VENUE_SHOW_KEYS)
+  venue = venue_detail(venue_id)
+  if venue is None:
+    return None
+  return (_fields(venue), [genre.name for genre in venue.genres]) + venue_shows(venue_id, now)
+
+def artist_page(artist_id, async_db=None, now=None):
+  # Same as venue_page, for an artist.
+  now = now or utcnow()
+  if async_db is not None and async_db.enabled:
+    return _concurrent_page(async_db,
+      _entity_statement(Artist, artist_id),
+      _genre_names_statement(genre_asoc_art, 'Aritst_id', artist_id),
+      _artist_shows_statement(artist_id, now), ARTIST_SHOW_KEYS)
+  artist = artist_detail(artist_id)
+  if artist is None:
+    return None
+  return (_fields(artist), [genre.name for genre in artist.genres]) + artist_shows(artist_id, now)
+
+#  Shows feed
+#  ----------------------------------------------------------------
+
+def encode_show_cursor(start_time, show_id):
+  # Opaque keyset cursor for the (start_time, id) position of a show.
+  raw = json.dumps([start_time.isoformat(), show_id]).encode()
+  return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_show_cursor(cursor):
+  # Inverse of encode_show_cursor; raises ValueError on anything malformed.
+  try:
+    raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+    start_time, show_id = json.loads(raw)
+    return as_utc(datetime.fromisoformat(start_time)), int(show_id)
+  except (TypeError, ValueError, UnicodeDecodeError) as e:
+    raise ValueError('invalid show cursor') from e
+
+def _upcoming_shows_query(after=None, now=None, venue_id=None, artist_id=None):
+  now = now or utcnow()
+  query = db.session.query(
+      Show.id, Show.start_time,
+      Venue.id, Venue.name,
+      Artist.id, Artist.name, Artist.image_link,
+      Show.version, Venue.version, Artist.version
+    ).join(
+      Venue, Venue.id == Show.venue_id
+    ).join(
+      Artist, Artist.id == Show.artist_id
+    ).filter(Show.start_time > now)
+  if venue_id is not None:
+    query = query.filter(Show.venue_id == venue_id)
+  if artist_id is not None:
+    query = query.filter(Show.artist_id == artist_id)
+  if after is not None:
+    after_time, after_id = decode_show_cursor(after)
+    query = query.filter(db.or_(
+      Show.start_time > after_time,
+      db.and_(Show.start_time == after_time, Show.id > after_id)
+    ))
+  return query.order_by(Show.start_time, Show.id)
+
+def _show_record(row):
+  show_id, start_time, venue_id, venue_name, artist_id, artist_name, artist_image_link, *versions = row
+  return {
+    "show_id": show_id,
+    "venue_id": venue_id,
+    "venue_name": venue_name,
+    "artist_id": artist_id,
+    "artist_name": artist_name,
+    "artist_image_link": artist_image_link,
+    "start_time": start_time,
+    "versions": versions
+  }
+
+def upcoming_shows_page(after=None, limit=30, now=None, venue_id=None, artist_id=None):
+  # One page of upcoming shows, denormalized with the venue and artist
+  # columns the feed renders, ordered by (start_time, id). Pages are
+  # addressed by the keyset cursor of the last row seen instead of an
+  # OFFSET, so every page costs the same however deep the client scrolls.
+  # Returns (shows, next_cursor); next_cursor is None on the last page.
+  # Each show also carries the row versions of the show, venue and artist.
+  query = _upcoming_shows_query(after, now, venue_id, artist_id)
+  # fetch one extra row to learn whether another page exists
+  rows = query.limit(limit + 1).all()
+  shows = [_show_record(row) for row in rows[:limit]]
+
+  next_cursor = None
+  if len(rows) > limit:
+    last = shows[-1]
+    next_cursor = encode_show_cursor(last['start_time'], last['show_id'])
+  return shows, next_cursor
+
+
+class UpcomingShowsStream(object):
+  # The same page as upcoming_shows_page, read lazily: iterating it pulls
+  # rows off the cursor yield_per at a time, and next_cursor is known once
+  # the iteration is over. Iterate it once.
+
+  def __init__(self, after=None, limit=30, now=None, venue_id=None, artist_id=None, yield_per=100):
+    # built eagerly so a malformed cursor raises here, not mid-stream
+    self._query = _upcoming_shows_query(after, now, venue_id, artist_id).limit(limit + 1)
+    self.limit = limit
+    self.yield_per = yield_per
+    self.next_cursor = None
+
+  def __iter__(self):
+    result = db.session.execute(self._query.statement, execution_options={'yield_per': self.yield_per})
+    try:
+      last = None
+      for n, row in enumerate(result):
+        if n == self.limit:
+          self.next_cursor = encode_show_cursor(last['start_time'], last['show_id'])
+          break
+        last = _show_record(row)
+        yield last
+    finally:
+      result.close()
+
+#  Entity pages
+#  ----------------------------------------------------------------
+
+def encode_id_cursor(entity_id):
+  # Opaque keyset cursor for id-ordered listings.
+  return base64.urlsafe_b64encode(json.dumps([entity_id]).encode()).decode().rstrip('=')
+
+def decode_id_cursor(cursor):
+  try:
+    raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+    entity_id, = json.loads(raw)
+    return int(entity_id)
+  except (TypeError, ValueError, UnicodeDecodeError) as e:
+    raise ValueError('invalid cursor') from e
+
+def entity_versions(model, after=None, limit=50):
+  # (id, version) of one id-ordered page of venues or artists, plus the
+  # cursor of the next page. Cheap enough to answer conditional requests
+  # before any row is loaded in full.
+  query = db.session.query(model.id, model.version)
+  if after is not None:
+    query = query.filter(model.id > decode_id_cursor(after))
+  rows = query.order_by(model.id).limit(limit + 1).all()
+  next_cursor = encode_id_cursor(rows[limit - 1][0]) if len(rows) > limit else None
+  return [tuple(row) for row in rows[:limit]], next_cursor
+
+def entity_version(model, entity_id):
+  row = db.session.query(model.version).filter(model.id == entity_id).first()
+  return row[0] if row else None
+
+def entities_by_ids(model, ids):
+  # Venues or artists with their genres, in the order of `ids`: two queries.
+  entities = model.query.options(
+    db.selectinload(model.genres)
+  ).filter(model.id.in_(ids)).all()
+  by_id = dict((entity.id, entity) for entity in entities)
+  return [by_id[entity_id] for entity_id in ids if entity_id in by_id]
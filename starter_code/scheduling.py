@@ -0,0 +1,170 @@
+from bisect import bisect_left
+from collections import defaultdict
+from datetime import timedelta
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+from models import db, Show, Venue, Artist, as_utc
+
+#----------------------------------------------------------------------------#
+# Scheduling conflicts.
+#
+# A show occupies [start_time, end_time) at its venue and for its artist. Two
+# shows conflict when they share the venue or the artist and their intervals
+# overlap; back-to-back shows don't conflict. On PostgreSQL the exclusion
+# constraints ex_Show_venue_overlap and ex_Show_artist_overlap (GiST over
+# tstzrange) enforce this in the database, including between concurrent
+# transactions. The checks here run on every backend first, so the user is
+# told which shows are in the way instead of seeing a constraint error:
+#
+#   find_conflicts()  one show: since no show is longer than SHOW_MAX_MINUTES,
+#                     only shows starting in (start - max, end) can overlap,
+#                     which is a bounded range scan of
+#                     ix_Show_venue_id_start_time and
+#                     ix_Show_artist_id_start_time -- O(log n + k).
+#   BookingIndex      bulk imports: a chunk's rows are checked against each
+#                     other and against the stored shows in the chunk's time
+#                     window, loaded with one query per side.
+#----------------------------------------------------------------------------#
+
+# SQLSTATE of an exclusion constraint violation
+EXCLUSION_VIOLATION = '23P01'
+
+CONFLICT_COLUMNS = (
+  Show.id.label('show_id'),
+  Show.venue_id,
+  Venue.name.label('venue_name'),
+  Show.artist_id,
+  Artist.name.label('artist_name'),
+  Show.start_time,
+  Show.end_time,
+)
+
+def max_length():
+  return timedelta(minutes=current_app.config['SHOW_MAX_MINUTES'])
+
+def show_end(start_time, end_time=None):
+  # The end of a show starting at `start_time`; SHOW_DEFAULT_MINUTES later
+  # when no end time was given.
+  if end_time is not None:
+    return as_utc(end_time)
+  return start_time + timedelta(minutes=current_app.config['SHOW_DEFAULT_MINUTES'])
+
+def check_times(start_time, end_time):
+  # None when the interval is acceptable, an error message otherwise.
+  if end_time <= start_time:
+    return 'end_time must be after start_time'
+  if end_time - start_time > max_length():
+    return 'a show may last at most {} minutes'.format(current_app.config['SHOW_MAX_MINUTES'])
+  return None
+
+def describe(conflict):
+  # One line about a conflicting show (or a row earlier in the same import)
+  where = 'line {}'.format(conflict['line']) if conflict.get('line') else 'show {}'.format(conflict['show_id'])
+  return '{}: venue {} / artist {}, {} to {}'.format(
+    where, conflict['venue_id'], conflict['artist_id'],
+    conflict['start_time'].isoformat(), conflict['end_time'].isoformat())
+
+def is_conflict_error(error):
+  # True for the IntegrityError raised by the exclusion constraints
+  orig = getattr(error, 'orig', None)
+  return isinstance(error, IntegrityError) and \
+    EXCLUSION_VIOLATION in (getattr(orig, 'sqlstate', None), getattr(orig, 'pgcode', None))
+
+#  Single shows
+#  ----------------------------------------------------------------
+
+def _overlapping(column, key, start_time, end_time):
+  return db.and_(column == key,
+                 Show.start_time > start_time - max_length(),
+                 Show.start_time < end_time,
+                 Show.end_time > start_time)
+
+def find_conflicts(venue_id, artist_id, start_time, end_time, exclude_id=None):
+  # Stored shows overlapping [start_time, end_time) at the venue or for the
+  # artist, as dicts of CONFLICT_COLUMNS.
+  statement = (
+    db.select(*CONFLICT_COLUMNS)
+    .join(Venue, Venue.id == Show.venue_id)
+    .join(Artist, Artist.id == Show.artist_id)
+    .where(db.or_(_overlapping(Show.venue_id, venue_id, start_time, end_time),
+                  _overlapping(Show.artist_id, artist_id, start_time, end_time)))
+    .order_by(Show.start_time, Show.id))
+  if exclude_id is not None:
+    statement = statement.where(Show.id != exclude_id)
+  return [dict(row._mapping) for row in db.session.execute(statement)]
+
+#  Bulk
+#  ----------------------------------------------------------------
+
+class BookingIndex(object):
+  # Per venue and per artist, the booked intervals sorted by start. Booked
+  # intervals of one key never overlap, so their ends are sorted too: a new
+  # interval can only overlap the one starting just before it plus those
+  # starting inside it, found by bisection in O(log n + k).
+
+  def __init__(self):
+    self._starts = defaultdict(list)
+    self._bookings = defaultdict(list)
+
+  def _keys(self, booking):
+    return (('venue', booking['venue_id']), ('artist', booking['artist_id']))
+
+  def add(self, booking):
+    for key in self._keys(booking):
+      starts = self._starts[key]
+      index = bisect_left(starts, booking['start_time'])
+      starts.insert(index, booking['start_time'])
+      self._bookings[key].insert(index, booking)
+
+  def conflicts(self, booking):
+    found = []
+    for key in self._keys(booking):
+      starts = self._starts.get(key)
+      if not starts:
+        continue
+      bookings = self._bookings[key]
+      index = bisect_left(starts, booking['start_time'])
+      if index > 0 and bookings[index - 1]['end_time'] > booking['start_time']:
+        found.append(bookings[index - 1])
+      while index < len(starts) and starts[index] < booking['end_time']:
+        found.append(bookings[index])
+        index += 1
+    # a show can be in the way at the venue and for the artist
+    return list({id(conflict): conflict for conflict in found}.values())
+
+  @classmethod
+  def around(cls, rows):
+    # An index of the stored shows that may overlap any of `rows` (dicts
+    # with venue_id, artist_id, start_time and end_time).
+    index = cls()
+    if not rows:
+      return index
+    low = min(row['start_time'] for row in rows) - max_length()
+    high = max(row['end_time'] for row in rows)
+    loaded = set()
+    for column, key in ((Show.venue_id, 'venue_id'), (Show.artist_id, 'artist_id')):
+      statement = (
+        db.select(*CONFLICT_COLUMNS)
+        .join(Venue, Venue.id == Show.venue_id)
+        .join(Artist, Artist.id == Show.artist_id)
+        .where(column.in_(set(row[key] for row in rows)),
+               Show.start_time > low, Show.start_time < high))
+      for row in db.session.execute(statement):
+        if row.show_id not in loaded:
+          loaded.add(row.show_id)
+          index.add(dict(row._mapping))
+    return index
+
+def check_batch(rows):
+  # Split (line_no, row) pairs into the rows that can be booked and
+  # (line_no, conflicts) for the rest; earlier rows of the batch win.
+  index = BookingIndex.around([row for _, row in rows])
+  accepted, rejected = [], []
+  for line_no, row in rows:
+    conflicts = index.conflicts(row)
+    if conflicts:
+      rejected.append((line_no, conflicts))
+    else:
+      accepted.append((line_no, row))
+      index.add(dict(row, line=line_no))
+  return accepted, rejected
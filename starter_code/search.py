@@ -0,0 +1,135 @@
+import re
+from sqlalchemy import event
+from models import db, Venue, Artist
+
+#----------------------------------------------------------------------------#
+# Search.
+#
+# Venue and artist search over name, genres, city and state. On PostgreSQL
+# the match runs against the GIN-indexed `search_vector` tsvector (prefix
+# tsquery, so it works while the user is still typing) and the pg_trgm index
+# on `name` (substring/ILIKE and similarity ranking). Other databases fall
+# back to LIKE over the same document stored as plain text, which keeps the
+# engine usable against SQLite in local development.
+#
+# Upcoming show counts (the persisted counters, see counters.py) and the
+# total hit count come back in the same query as the matches, so a search is
+# a single round trip.
+#----------------------------------------------------------------------------#
+
+DEFAULT_LIMIT = 50
+
+def _words(term):
+  return re.findall(r'\w+', term.lower())
+
+def _like_pattern(term):
+  escaped = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+  return '%' + escaped + '%'
+
+def _is_postgres(bind):
+  return bind.dialect.name == 'postgresql'
+
+#  Search document
+#  ----------------------------------------------------------------
+
+def _document_parts(entity):
+  genres = ' '.join(genre.name for genre in entity.genres if genre is not None)
+  location = ' '.join(part for part in (entity.city, entity.state) if part)
+  return entity.name or '', genres, location
+
+def search_document(entity, dialect_name):
+  # Value stored in Venue/Artist.search_vector. On PostgreSQL this is a SQL
+  # expression evaluated by the INSERT/UPDATE: the name weighted highest,
+  # then genres, then location.
+  name, genres, location = _document_parts(entity)
+  if dialect_name != 'postgresql':
+    return ' '.join(part for part in (name, genres, location) if part).lower()
+  weighted = lambda text, weight: db.func.setweight(db.func.to_tsvector('simple', text), weight)
+  return weighted(name, 'A').op('||')(weighted(genres, 'B')).op('||')(weighted(location, 'C'))
+
+def _refresh_search_vector(mapper, connection, target):
+  target.search_vector = search_document(target, connection.dialect.name)
+
+# before_update also fires for rows whose genres collection changed, so the
+# document follows genre edits made through the ORM.
+for _model in (Venue, Artist):
+  event.listen(_model, 'before_insert', _refresh_search_vector)
+  event.listen(_model, 'before_update', _refresh_search_vector)
+
+#  Queries
+#  ----------------------------------------------------------------
+
+def _prefix_tsquery(words):
+  # 'musical hop' -> 'musical:* & hop:*'; words are \w+ only, so nothing
+  # in them can be read as tsquery syntax.
+  return ' & '.join(word + ':*' for word in words)
+
+def _search(model, term, limit):
+  term = term.strip()
+  words = _words(term)
+  total = db.func.count().over()
+
+  if not words:
+    rank = db.literal(0)
+    match = None
+  elif _is_postgres(db.session.get_bind()):
+    tsquery = db.func.to_tsquery('simple', _prefix_tsquery(words))
+    rank = db.func.ts_rank(model.search_vector, tsquery) + db.func.similarity(model.name, term)
+    match = db.or_(
+      model.search_vector.op('@@')(tsquery),
+      model.name.ilike(_like_pattern(term), escape='\\')
+    )
+  else:
+    lowered = term.lower()
+    rank = db.case(
+      (db.func.lower(model.name) == lowered, 3),
+      (model.name.ilike(_like_pattern(term)[1:], escape='\\'), 2),
+      (model.name.ilike(_like_pattern(term), escape='\\'), 1),
+      else_=0
+    )
+    match = db.or_(
+      model.name.ilike(_like_pattern(term), escape='\\'),
+      db.and_(*[model.search_vector.like(_like_pattern(word), escape='\\') for word in words])
+    )
+
+  query = db.session.query(model.id, model.name, model.upcoming_shows_count, total)
+  if match is not None:
+    query = query.filter(match)
+  rows = query.order_by(
+      rank.desc(), model.name, model.id
+    ).limit(limit).all()
+
+  return {
+    "count": rows[0][3] if rows else 0,
+    "data": [{
+      "id": entity_id,
+      "name": name,
+      "num_upcoming_shows": upcoming,
+    } for entity_id, name, upcoming, _ in rows]
+  }
+
+def search_venues(term, limit=DEFAULT_LIMIT):
+  # Ranked venue matches for `term`, shaped for pages/search_venues.html.
+  return _search(Venue, term, limit)
+
+def search_artists(term, limit=DEFAULT_LIMIT):
+  # Ranked artist matches for `term`, shaped for pages/search_artists.html.
+  return _search(Artist, term, limit)
+
+def rebuild_search_vectors(batch_size=500):
+  # Recompute search_vector for every venue and artist, e.g. after genres
+  # were renamed outside the ORM. Walks each table in id order and commits
+  # per batch so memory stays bounded.
+  dialect_name = db.session.get_bind().dialect.name
+  for model in (Venue, Artist):
+    last_id = 0
+    while True:
+      batch = model.query.options(
+        db.selectinload(model.genres)
+      ).filter(model.id > last_id).order_by(model.id).limit(batch_size).all()
+      if not batch:
+        break
+      for entity in batch:
+        entity.search_vector = search_document(entity, dialect_name)
+      last_id = batch[-1].id
+      db.session.commit()
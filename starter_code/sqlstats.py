@@ -0,0 +1,185 @@
+import json
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+#----------------------------------------------------------------------------#
+# SQL instrumentation.
+#
+# Listens to every statement the engine executes and keeps per-request
+# totals on `g`: statement count, time spent in the database and the
+# slowest statements. Each response gets a Server-Timing header
+# (db;dur=12.3;desc="7 queries") and one JSON log line. When the same
+# statement shape runs SQL_N_PLUS_ONE_THRESHOLD or more times in one
+# request, the log line is raised to a warning and names it as a suspected
+# N+1. SQL_QUERY_BUDGETS caps the statements an endpoint may issue; under
+# app.testing a request over budget raises QueryBudgetExceeded, otherwise
+# it is logged. query_budget() applies the same check to any block of
+# test code:
+#
+#   with query_budget(3):
+#     client.get('/artists/1')
+#----------------------------------------------------------------------------#
+
+_IN_LIST = re.compile(r'\(\s*(\?|%\(\w+\)s|:\w+)(\s*,\s*(\?|%\(\w+\)s|:\w+))+\s*\)')
+_WHITESPACE = re.compile(r'\s+')
+_local = threading.local()
+
+def statement_shape(statement):
+  # Statements are already parameterized; collapse whitespace and expanded
+  # IN lists so "IN (?, ?, ?)" and "IN (?)" count as the same shape.
+  return _IN_LIST.sub('(...)', _WHITESPACE.sub(' ', statement).strip())
+
+
+class QueryBudgetExceeded(AssertionError):
+  pass
+
+
+class QueryLog(object):
+  # Statements executed within one request (or query_budget block).
+
+  def __init__(self):
+    self.statements = []  # (statement, seconds)
+
+  def record(self, statement, seconds):
+    self.statements.append((statement, seconds))
+
+  @property
+  def count(self):
+    return len(self.statements)
+
+  @property
+  def total(self):
+    return sum(seconds for _, seconds in self.statements)
+
+  def slowest(self, n):
+    return sorted(self.statements, key=lambda item: item[1], reverse=True)[:n]
+
+  def repeated(self, threshold):
+    # Statement shapes executed at least `threshold` times, most frequent first.
+    shapes = Counter(statement_shape(statement) for statement, _ in self.statements)
+    return [(shape, n) for shape, n in shapes.most_common() if n >= threshold]
+
+  def describe(self):
+    return '\n'.join('  ' + _WHITESPACE.sub(' ', statement) for statement, _ in self.statements)
+
+#  Engine events
+#  ----------------------------------------------------------------
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+  conn.info.setdefault('sqlstats_started', []).append(time.perf_counter())
+
+def active_logs():
+  # The QueryLogs this thread's statements go to: the request's and those of
+  # any query_budget() blocks. Statements run for it on another thread (see
+  # asyncdb.py) pass them along as the 'sqlstats_logs' execution option.
+  logs = list(getattr(_local, 'budgets', ()))
+  if has_request_context() and 'sql_queries' in g:
+    logs.insert(0, g.sql_queries)
+  return logs
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+  started = conn.info.get('sqlstats_started')
+  if not started:
+    return
+  elapsed = time.perf_counter() - started.pop()
+  logs = context.execution_options.get('sqlstats_logs') if context is not None else None
+  for log in active_logs() if logs is None else logs:
+    log.record(statement, elapsed)
+
+def _handle_error(context):
+  # a failed statement never reaches after_cursor_execute
+  started = context.connection.info.get('sqlstats_started') if context.connection is not None else None
+  if started:
+    started.pop()
+
+def _listen():
+  for name, listener in (('before_cursor_execute', _before_cursor_execute),
+                         ('after_cursor_execute', _after_cursor_execute),
+                         ('handle_error', _handle_error)):
+    if not event.contains(Engine, name, listener):
+      event.listen(Engine, name, listener)
+
+#  Extension
+#  ----------------------------------------------------------------
+
+class SQLStats(object):
+
+  def __init__(self, app=None):
+    if app is not None:
+      self.init_app(app)
+
+  def init_app(self, app):
+    app.extensions['sql_stats'] = self
+    if not app.config.get('SQL_INSTRUMENTATION', True):
+      return
+    _listen()
+    app.before_request(self._start)
+    app.after_request(self._finish)
+
+  def _start(self):
+    g.sql_queries = QueryLog()
+
+  def _finish(self, response):
+    log = g.pop('sql_queries', None)
+    if log is None:
+      return response
+    app = current_app
+    config = app.config
+
+    timing = 'db;dur={:.1f};desc="{} quer{}"'.format(
+      log.total * 1000, log.count, 'y' if log.count == 1 else 'ies')
+    existing = response.headers.get('Server-Timing')
+    response.headers['Server-Timing'] = existing + ', ' + timing if existing else timing
+
+    repeated = log.repeated(config.get('SQL_N_PLUS_ONE_THRESHOLD', 5))
+    budget = config.get('SQL_QUERY_BUDGETS', {}).get(request.endpoint)
+    over_budget = budget is not None and log.count > budget
+    record = {
+      "event": "sql",
+      "method": request.method,
+      "path": request.path,
+      "endpoint": request.endpoint,
+      "status": response.status_code,
+      "queries": log.count,
+      "db_ms": round(log.total * 1000, 2),
+      "slowest": [{"ms": round(seconds * 1000, 2), "sql": _WHITESPACE.sub(' ', statement)[:300]}
+                  for statement, seconds in log.slowest(config.get('SQL_SLOWEST_STATEMENTS', 3))]
+    }
+    if repeated:
+      record["n_plus_one"] = [{"count": n, "sql": shape[:300]} for shape, n in repeated]
+    if budget is not None:
+      record["budget"] = budget
+    if repeated or over_budget:
+      app.logger.warning(json.dumps(record))
+    else:
+      app.logger.info(json.dumps(record))
+
+    if over_budget and app.testing:
+      raise QueryBudgetExceeded('{} {} issued {} queries, budget is {}:\n{}'.format(
+        request.method, request.path, log.count, budget, log.describe()))
+    return response
+
+#  Test helpers
+#  ----------------------------------------------------------------
+
+@contextmanager
+def query_budget(max_queries):
+  # Fail if the block executes more than `max_queries` statements on this
+  # thread, listing them; yields the QueryLog for finer-grained asserts.
+  _listen()
+  log = QueryLog()
+  budgets = _local.__dict__.setdefault('budgets', [])
+  budgets.append(log)
+  try:
+    yield log
+  finally:
+    budgets.remove(log)
+  if log.count > max_queries:
+    raise QueryBudgetExceeded('{} queries issued, budget is {}:\n{}'.format(
+      log.count, max_queries, log.describe()))
@@ -0,0 +1,60 @@
+from flask import Response, current_app, stream_template
+
+#----------------------------------------------------------------------------#
+# Streamed pages.
+#
+# render() is render_template() for pages whose size grows with the data
+# (/artists, /shows when STREAM_TEMPLATES is on). The template is rendered
+# with Flask's stream_template and sent as it is produced: everything up to
+# the first row -- the layout, nav and page header -- goes out straight
+# away, after which output is sent in STREAM_BUFFER_SIZE chunks while the
+# rows are pulled from a server-side cursor (see repository.iter_artists and
+# repository.UpcomingShowsStream). Memory per request is bounded by the
+# buffer and the cursor batch, not by the number of rows.
+#
+# Streamed responses are never stored in the page cache.
+#----------------------------------------------------------------------------#
+
+class _Rows(object):
+  # Wraps a lazy row source so the response knows when rendering has
+  # reached the rows. Other attributes (e.g. next_cursor) pass through.
+
+  def __init__(self, rows):
+    self._rows = rows
+    self.started = False
+
+  def __iter__(self):
+    self.started = True
+    for row in self._rows:
+      yield row
+
+  def __getattr__(self, name):
+    return getattr(self._rows, name)
+
+
+def _chunks(fragments, sources, buffer_size):
+  # Pass the page shell through unbuffered, then batch the rest.
+  buffer, size = [], 0
+  for fragment in fragments:
+    if not any(source.started for source in sources):
+      yield fragment
+      continue
+    buffer.append(fragment)
+    size += len(fragment)
+    if size >= buffer_size:
+      yield ''.join(buffer)
+      buffer, size = [], 0
+  if buffer:
+    yield ''.join(buffer)
+
+def render(template_name, **context):
+  # Stream template_name; iterables passed with rows=... are wrapped so the
+  # shell can be flushed before the first row is fetched.
+  rows = context.pop('rows', {})
+  sources = []
+  for name, source in rows.items():
+    context[name] = _Rows(source)
+    sources.append(context[name])
+  fragments = stream_template(template_name, **context)
+  return Response(_chunks(fragments, sources, current_app.config.get('STREAM_BUFFER_SIZE', 16384)),
+                  mimetype='text/html')
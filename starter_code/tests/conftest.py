@@ -0,0 +1,104 @@
+import os
+import random
+import sys
+import tempfile
+import pytest
+
+# The app reads its configuration at import time: point it at a throwaway
+# SQLite file, with the page cache off so every request reaches the database.
+# TEST_DATABASE_URL runs the suite on another database instead, e.g. a
+# scratch PostgreSQL one with pg_trgm and btree_gist; its tables are dropped.
+_directory = tempfile.mkdtemp(prefix='fyyur-tests-')
+os.environ['DATABASE_URL'] = (os.environ.get('TEST_DATABASE_URL') or
+                              'sqlite:///' + os.path.join(_directory, 'test.db'))
+os.environ['CACHE_BACKEND'] = 'null'
+os.environ['AUTOCOMPLETE_PRELOAD'] = '0'
+os.environ.pop('DATABASE_REPLICA_URLS', None)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope='session')
+def app():
+  from app import app
+  app.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+  return app
+
+@pytest.fixture
+def client(app):
+  return app.test_client()
+
+@pytest.fixture
+def seed(app):
+  # seed(scale): bench.py's synthetic dataset, `scale` venues and artists
+  # and 10x as many shows; the database is recreated on every call.
+  import bench
+  import genres
+  def seed(scale):
+    with app.app_context():
+      bench.seed(scale, random.Random(0))
+    genres.registry.invalidate()
+  return seed
+
+@pytest.fixture
+def empty_db(app):
+  # Fresh tables with no rows at all, not even genres
+  import genres
+  from models import db
+  with app.app_context():
+    db.drop_all()
+    db.create_all()
+  genres.registry.invalidate()
+
+class Factory(object):
+  # Specific rows for a test, each committed in its own app context; the
+  # methods return the new id.
+
+  def __init__(self, app):
+    self.app = app
+    self.names = 0
+
+  def _add(self, build):
+    # build() runs inside the same app context (and session) that commits
+    from models import db
+    with self.app.app_context():
+      entity = build()
+      db.session.add(entity)
+      db.session.commit()
+      return entity.id
+
+  def _name(self, kind):
+    self.names += 1
+    return '{} {}'.format(kind, self.names)
+
+  def venue(self, genres=(), **fields):
+    import genres as registry
+    from models import Venue
+    values = dict(name=self._name('Venue'), city='Austin', state='TX', address='1 Main St', phone='555-0100')
+    values.update(fields)
+    def build():
+      venue = Venue(**values)
+      venue.genres = registry.registry.resolve(list(genres))
+      return venue
+    return self._add(build)
+
+  def artist(self, genres=(), **fields):
+    import genres as registry
+    from models import Artist
+    values = dict(name=self._name('Artist'), city='Austin', state='TX', phone='5550100000')
+    values.update(fields)
+    def build():
+      artist = Artist(**values)
+      artist.genres = registry.registry.resolve(list(genres))
+      return artist
+    return self._add(build)
+
+  def show(self, venue_id, artist_id, start_time, hours=2):
+    from datetime import timedelta
+    from models import Show
+    return self._add(lambda: Show(venue_id=venue_id, artist_id=artist_id, start_time=start_time,
+                                  end_time=start_time + timedelta(hours=hours)))
+
+@pytest.fixture
+def make(app, empty_db):
+  # A Factory over an empty database
+  return Factory(app)
@@ -0,0 +1,58 @@
+import pytest
+from sqlalchemy import event
+import api
+import genres
+import search
+from models import db, Venue, Artist
+
+
+@pytest.fixture
+def without_search_listeners():
+  # The search document listeners also dirty a row on genre edits; detach
+  # them so the version bump is seen to stand on its own.
+  for model in (Venue, Artist):
+    event.remove(model, 'before_update', search._refresh_search_vector)
+  yield
+  for model in (Venue, Artist):
+    event.listen(model, 'before_update', search._refresh_search_vector)
+
+def _set_genres(app, model, entity_id, names):
+  with app.app_context():
+    entity = db.session.get(model, entity_id)
+    entity.genres = genres.registry.resolve(names)
+    db.session.commit()
+
+def test_etag_is_derived_from_the_row_version(client, make):
+  venue = make.venue(genres=['Jazz'])
+  response = client.get('/api/v1/venues/{}?fields=id,genres'.format(venue))
+  assert response.status_code == 200
+  assert response.get_json() == {"data": {"id": venue, "genres": ["Jazz"]}}
+  assert response.headers['ETag'] == '"{}"'.format(api._etag('Venue', venue, ['id', 'genres'], 1))
+  # another fieldset is another representation
+  assert client.get('/api/v1/venues/{}'.format(venue)).headers['ETag'] != response.headers['ETag']
+
+def test_matching_if_none_match_is_answered_with_304(client, make):
+  artist = make.artist()
+  etag = client.get('/api/v1/artists/{}'.format(artist)).headers['ETag']
+  response = client.get('/api/v1/artists/{}'.format(artist), headers={'If-None-Match': etag})
+  assert response.status_code == 304
+  assert response.data == b''
+  assert response.headers['ETag'] == etag
+  stale = client.get('/api/v1/artists/{}'.format(artist), headers={'If-None-Match': '"stale"'})
+  assert stale.status_code == 200
+
+@pytest.mark.parametrize('model, path', [(Venue, 'venues'), (Artist, 'artists')])
+def test_genre_only_edit_changes_the_etag(app, client, make, without_search_listeners, model, path):
+  entity = make.venue(genres=['Jazz']) if model is Venue else make.artist(genres=['Jazz'])
+  url = '/api/v1/{}/{}?fields=genres'.format(path, entity)
+  before = client.get(url).headers['ETag']
+  listing = client.get('/api/v1/{}'.format(path)).headers['ETag']
+
+  _set_genres(app, model, entity, ['Jazz', 'Blues'])
+  response = client.get(url, headers={'If-None-Match': before})
+  assert response.status_code == 200
+  assert sorted(response.get_json()['data']['genres']) == ['Blues', 'Jazz']
+  assert response.headers['ETag'] != before
+  assert client.get('/api/v1/{}'.format(path)).headers['ETag'] != listing
+  with app.app_context():
+    assert db.session.get(model, entity).version == 2
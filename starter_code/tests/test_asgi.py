@@ -0,0 +1,34 @@
+import asyncio
+import time
+import asgi
+from asgi import ThreadedWsgiToAsgi
+
+
+def _slow_app(environ, start_response):
+  time.sleep(0.2)
+  start_response('200 OK', [('Content-Type', 'text/plain')])
+  return [b'ok']
+
+async def _get(application, path='/'):
+  scope = {"type": 'http', "method": 'GET', "path": path, "raw_path": path.encode(), "root_path": '',
+           "query_string": b'', "headers": [], "http_version": '1.1', "server": ('localhost', 80)}
+  messages = []
+  async def receive():
+    return {"type": 'http.request', "body": b''}
+  async def send(message):
+    messages.append(message)
+  await application(scope, receive, send)
+  return messages[0]['status']
+
+def test_requests_run_concurrently():
+  # five 200ms views take about 200ms, not the 1s of running them in turn
+  async def main():
+    started = time.perf_counter()
+    statuses = await asyncio.gather(*[_get(ThreadedWsgiToAsgi(_slow_app, 5)) for _ in range(5)])
+    return statuses, time.perf_counter() - started
+  statuses, elapsed = asyncio.run(main())
+  assert statuses == [200] * 5
+  assert elapsed < 0.6
+
+def test_app_serves_through_asgi(empty_db):
+  assert asyncio.run(_get(asgi.application, '/venues')) == 200
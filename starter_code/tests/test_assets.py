@@ -0,0 +1,105 @@
+import gzip
+import json
+import hashlib
+from flask import Flask
+import assets
+
+
+def test_minify_css_squeezes_whitespace_and_comments():
+  css = '''/* header */
+  a :hover , b > c {
+    color : red ;
+    margin: 0 auto ;
+  }
+  '''
+  # the space in "a :hover" is a descendant combinator and stays
+  assert assets.minify_css(css) == 'a :hover,b>c{color :red;margin:0 auto}'
+
+def test_minify_css_copies_strings_and_urls_verbatim():
+  css = '''a::before { content: "a : { b ; }  c" ; }
+  b { font-family: 'Open  Sans' , serif; }
+  /* a "quote" or url( in a comment */
+  c { background: url( data:image/svg+xml;utf8,<svg a="1">  </svg> ) no-repeat; }
+  d { background: URL("two  words.png") }'''
+  assert assets.minify_css(css) == (
+    'a::before{content:"a : { b ; }  c"}'
+    "b{font-family:'Open  Sans',serif}"
+    'c{background:url( data:image/svg+xml;utf8,<svg a="1">  </svg> ) no-repeat}'
+    'd{background:URL("two  words.png")}')
+
+def test_fingerprinted_names_follow_the_content():
+  name = assets.fingerprinted('css/main.css', b'a{}')
+  assert name == 'css/main.{}.css'.format(hashlib.sha256(b'a{}').hexdigest()[:12])
+  assert assets.fingerprinted('css/main.css', b'b{}') != name
+
+def test_rewrite_css_urls_resolves_against_source_and_target():
+  manifest = {'img/logo.png': 'img/logo.0123456789ab.png'}
+  css = 'a{background:url(../img/logo.png?v=1)}b{background:url("/img/logo.png")}c{background:url(data:x)}'
+  assert assets.rewrite_css_urls(css, 'css/main.css', manifest) == (
+    'a{background:url("../img/logo.0123456789ab.png?v=1")}'
+    'b{background:url("/img/logo.png")}c{background:url(data:x)}')
+  # written into a bundle elsewhere, the url is made relative to the bundle
+  assert assets.rewrite_css_urls('a{background:url(../img/logo.png)}', 'css/lib/main.css',
+                                 {'css/img/logo.png': 'css/img/logo.0123456789ab.png'}, 'site.css') == \
+    'a{background:url("css/img/logo.0123456789ab.png")}'
+
+def _static(tmp_path):
+  files = {
+    'css/a.css': 'a { background: url(../img/dot.png); }\n' * 20,
+    'css/b.css': 'b { content: "x  y"; }',
+    'js/a.js': 'var a = 1;\n//# sourceMappingURL=a.js.map\n',
+    'img/dot.png': 'PNG',
+  }
+  for name, content in files.items():
+    path = tmp_path / name
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(content)
+  return tmp_path
+
+def test_build_fingerprints_bundles_and_compresses(tmp_path, monkeypatch):
+  static = _static(tmp_path)
+  monkeypatch.setattr(assets, 'BUNDLES', {'css/site.css': ['css/a.css', 'css/b.css']})
+  manifest = assets.build(str(static))
+  dist = static / assets.DIST
+
+  assert set(manifest) == {'css/a.css', 'css/b.css', 'js/a.js', 'img/dot.png', 'css/site.css'}
+  assert json.loads((dist / assets.MANIFEST).read_text()) == manifest
+  for name, target in manifest.items():
+    content = (dist / target).read_bytes()
+    assert target == assets.fingerprinted(name, content)
+
+  site = (dist / manifest['css/site.css']).read_text()
+  assert site.startswith('a{background:url("../' + manifest['img/dot.png'] + '")}')
+  assert site.endswith('b{content:"x  y"}')
+  assert 'sourceMappingURL' not in (dist / manifest['js/a.js']).read_text()
+  # precompressed only where that saves bytes, never for images
+  assert gzip.decompress((dist / (manifest['css/a.css'] + '.gz')).read_bytes()) == \
+    (dist / manifest['css/a.css']).read_bytes()
+  assert not (dist / (manifest['css/b.css'] + '.gz')).exists()
+  assert not (dist / (manifest['img/dot.png'] + '.gz')).exists()
+
+def test_built_assets_are_served_immutable_and_precompressed(tmp_path, monkeypatch):
+  static = _static(tmp_path)
+  monkeypatch.setattr(assets, 'BUNDLES', {'css/site.css': ['css/a.css', 'css/b.css']})
+  manifest = assets.build(str(static))
+  app = Flask(__name__, static_folder=str(static), static_url_path='/static')
+  app.config.update(USE_BUILT_ASSETS=True, ASSETS_URL_PATH='/assets')
+  extension = assets.Assets(app)
+  client = app.test_client()
+
+  with app.test_request_context():
+    url = extension.url('css/a.css')
+    assert url == '/assets/' + manifest['css/a.css']
+    assert extension.urls('css/site.css') == ['/assets/' + manifest['css/site.css']]
+    assert extension.url('css/missing.css') == '/static/css/missing.css'
+
+  response = client.get(url, headers={'Accept-Encoding': 'gzip'})
+  assert response.status_code == 200
+  assert response.headers['Content-Encoding'] == 'gzip'
+  assert response.headers['Cache-Control'] == assets.IMMUTABLE
+  assert response.headers['Vary'] == 'Accept-Encoding'
+  plain = client.get(url)
+  assert 'Content-Encoding' not in plain.headers
+  assert plain.data == (static / assets.DIST / manifest['css/a.css']).read_bytes()
+  # only names in the manifest are served, not the rest of static/dist
+  assert client.get('/assets/' + assets.MANIFEST).status_code == 404
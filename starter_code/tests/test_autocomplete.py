@@ -0,0 +1,53 @@
+import autocomplete
+import facets
+from autocomplete import PrefixIndex
+
+
+def _index(names, values=None):
+  values = values or {}
+  return PrefixIndex(facets.venues.kind, dict(
+    (entity_id, (name, values.get(entity_id, {}))) for entity_id, name in enumerate(names, 1)))
+
+def _labels(index, prefix, kinds=(autocomplete.ENTITY,), limit=10):
+  return [suggestion['label'] for _, suggestion in index.suggest(prefix, set(kinds), limit)]
+
+def test_whole_label_matches_rank_first_then_shorter_labels():
+  index = _index(['The Musical Hop', 'Musical Chairs Hall', 'Hop', 'Hopper Lounge'],
+                 {1: {'city': ['Hope'], 'state': ['AR'], 'genre': ['Hip-Hop']}})
+  # labels starting with the prefix, shortest first; then word matches
+  assert _labels(index, 'hop') == ['Hop', 'Hopper Lounge', 'The Musical Hop']
+  assert _labels(index, 'mus') == ['Musical Chairs Hall', 'The Musical Hop']
+  assert _labels(index, 'the mus') == ['The Musical Hop']
+  # an entity before a city before a genre of equal standing
+  every_kind = (autocomplete.ENTITY, autocomplete.CITY, autocomplete.GENRE)
+  assert _labels(index, 'hop', every_kind) == ['Hop', 'Hope, AR', 'Hopper Lounge', 'Hip-Hop', 'The Musical Hop']
+
+def test_short_prefixes_rank_every_match():
+  # 300 long names sort before the best match for "a"; all must be ranked,
+  # not just the first keys in alphabetical order.
+  names = ['A{:03d} Long Concert Hall Name'.format(n) for n in range(300)] + ['Azure', 'Avalon Bar']
+  index = _index(names)
+  assert _labels(index, 'a', limit=2) == ['Azure', 'Avalon Bar']
+  assert _labels(index, 'av') == ['Avalon Bar']
+  # and so are word matches, wherever their keys sort
+  index = _index(names + ['The Hallway'])
+  assert _labels(index, 'h', limit=1) == ['The Hallway']
+
+def test_memoized_short_prefixes_follow_changes():
+  index = _index(['Alpha Theatre', 'Amber Room'])
+  assert _labels(index, 'a', limit=1) == ['Amber Room']
+  # a larger limit than the memoized one is ranked again
+  assert _labels(index, 'a', limit=5) == ['Amber Room', 'Alpha Theatre']
+  index.put(3, 'Ace', {})
+  assert _labels(index, 'a', limit=1) == ['Ace']
+  index.remove(3)
+  assert _labels(index, 'a', limit=5) == ['Amber Room', 'Alpha Theatre']
+
+def test_endpoint_suggests_from_the_database(client, make):
+  autocomplete.venues._index = autocomplete.artists._index = None
+  make.venue(name='The Musical Hop', city='San Francisco', state='CA', genres=['Jazz'])
+  make.artist(name='Guns N Petals', genres=['Rock n Roll'])
+  response = client.get('/autocomplete?q=mus').get_json()
+  assert response['suggestions'] == [{"type": "venue", "id": 1, "label": "The Musical Hop"}]
+  response = client.get('/autocomplete?q=s&type=city').get_json()
+  assert response['suggestions'] == [{"type": "city", "label": "San Francisco, CA"}]
@@ -0,0 +1,93 @@
+from datetime import date, datetime, timedelta, timezone
+import pytest
+import availability
+from models import Venue, Artist
+
+# 2031-06-14 is a Saturday; times are UTC
+EVENING = datetime(2031, 6, 14, 20, 0, tzinfo=timezone.utc)
+HOUR = timedelta(hours=1)
+
+
+@pytest.fixture
+def pair(make):
+  return make.venue(), make.artist()
+
+def _book(client, venue_id, artist_id, start, hours=2):
+  response = client.post('/shows/create', data={
+    "venue_id": str(venue_id), "artist_id": str(artist_id),
+    "start_time": start.isoformat(), "end_time": (start + hours * HOUR).isoformat()})
+  assert response.status_code == 200
+  return response
+
+def _booked(client, kind, entity_id, **params):
+  response = client.get('/{}/{}/calendar'.format(kind, entity_id), query_string=params)
+  assert response.status_code == 200
+  body = response.get_json()
+  return dict((entry['date'], entry['shows']) for entry in body['booked']), body
+
+def test_show_days_are_local_and_end_exclusive(app, monkeypatch):
+  with app.app_context():
+    assert availability.show_days(EVENING, EVENING + 2 * HOUR) == [date(2031, 6, 14)]
+    # over midnight: both days; ending at midnight: only the first
+    assert availability.show_days(EVENING + 3 * HOUR, EVENING + 5 * HOUR) == [date(2031, 6, 14), date(2031, 6, 15)]
+    assert availability.show_days(EVENING + 2 * HOUR, EVENING + 4 * HOUR) == [date(2031, 6, 14)]
+    monkeypatch.setitem(app.config, 'DISPLAY_TIMEZONE', 'America/New_York')
+    # 20:00-22:00 UTC is 16:00-18:00 in New York, and 03:00 UTC is still the 14th
+    assert availability.show_days(EVENING, EVENING + 2 * HOUR) == [date(2031, 6, 14)]
+    assert availability.show_days(EVENING + 7 * HOUR, EVENING + 8 * HOUR) == [date(2031, 6, 14)]
+
+def test_bookings_fill_the_month_view(client, make, pair):
+  venue, artist = pair
+  other_artist = make.artist()
+  _book(client, venue, artist, EVENING)
+  # same venue later that night, running past midnight
+  _book(client, venue, other_artist, EVENING + 3 * HOUR, hours=3)
+  _book(client, venue, artist, EVENING + 10 * 24 * HOUR)
+
+  booked, body = _booked(client, 'venues', venue, month='2031-06')
+  assert booked == {'2031-06-14': 2, '2031-06-15': 1, '2031-06-24': 1}
+  assert (body['start'], body['end'], body['timezone']) == ('2031-06-01', '2031-06-30', 'UTC')
+  assert len(body['free']) == 30 - 3
+  assert '2031-06-14' not in body['free'] and '2031-06-16' in body['free']
+  assert _booked(client, 'artists', artist, month='2031-06')[0] == {'2031-06-14': 1, '2031-06-24': 1}
+  assert _booked(client, 'artists', other_artist, start='2031-06-15', end='2031-07-15')[0] == {'2031-06-15': 1}
+
+def test_deleting_a_venue_frees_its_artists_days(app, client, make, pair):
+  venue, artist = pair
+  elsewhere = make.venue()
+  _book(client, venue, artist, EVENING)
+  _book(client, elsewhere, artist, EVENING + 24 * HOUR)
+  assert client.delete('/venues/{}'.format(venue)).get_json() == {"success": True}
+  assert _booked(client, 'artists', artist, month='2031-06')[0] == {'2031-06-15': 1}
+  with app.app_context():
+    assert availability.booked_days(Venue, venue, date(2031, 6, 1), date(2031, 6, 30)) == {}
+
+def test_rebuild_matches_the_incremental_buckets(app, client, make, pair, monkeypatch):
+  venue, artist = pair
+  for days in (0, 1, 1.5, 40):
+    _book(client, venue, artist, EVENING + days * 24 * HOUR)
+  first, last = date(2031, 6, 1), date(2031, 8, 31)
+  with app.app_context():
+    incremental = [availability.booked_days(model, entity_id, first, last)
+                   for model, entity_id in ((Venue, venue), (Artist, artist))]
+    availability.rebuild(chunk_size=2)
+    assert [availability.booked_days(model, entity_id, first, last)
+            for model, entity_id in ((Venue, venue), (Artist, artist))] == incremental
+    # after a timezone change the buckets move with the local days
+    monkeypatch.setitem(app.config, 'DISPLAY_TIMEZONE', 'Asia/Tokyo')
+    availability.rebuild()
+    assert availability.booked_days(Venue, venue, first, last) == {
+      date(2031, 6, 15): 1, date(2031, 6, 16): 2, date(2031, 7, 25): 1}
+
+@pytest.mark.parametrize('params', [
+  {'month': '2031-13'},
+  {'start': '2031-06-10'},
+  {'start': '2031-06-10', 'end': '2031-06-01'},
+  {'start': '2031-01-01', 'end': '2032-01-02'},
+])
+def test_bad_ranges_are_rejected(client, pair, params):
+  assert client.get('/venues/{}/calendar'.format(pair[0]), query_string=params).status_code == 400
+
+def test_unknown_entities_are_404(client, empty_db):
+  assert client.get('/venues/1/calendar?month=2031-06').status_code == 404
+  assert client.get('/artists/1/calendar?month=2031-06').status_code == 404
@@ -0,0 +1,93 @@
+from datetime import datetime, timedelta, timezone
+import pytest
+import cache
+
+SOON = datetime.now(timezone.utc).replace(microsecond=0) + timedelta(days=30)
+
+PAGES = {
+  'venue 1': '/venues/1',
+  'venue 2': '/venues/2',
+  'venues': '/venues',
+  'artist at venue 1': '/artists/1',
+  'artist at venue 2': '/artists/2',
+  'shows': '/shows?format=json',
+}
+
+
+@pytest.fixture
+def page_cache(app, monkeypatch):
+  # conftest runs with the null backend; give this test a private LRU
+  page_cache = app.extensions['page_cache']
+  monkeypatch.setattr(page_cache, 'backend', cache.MemoryBackend(64))
+  monkeypatch.setattr(page_cache, 'hits', 0)
+  monkeypatch.setattr(page_cache, 'misses', 0)
+  return page_cache
+
+def _cached(client, page_cache):
+  # which pages would be served from the cache right now
+  hits = {}
+  for name, url in PAGES.items():
+    before = page_cache.hits
+    assert client.get(url).status_code == 200
+    hits[name] = page_cache.hits > before
+  return hits
+
+def _edit_venue(app, venue_id, **fields):
+  data = {'name': 'Edited', 'city': 'San Francisco', 'state': 'CA', 'address': '1 Main St',
+          'phone': '123-123-1234', 'facebook_link': '', 'image_link': '', 'website': '',
+          'seeking_description': '', 'genres': ['Jazz']}
+  data.update(fields)
+  # a separate client, so the success flash does not bypass the cache for
+  # the client that reads the pages back
+  response = app.test_client().post('/venues/{}/edit'.format(venue_id), data=data)
+  assert response.status_code == 302
+
+def test_memory_backend_invalidates_by_tag_and_evicts_lru():
+  backend = cache.MemoryBackend(max_entries=2)
+  backend.set('a', 'A', {'venue:1'}, 60)
+  backend.set('b', 'B', {'venue:2', 'venues'}, 60)
+  backend.invalidate(['venue:2'])
+  assert (backend.get('a'), backend.get('b')) == ('A', None)
+  backend.set('c', 'C', {'venues'}, 60)
+  backend.get('a')
+  backend.set('d', 'D', set(), 60)
+  # 'c' was the least recently used
+  assert (backend.get('a'), backend.get('c'), backend.get('d')) == ('A', None, 'D')
+
+def test_editing_a_venue_evicts_only_the_pages_built_from_it(app, client, make, page_cache):
+  venues = [make.venue(genres=['Jazz']), make.venue(genres=['Jazz'])]
+  artists = [make.artist(genres=['Jazz']), make.artist(genres=['Jazz'])]
+  for venue, artist in zip(venues, artists):
+    make.show(venue, artist, SOON)
+
+  assert not any(_cached(client, page_cache).values())
+  assert all(_cached(client, page_cache).values())
+
+  _edit_venue(app, venues[0])
+  assert _cached(client, page_cache) == {
+    'venue 1': False,
+    'venue 2': True,
+    'venues': False,
+    'artist at venue 1': False,
+    'artist at venue 2': True,
+    'shows': False,
+  }
+  # the edit shows up on the re-rendered pages
+  assert b'Edited' in client.get('/venues/1').data
+  assert b'Edited' in client.get('/artists/1').data
+
+def test_stats_count_hits_and_misses(app, client, make, page_cache):
+  make.venue()
+  client.get('/venues')
+  client.get('/venues')
+  client.get('/venues/1')
+  # a different query string is a different page
+  client.get('/venues?page=2')
+  client.get('/venues/1')
+  # pages rendered while a flash is pending are neither looked up nor counted
+  with client.session_transaction() as session:
+    session['_flashes'] = [('message', 'hello')]
+  client.get('/venues')
+  assert client.get('/cache/stats').get_json() == {
+    'backend': 'MemoryBackend', 'hits': 2, 'misses': 3, 'hit_ratio': 0.4,
+  }
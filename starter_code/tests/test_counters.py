@@ -0,0 +1,84 @@
+import threading
+from datetime import datetime, timedelta, timezone
+import counters
+from models import db, Venue, Artist, Show
+
+T0 = datetime(2031, 6, 1, 12, 0, tzinfo=timezone.utc)
+HOUR = timedelta(hours=1)
+
+
+def _counts(app, venue_id, artist_id):
+  with app.app_context():
+    venue, artist = db.session.get(Venue, venue_id), db.session.get(Artist, artist_id)
+    return ((venue.upcoming_shows_count, venue.past_shows_count),
+            (artist.upcoming_shows_count, artist.past_shows_count))
+
+def _book(venue_id, artist_id, start_time):
+  # what create_show_submission() does, short of committing
+  db.session.add(Show(venue_id=venue_id, artist_id=artist_id, start_time=start_time, end_time=start_time + HOUR))
+  counters.record_show(venue_id, artist_id, start_time)
+
+def _recounted(app, venue_id, artist_id, now):
+  with app.app_context():
+    counters.rebuild(now)
+  return _counts(app, venue_id, artist_id)
+
+def test_roll_moves_started_shows_to_past(app, make):
+  venue, artist = make.venue(), make.artist()
+  with app.app_context():
+    counters.rebuild(T0)
+    for hours in (1, 3, 5):
+      _book(venue, artist, T0 + hours * HOUR)
+    db.session.commit()
+  assert _counts(app, venue, artist) == ((3, 0), (3, 0))
+  with app.app_context():
+    assert counters.roll(T0 + 4 * HOUR) == 2
+    # rolling to an earlier instant moves nothing back
+    assert counters.roll(T0 + 2 * HOUR) == 0
+  assert _counts(app, venue, artist) == ((1, 2), (1, 2))
+  # a show booked after the roll is classified against the new watermark
+  with app.app_context():
+    _book(venue, artist, T0 + 2 * HOUR)
+    db.session.commit()
+  assert _counts(app, venue, artist) == ((1, 3), (1, 3))
+  assert _recounted(app, venue, artist, T0 + 4 * HOUR) == ((1, 3), (1, 3))
+
+def test_record_during_roll_is_counted_once(app, make):
+  # A show is recorded as upcoming, and a roll past its start begins before
+  # the recording transaction commits: the roll must wait for it and move
+  # the show, or the show stays upcoming forever.
+  venue, artist = make.venue(), make.artist()
+  with app.app_context():
+    counters.rebuild(T0)
+  recorded, commit, errors = threading.Event(), threading.Event(), []
+
+  def book():
+    try:
+      with app.app_context():
+        _book(venue, artist, T0 + HOUR)
+        recorded.set()
+        commit.wait(5)
+        db.session.commit()
+    except Exception as e:
+      errors.append(e)
+      recorded.set()
+
+  def roll():
+    try:
+      with app.app_context():
+        counters.roll(T0 + 2 * HOUR)
+    except Exception as e:
+      errors.append(e)
+
+  writer = threading.Thread(target=book)
+  writer.start()
+  assert recorded.wait(5)
+  roller = threading.Thread(target=roll)
+  roller.start()
+  roller.join(0.3)
+  commit.set()
+  writer.join(5)
+  roller.join(5)
+  assert errors == []
+  assert _counts(app, venue, artist) == ((0, 1), (0, 1))
+  assert _recounted(app, venue, artist, T0 + 2 * HOUR) == ((0, 1), (0, 1))
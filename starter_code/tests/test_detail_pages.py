@@ -0,0 +1,19 @@
+import repository
+from models import Venue, Artist
+
+
+def test_page_fields_are_the_mapped_columns(app, seed):
+  # The session path returns the same keys as the async path's rows, with
+  # no ORM state (_sa_instance_state, loaded relationships) mixed in.
+  seed(5)
+  with app.app_context():
+    for model, page in ((Venue, repository.venue_page), (Artist, repository.artist_page)):
+      fields = page(1)[0]
+      expected = {column.key for column in repository._detail_columns(model)}
+      assert set(fields) == expected
+      assert fields['id'] == 1
+
+def test_detail_pages_render(client, seed):
+  seed(5)
+  assert client.get('/venues/1').status_code == 200
+  assert client.get('/artists/1').status_code == 200
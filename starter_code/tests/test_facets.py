@@ -0,0 +1,45 @@
+import threading
+import facets
+from facets import FacetIndex
+
+
+def test_full_reload_builds_outside_the_lock(app, seed, monkeypatch):
+  # While one request reloads the whole index, commits can still mark
+  # changes and the lock stays free for lookups.
+  seed(20)
+  index = FacetIndex(facets.venues.kind)
+  load = index.kind.load
+  loading, release = threading.Event(), threading.Event()
+  def slow_load(ids=None):
+    if ids is None:
+      loading.set()
+      release.wait(5)
+    return load(ids)
+  monkeypatch.setattr(index.kind, 'load', slow_load)
+
+  results = []
+  def browse():
+    with app.app_context():
+      results.append(index.browse({}, limit=100))
+  reader = threading.Thread(target=browse)
+  reader.start()
+  assert loading.wait(5)
+  try:
+    assert index._lock.acquire(timeout=1)
+    index._lock.release()
+    index.changed([1])
+  finally:
+    release.set()
+    reader.join(5)
+  assert len(results[0]['results']) == 20
+
+def test_changes_are_patched_in(app, seed):
+  from models import db, Venue
+  seed(20)
+  index = FacetIndex(facets.venues.kind)
+  with app.app_context():
+    assert index.browse({}, limit=100)['total'] == 20
+    db.session.get(Venue, 3).state = 'ZZ'
+    db.session.commit()
+    index.changed([3])
+    assert [venue['id'] for venue in index.browse({'state': ['ZZ']})['results']] == [3]
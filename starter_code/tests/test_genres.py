@@ -0,0 +1,21 @@
+from models import db, Venue
+
+
+def _venue_form(name, genres):
+  return {"name": name, "city": 'Austin', "state": 'TX', "address": '1 Main St', "phone": '555-0100',
+          "image_link": '', "facebook_link": '', "website": '', "seeking_description": '',
+          "genres": genres}
+
+def _venue_genres(app, name):
+  with app.app_context():
+    venue = db.session.query(Venue).filter_by(name=name).first()
+    return venue and sorted(genre.name for genre in venue.genres)
+
+def test_form_genres_resolve_on_an_unseeded_database(app, client, empty_db):
+  client.post('/venues/create', data=_venue_form('Blue Hall', ['Jazz', 'Blues']))
+  assert _venue_genres(app, 'Blue Hall') == ['Blues', 'Jazz']
+
+def test_unknown_genre_is_an_error_not_dropped(app, client, empty_db):
+  response = client.post('/venues/create', data=_venue_form('Odd Hall', ['Jazz', 'Polka Fusion']))
+  assert b'could not be listed' in response.data
+  assert _venue_genres(app, 'Odd Hall') is None
@@ -0,0 +1,90 @@
+import json
+from datetime import datetime, timedelta, timezone
+import pytest
+import genres
+from models import db, Venue, Artist, Show
+
+SOON = (datetime.now(timezone.utc) + timedelta(days=10)).replace(hour=20, minute=0, second=0, microsecond=0)
+LINKS = 'http://example.com/image.png,http://facebook.com/x,http://example.com'
+
+
+@pytest.fixture
+def genre_table(app, empty_db):
+  with app.app_context():
+    genres.registry.seed()
+
+def _import(app, tmp_path, kind, filename, content, *options):
+  path = tmp_path / filename
+  path.write_text(content)
+  errors = tmp_path / 'rejected.ndjson'
+  result = app.test_cli_runner().invoke(args=['import', kind, str(path), '--errors', str(errors)] + list(options))
+  assert result.exit_code == 0, result.output
+  rejected = [json.loads(line) for line in errors.read_text().splitlines()]
+  return result.output.strip(), dict((entry['line'], entry['error']) for entry in rejected)
+
+def _time(value):
+  return value.strftime('%Y-%m-%d %H:%M:%S')
+
+def test_csv_venues_are_validated_like_the_form(app, tmp_path, genre_table):
+  output, rejected = _import(app, tmp_path, 'venues', 'venues.csv', '\n'.join([
+    'name,city,state,address,phone,image_link,facebook_link,website_link,genres,seeking_talent',
+    'The Musical Hop,San Francisco,CA,1015 Folsom Street,123-123-1234,' + LINKS + ',Jazz;Reggae,yes',
+    'X,San Francisco,CA,1015 Folsom Street,123-123-1234,' + LINKS + ',Jazz,no',
+    'Bad State,San Francisco,ZZ,1015 Folsom Street,123-123-1234,' + LINKS + ',Jazz,no',
+    'No Genres,San Francisco,CA,1015 Folsom Street,123-123-1234,' + LINKS + ',,no',
+    'Park Square,San Francisco,CA,34 Whiskey Moore Ave,415-000-1234,' + LINKS + ',Rock n Roll,no',
+  ]) + '\n')
+  assert output == 'Imported 2 venues, rejected 3 row(s).'
+  # line numbers count the header
+  assert sorted(rejected) == [3, 4, 5]
+  assert 'name: Name is too short.' in rejected[3]
+  assert rejected[4].startswith('state:')
+  assert rejected[5].startswith('genres:')
+  with app.app_context():
+    venues = dict((venue.name, venue) for venue in Venue.query)
+    assert sorted(venues) == ['Park Square', 'The Musical Hop']
+    assert sorted(genre.name for genre in venues['The Musical Hop'].genres) == ['Jazz', 'Reggae']
+    assert venues['The Musical Hop'].seeking_talent is True
+    assert venues['Park Square'].seeking_talent is False
+
+def test_ndjson_artists_in_chunks_skip_malformed_lines(app, tmp_path, genre_table):
+  artist = {'city': 'San Francisco', 'state': 'CA', 'phone': '3261235000', 'genres': ['Rock n Roll'],
+            'image_link': 'http://example.com/a.png', 'facebook_link': 'http://facebook.com/a',
+            'website_link': 'http://example.com'}
+  lines = [json.dumps(dict(artist, name='Artist {}'.format(n))) for n in range(5)]
+  lines[1:1] = ['{"name": ', '["not", "an", "object"]', '', json.dumps(dict(artist, name='Short', phone='123'))]
+  output, rejected = _import(app, tmp_path, 'artists', 'artists.ndjson', '\n'.join(lines) + '\n', '--chunk-size', '2')
+  assert output == 'Imported 5 artists, rejected 3 row(s).'
+  assert rejected[2].startswith('invalid JSON')
+  assert rejected[3] == 'expected a JSON object'
+  assert rejected[5].startswith('phone:')
+  with app.app_context():
+    assert sorted(artist.name for artist in Artist.query) == ['Artist {}'.format(n) for n in range(5)]
+
+def test_shows_are_checked_for_rows_and_double_bookings(app, tmp_path, make):
+  venue, artist, other = make.venue(), make.artist(), make.artist()
+  make.show(venue, other, SOON)
+  rows = [
+    (venue, artist, SOON + timedelta(hours=4), ''),                           # 2: ok
+    (venue, other, SOON + timedelta(hours=5), ''),                            # 3: same venue, overlaps line 2
+    (venue, artist, SOON + timedelta(hours=1), ''),                           # 4: overlaps the existing show
+    (99, artist, SOON + timedelta(days=1), ''),                               # 5: no such venue
+    (venue, artist, SOON + timedelta(days=1), _time(SOON)),                   # 6: ends before it starts
+    ('x', artist, SOON + timedelta(days=2), ''),                              # 7: not an integer
+    (venue, artist, SOON - timedelta(days=20), _time(SOON - timedelta(days=20, hours=-3))),  # 8: ok, past
+  ]
+  content = 'venue_id,artist_id,start_time,end_time\n' + ''.join(
+    '{},{},{},{}\n'.format(venue_id, artist_id, _time(start), end) for venue_id, artist_id, start, end in rows)
+  output, rejected = _import(app, tmp_path, 'shows', 'shows.csv', content)
+  assert output == 'Imported 2 shows, rejected 5 row(s).'
+  assert sorted(rejected) == [3, 4, 5, 6, 7]
+  assert rejected[3].startswith('overlaps line 2:')
+  assert rejected[4].startswith('overlaps show 1:')
+  assert rejected[5] == 'venue_id: no venue 99'
+  assert rejected[6] == 'end_time must be after start_time'
+  assert rejected[7] == 'venue_id and artist_id must be integers'
+  with app.app_context():
+    assert Show.query.filter_by(artist_id=artist).count() == 2
+    # the counters were kept up to date by the import
+    venue_row = db.session.get(Venue, venue)
+    assert (venue_row.upcoming_shows_count, venue_row.past_shows_count) == (1, 1)
@@ -0,0 +1,103 @@
+from datetime import timedelta
+import pytest
+import jobs
+from models import db, Job, utcnow
+
+CALLS = []
+
+@jobs.task('tests.record', priority=jobs.HIGH)
+def record(value):
+  CALLS.append(value)
+
+@jobs.task('tests.fail', max_attempts=3)
+def fail():
+  raise RuntimeError('boom')
+
+
+@pytest.fixture
+def worker(app, empty_db):
+  del CALLS[:]
+  return jobs.Worker(app, concurrency=2, poll_interval=0.01, name='test-worker')
+
+def _jobs(app):
+  with app.app_context():
+    return db.session.query(Job).order_by(Job.id).all()
+
+def _enqueue(app, *args, **kwargs):
+  with app.app_context():
+    jobs.enqueue(*args, **kwargs)
+    db.session.commit()
+
+def test_claim_and_execute(app, worker):
+  _enqueue(app, 'tests.record', {"value": 1})
+  _enqueue(app, 'tests.record', {"value": 2}, delay=3600)
+  claimed = worker.claim(10)
+  assert [job.name for job in claimed] == ['tests.record']
+  # claimed jobs are running and aren't handed out twice
+  assert worker.claim(10) == []
+  assert worker.execute(claimed[0])
+  assert CALLS == [1]
+  done, later = _jobs(app)
+  assert (done.status, done.attempts, done.locked_by) == (jobs.DONE, 1, 'test-worker')
+  assert later.status == jobs.QUEUED
+
+def test_run_burst_takes_priority_order(app, worker):
+  _enqueue(app, 'tests.record', {"value": 'low'}, priority=jobs.LOW)
+  _enqueue(app, 'tests.record', {"value": 'high'})
+  jobs.Worker(app, concurrency=1, poll_interval=0.01).run(burst=True)
+  assert CALLS == ['high', 'low']
+
+def test_retry_with_backoff_then_fail(app, worker, monkeypatch):
+  monkeypatch.setitem(app.config, 'JOB_RETRY_SECONDS', 10)
+  monkeypatch.setitem(app.config, 'JOB_RETRY_MAX_SECONDS', 15)
+  _enqueue(app, 'tests.fail')
+  delays = []
+  for attempt in range(1, 4):
+    job, = worker.claim(10)
+    assert job.attempts == attempt
+    started = utcnow()
+    assert not worker.execute(job)
+    job, = _jobs(app)
+    assert 'RuntimeError: boom' in job.last_error
+    if attempt < 3:
+      assert job.status == jobs.QUEUED and job.locked_by is None
+      delays.append(round((job.run_at - started).total_seconds()))
+      # not due yet
+      assert worker.claim(10) == []
+      with app.app_context():
+        db.session.query(Job).update({"run_at": utcnow()})
+        db.session.commit()
+  assert delays == [10, 15]
+  assert job.status == jobs.FAILED and job.finished_at is not None
+  assert worker.claim(10) == []
+
+def test_idempotency_key_dedupes(app, worker):
+  _enqueue(app, 'tests.record', {"value": 1}, key='once')
+  _enqueue(app, 'tests.record', {"value": 2}, key='once')
+  _enqueue(app, 'tests.record', {"value": 3}, key='other')
+  assert [job.payload for job in _jobs(app)] == ['{"value": 1}', '{"value": 3}']
+
+def test_stale_claims_are_requeued(app, worker, monkeypatch):
+  monkeypatch.setitem(app.config, 'JOB_LOCK_TIMEOUT', 60)
+  _enqueue(app, 'tests.record', {"value": 1})
+  _enqueue(app, 'tests.fail')
+  lost = worker.claim(10)
+  assert len(lost) == 2
+  with app.app_context():
+    # the worker died an hour ago; the failing job has no attempts left
+    db.session.query(Job).update({"locked_at": utcnow() - timedelta(hours=1)})
+    db.session.query(Job).filter_by(name='tests.fail').update({"attempts": 3})
+    db.session.commit()
+  other = jobs.Worker(app, name='other-worker')
+  reclaimed = other.claim(10)
+  assert [(job.name, job.attempts) for job in reclaimed] == [('tests.record', 2)]
+  assert other.execute(reclaimed[0])
+  recorded, failed = _jobs(app)
+  assert (recorded.status, recorded.locked_by) == (jobs.DONE, 'other-worker')
+  assert (failed.status, failed.last_error) == (jobs.FAILED, 'worker lost')
+
+def test_eager_runs_inline(app, worker, monkeypatch):
+  monkeypatch.setitem(app.config, 'JOBS_EAGER', True)
+  _enqueue(app, 'tests.record', {"value": 1})
+  assert CALLS == [1]
+  assert _jobs(app) == []
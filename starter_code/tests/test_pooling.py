@@ -0,0 +1,61 @@
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import NullPool, QueuePool
+import config
+import pooling
+
+SETTINGS = dict(DB_POOL_SIZE=config.DB_POOL_SIZE, DB_MAX_OVERFLOW=config.DB_MAX_OVERFLOW,
+                DB_POOL_TIMEOUT=config.DB_POOL_TIMEOUT, DB_POOL_RECYCLE=config.DB_POOL_RECYCLE,
+                DB_POOL_PRE_PING=True, DB_STATEMENT_TIMEOUT_MS=5000, DB_PGBOUNCER=False)
+
+
+def _options(uri, **overrides):
+  return pooling.engine_options(dict(SETTINGS, SQLALCHEMY_DATABASE_URI=uri, **overrides))
+
+def test_heroku_style_urls_are_rewritten():
+  assert pooling.database_uri('postgres://u:p@host/db') == 'postgresql://u:p@host/db'
+  assert pooling.database_uri('postgresql+psycopg://host/db') == 'postgresql+psycopg://host/db'
+  assert pooling.database_uri('sqlite:///fyyur.db') == 'sqlite:///fyyur.db'
+
+def test_engine_options_per_backend():
+  assert _options('sqlite:///fyyur.db') == {}
+  assert _options('postgresql://host/db') == {
+    'pool_size': config.DB_POOL_SIZE, 'max_overflow': config.DB_MAX_OVERFLOW,
+    'pool_timeout': config.DB_POOL_TIMEOUT, 'pool_recycle': config.DB_POOL_RECYCLE,
+    'pool_pre_ping': True, 'connect_args': {'options': '-c statement_timeout=5000'},
+  }
+  assert 'connect_args' not in _options('postgresql://host/db', DB_STATEMENT_TIMEOUT_MS=0)
+  # behind PgBouncer: no pool of our own, the timeout is set per transaction
+  assert _options('postgresql+psycopg2://host/db', DB_PGBOUNCER=True) == {'poolclass': NullPool}
+  assert _options('postgresql+psycopg://host/db', DB_PGBOUNCER=True) == {
+    'poolclass': NullPool, 'connect_args': {'prepare_threshold': None}}
+
+def test_metrics_count_pool_events_and_utilization(tmp_path):
+  engine = create_engine('sqlite:///' + str(tmp_path / 'pool.db'), poolclass=QueuePool, pool_size=2, max_overflow=2)
+  metrics = pooling.PoolMetrics()
+  metrics.watch('default', engine)
+
+  first, second = engine.connect(), engine.connect()
+  first.execute(text('SELECT 1'))
+  stats = metrics.stats()['default']
+  assert stats['pool'] == 'QueuePool'
+  assert (stats['connects'], stats['checkouts'], stats['checkins']) == (2, 2, 0)
+  assert (stats['size'], stats['checkedout']) == (2, 2)
+  assert stats['utilization'] == 0.5
+
+  first.close()
+  second.invalidate()
+  second.close()
+  # the returned connection is reused, the invalidated one replaced
+  with engine.connect():
+    pass
+  stats = metrics.stats()['default']
+  assert (stats['checkouts'], stats['checkins'], stats['invalidations']) == (3, 3, 1)
+  assert (stats['checkedout'], stats['utilization']) == (0, 0.0)
+  engine.dispose()
+
+def test_pool_endpoint_reports_the_app_engines(client, empty_db):
+  before = client.get('/db/pool').get_json()['default']
+  client.get('/venues')
+  after = client.get('/db/pool').get_json()['default']
+  assert set(after) >= {'pool', 'connects', 'checkouts', 'checkins', 'invalidations'}
+  assert after['checkouts'] > before['checkouts']
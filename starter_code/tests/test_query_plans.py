@@ -0,0 +1,75 @@
+import re
+import pytest
+import repository
+from models import db, Genre
+from sqlalchemy import event
+
+# The hot read paths must reach their rows through the indexes declared in
+# models.py, not a full scan of the table: checked on a bench-scale dataset
+# with EXPLAIN QUERY PLAN on SQLite, or EXPLAIN on PostgreSQL (run the suite
+# with TEST_DATABASE_URL). Tiny tables such as Genre are scanned by the
+# PostgreSQL planner whatever their indexes, so there the plans are taken
+# with sequential scans priced out: a Seq Scan then means no index fits.
+
+BENCH_SCALE = 1000
+
+CASES = [
+  # (name, table, index, reads)
+  ('venue shows', 'Show', 'ix_Show_venue_id_start_time', lambda: repository.venue_shows(BENCH_SCALE // 2)),
+  ('artist shows', 'Show', 'ix_Show_artist_id_start_time', lambda: repository.artist_shows(BENCH_SCALE // 2)),
+  ('venues by area', 'Venue', 'ix_Venue_state_city', repository.venue_areas),
+  # the genre registry's lookup of names it hasn't cached yet
+  ('genres by name', 'Genre', 'ix_Genre_name', lambda: db.session.execute(
+    db.select(Genre.name, Genre.id).where(Genre.name.in_(['Jazz', 'Blues']))).all()),
+]
+
+
+@pytest.fixture(scope='module')
+def seeded(app):
+  import random
+  import bench
+  import genres
+  with app.app_context():
+    bench.seed(BENCH_SCALE, random.Random(0))
+    if db.engine.dialect.name == 'postgresql':
+      with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+        connection.exec_driver_sql('VACUUM ANALYZE')
+  genres.registry.invalidate()
+  return app
+
+def _plans(reads):
+  # (statement, plan lines) for every SELECT `reads` issues
+  captured = []
+  def capture(conn, cursor, statement, parameters, context, executemany):
+    if statement.lstrip().upper().startswith('SELECT'):
+      captured.append((statement, parameters))
+  event.listen(db.engine, 'before_cursor_execute', capture)
+  try:
+    reads()
+  finally:
+    event.remove(db.engine, 'before_cursor_execute', capture)
+  postgresql = db.engine.dialect.name == 'postgresql'
+  plans = []
+  with db.engine.connect() as connection:
+    if postgresql:
+      # rolled back with the connection's transaction
+      connection.exec_driver_sql('SET LOCAL enable_seqscan = off')
+    for statement, parameters in captured:
+      rows = connection.exec_driver_sql(('EXPLAIN ' if postgresql else 'EXPLAIN QUERY PLAN ') + statement, parameters)
+      plans.append((statement, [row[0] if postgresql else row[-1] for row in rows]))
+  return plans
+
+def _full_scan(table, line):
+  return (re.search(r'Seq Scan on "?{}"?\b'.format(table), line) or
+          (re.match(r'SCAN "?{}"?\b'.format(table), line.strip()) and 'INDEX' not in line))
+
+@pytest.mark.parametrize('name, table, index, reads', CASES, ids=[case[0] for case in CASES])
+def test_hot_reads_use_their_index(seeded, name, table, index, reads):
+  with seeded.app_context():
+    plans = _plans(reads)
+  assert plans
+  for statement, plan in plans:
+    described = '{}\n  {}'.format(' '.join(statement.split()), '\n  '.join(plan))
+    assert any(index in line for line in plan), described
+    assert not any(_full_scan(table, line) for line in plan), described
+    assert not any('TEMP B-TREE' in line for line in plan), described
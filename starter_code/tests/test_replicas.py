@@ -0,0 +1,81 @@
+import os
+import pytest
+from flask import Flask
+from flask_sqlalchemy import SQLAlchemy
+import replicas
+import sqlstats
+from asyncdb import AsyncDB
+from models import Venue
+
+# Two local SQLite files stand in for the primary and its replica. Nothing
+# replicates between them, and they hold different names for venue 1, so
+# each response shows which database served it. The app gets its own
+# SQLAlchemy, configured like models.db, so its replica bind doesn't leak
+# into the other tests.
+
+db = SQLAlchemy(session_options={'class_': replicas.RoutingSession})
+
+VENUE = {"id": 1, "city": 'Austin', "state": 'TX', "address": '1 Main St', "phone": '555-0100',
+         "seeking_talent": False, "version": 1}
+
+
+@pytest.fixture
+def replicated(tmp_path):
+  app = Flask(__name__)
+  app.config.update(
+    SECRET_KEY='test', TESTING=True, ASYNC_QUERIES=True,
+    SQLALCHEMY_DATABASE_URI='sqlite:///' + os.path.join(tmp_path, 'primary.db'),
+    SQLALCHEMY_REPLICA_URIS=['sqlite:///' + os.path.join(tmp_path, 'replica.db')])
+  replicas.configure(app)
+  db.init_app(app)
+  replicas.ReplicaRouter(app)
+  async_db = AsyncDB(app)
+  sqlstats.SQLStats(app)
+  venue_name = db.select(Venue.name).where(Venue.id == 1)
+
+  @app.route('/venue')
+  def read():
+    return db.session.execute(venue_name).scalar()
+
+  @app.route('/venue/async')
+  def read_async():
+    row, = async_db.gather(async_db.first(venue_name))
+    return row.name
+
+  @app.route('/venue', methods=['POST'])
+  def write():
+    db.session.get(Venue, 1).name = 'Renamed Hall'
+    db.session.commit()
+    return 'ok'
+
+  with app.app_context():
+    for key, name in ((None, 'Primary Hall'), ('replica_0', 'Replica Hall')):
+      engine = db.engines[key]
+      Venue.metadata.create_all(engine)
+      with engine.begin() as connection:
+        connection.execute(Venue.__table__.insert(), dict(VENUE, name=name))
+  yield app
+  async_db.close()
+
+def test_reads_go_to_the_replica(replicated):
+  assert replicated.test_client().get('/venue').text == 'Replica Hall'
+
+def test_a_write_pins_the_client_to_the_primary(replicated):
+  client = replicated.test_client()
+  assert client.post('/venue').text == 'ok'
+  assert client.get('/venue').text == 'Renamed Hall'
+  # a client that hasn't written still reads the (lagging) replica
+  assert replicated.test_client().get('/venue').text == 'Replica Hall'
+
+def test_async_reads_follow_the_session(replicated):
+  client = replicated.test_client()
+  assert client.get('/venue/async').text == 'Replica Hall'
+  client.post('/venue')
+  assert client.get('/venue/async').text == 'Renamed Hall'
+
+def test_async_reads_are_counted(replicated):
+  client = replicated.test_client()
+  with sqlstats.query_budget(1) as log:
+    response = client.get('/venue/async')
+  assert log.count == 1
+  assert 'desc="1 query"' in response.headers['Server-Timing']
@@ -0,0 +1,23 @@
+import reports
+from models import db, Artist, ReportGenreDay
+
+
+def _genre_rollups():
+  return sorted(db.session.execute(db.select(ReportGenreDay.day, ReportGenreDay.genre_id,
+                                             ReportGenreDay.shows, ReportGenreDay.minutes)).all())
+
+def test_artist_genre_edit_updates_the_genre_rollups(app, client, seed):
+  seed(20)
+  with app.app_context():
+    artist = db.session.get(Artist, 1)
+    before = sorted(genre.name for genre in artist.genres)
+    assert artist.shows
+  after = ['Reggae', 'Soul'] if before != ['Reggae', 'Soul'] else ['Folk']
+  client.post('/artists/1/edit', data={
+    "name": 'Renamed Band', "city": 'Austin', "state": 'TX', "phone": '5550100000', "facebook_link": '',
+    "image_link": '', "website": '', "seeking_venue": 'y', "seeking_description": '', "genres": after})
+  with app.app_context():
+    assert sorted(genre.name for genre in db.session.get(Artist, 1).genres) == after
+    incremental = _genre_rollups()
+    reports.rebuild()
+    assert incremental == _genre_rollups()
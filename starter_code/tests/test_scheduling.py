@@ -0,0 +1,85 @@
+from datetime import datetime, timedelta, timezone
+import pytest
+from sqlalchemy.exc import IntegrityError
+import scheduling
+from models import db, Show
+
+EIGHT_PM = datetime(2031, 6, 1, 20, 0, tzinfo=timezone.utc)
+HOUR = timedelta(hours=1)
+
+
+@pytest.fixture
+def booked(make):
+  # venue 1 / artist 1 booked 20:00-22:00; venue 2 and artist 2 are free
+  ids = {"venue": make.venue(), "other_venue": make.venue(),
+         "artist": make.artist(), "other_artist": make.artist()}
+  ids["show"] = make.show(ids["venue"], ids["artist"], EIGHT_PM)
+  return ids
+
+def _conflicts(app, venue_id, artist_id, start_time, end_time):
+  with app.app_context():
+    return [conflict['show_id'] for conflict in
+            scheduling.find_conflicts(venue_id, artist_id, start_time, end_time)]
+
+@pytest.mark.parametrize('start, end, clashes', [
+  (EIGHT_PM + HOUR, EIGHT_PM + 3 * HOUR, True),     # overlaps the end
+  (EIGHT_PM - HOUR, EIGHT_PM + HOUR, True),         # overlaps the start
+  (EIGHT_PM + HOUR / 2, EIGHT_PM + HOUR, True),     # inside it
+  (EIGHT_PM + 2 * HOUR, EIGHT_PM + 3 * HOUR, False),  # starts as it ends
+  (EIGHT_PM - 2 * HOUR, EIGHT_PM, False),           # ends as it starts
+])
+def test_same_venue_and_same_artist(app, booked, start, end, clashes):
+  expected = [booked["show"]] if clashes else []
+  assert _conflicts(app, booked["venue"], booked["other_artist"], start, end) == expected
+  assert _conflicts(app, booked["other_venue"], booked["artist"], start, end) == expected
+  assert _conflicts(app, booked["other_venue"], booked["other_artist"], start, end) == []
+
+def test_booking_index_overlap_and_touching():
+  index = scheduling.BookingIndex()
+  index.add({"venue_id": 1, "artist_id": 1, "start_time": EIGHT_PM, "end_time": EIGHT_PM + 2 * HOUR})
+  show = lambda venue_id, artist_id, start, hours: {
+    "venue_id": venue_id, "artist_id": artist_id, "start_time": start, "end_time": start + hours * HOUR}
+  assert len(index.conflicts(show(1, 2, EIGHT_PM + HOUR, 2))) == 1
+  assert len(index.conflicts(show(2, 1, EIGHT_PM - HOUR, 2))) == 1
+  # the same show in the way at the venue and for the artist counts once
+  assert len(index.conflicts(show(1, 1, EIGHT_PM, 1))) == 1
+  assert index.conflicts(show(1, 1, EIGHT_PM + 2 * HOUR, 1)) == []
+  assert index.conflicts(show(1, 1, EIGHT_PM - HOUR, 1)) == []
+
+def test_batch_conflicting_with_itself_and_the_database(app, booked):
+  row = lambda venue_id, artist_id, start: {
+    "venue_id": venue_id, "artist_id": artist_id, "start_time": start, "end_time": start + 2 * HOUR}
+  tomorrow = EIGHT_PM + 24 * HOUR
+  rows = [
+    (1, row(booked["other_venue"], booked["other_artist"], tomorrow)),
+    (2, row(booked["other_venue"], booked["artist"], tomorrow + HOUR)),          # clashes with line 1
+    (3, row(booked["other_venue"], booked["other_artist"], tomorrow + 2 * HOUR)),  # right after line 1
+    (4, row(booked["other_venue"], booked["artist"], EIGHT_PM + HOUR)),         # clashes with the stored show
+  ]
+  with app.app_context():
+    accepted, rejected = scheduling.check_batch(rows)
+  assert [line_no for line_no, _ in accepted] == [1, 3]
+  assert [(line_no, [conflict.get('line') or conflict['show_id'] for conflict in conflicts])
+          for line_no, conflicts in rejected] == [(2, [1]), (4, [booked["show"]])]
+
+def test_posting_a_clashing_show_is_a_409(app, client, booked):
+  def post(venue_id, artist_id, start):
+    return client.post('/shows/create', data={"venue_id": str(venue_id), "artist_id": str(artist_id),
+                                              "start_time": start.isoformat()})
+  response = post(booked["venue"], booked["other_artist"], EIGHT_PM + HOUR)
+  assert response.status_code == 409
+  assert b'could not be listed: it overlaps' in response.data
+  assert post(booked["venue"], booked["other_artist"], EIGHT_PM + 2 * HOUR).status_code == 200
+  with app.app_context():
+    assert db.session.query(Show).count() == 2
+
+def test_exclusion_constraint_rejects_overlaps(app, booked):
+  with app.app_context():
+    if db.engine.dialect.name != 'postgresql':
+      pytest.skip('the exclusion constraints exist on PostgreSQL only')
+    db.session.add(Show(venue_id=booked["venue"], artist_id=booked["other_artist"],
+                        start_time=EIGHT_PM + HOUR, end_time=EIGHT_PM + 3 * HOUR))
+    with pytest.raises(IntegrityError) as error:
+      db.session.commit()
+    db.session.rollback()
+    assert scheduling.is_conflict_error(error.value)
@@ -0,0 +1,67 @@
+from datetime import datetime, timedelta, timezone
+import counters
+import search
+from models import db, Venue
+
+SOON = datetime.now(timezone.utc) + timedelta(days=10)
+
+
+def _names(result):
+  return [hit['name'] for hit in result['data']]
+
+def test_matches_name_genres_and_location(app, make):
+  make.venue(name='The Musical Hop', city='San Francisco', state='CA', genres=['Jazz', 'Reggae'])
+  make.venue(name='Park Square Live Music & Coffee', city='San Francisco', state='CA', genres=['Rock n Roll'])
+  make.venue(name='The Dueling Pianos Bar', city='New York', state='NY', genres=['Classical'])
+  with app.app_context():
+    assert sorted(_names(search.search_venues('music'))) == ['Park Square Live Music & Coffee', 'The Musical Hop']
+    # genres and location are part of the document, every word must match
+    assert _names(search.search_venues('jazz')) == ['The Musical Hop']
+    assert _names(search.search_venues('new york')) == ['The Dueling Pianos Bar']
+    assert _names(search.search_venues('francisco rock')) == ['Park Square Live Music & Coffee']
+    assert _names(search.search_venues('pianos jazz')) == []
+
+def test_ranks_exact_then_leading_name_matches_first(app, make):
+  for name in ('Blue Note Jazz Club', 'Blue', 'Bluegrass Barn', 'The Blue Room'):
+    make.artist(name=name)
+  with app.app_context():
+    names = _names(search.search_artists('blue'))
+  assert names[0] == 'Blue'
+  assert set(names) == {'Blue', 'Blue Note Jazz Club', 'Bluegrass Barn', 'The Blue Room'}
+  assert names.index('Bluegrass Barn') < names.index('The Blue Room')
+
+def test_count_covers_every_match_past_the_limit(app, make):
+  for n in range(7):
+    make.venue(name='Hall {}'.format(n))
+  make.venue(name='Elsewhere')
+  with app.app_context():
+    result = search.search_venues('hall', limit=3)
+    assert result['count'] == 7
+    assert len(result['data']) == 3
+    # an empty term lists everything; a term with no words too
+    assert search.search_venues('')['count'] == 8
+    assert search.search_venues('  %- ')['count'] == 8
+    assert search.search_venues('zzz') == {"count": 0, "data": []}
+
+def test_like_wildcards_are_matched_literally(app, make):
+  make.venue(name='snake_case Lounge')
+  make.venue(name='snakecase Lounge')
+  with app.app_context():
+    # "_" is a word character, so it reaches both LIKE patterns
+    assert _names(search.search_venues('snake_')) == ['snake_case Lounge']
+
+def test_hits_carry_upcoming_show_counts_and_follow_edits(app, client, make):
+  venue, artist = make.venue(name='The Musical Hop'), make.artist()
+  make.show(venue, artist, SOON)
+  with app.app_context():
+    counters.rebuild()
+    assert search.search_venues('musical')['data'] == [
+      {"id": venue, "name": "The Musical Hop", "num_upcoming_shows": 1}]
+    # the search document follows a rename made through the ORM
+    db.session.get(Venue, venue).name = 'The Harmonic Hop'
+    db.session.commit()
+    assert search.search_venues('musical')['count'] == 0
+    assert _names(search.search_venues('harmonic')) == ['The Harmonic Hop']
+  page = client.post('/venues/search', data={'search_term': 'harmonic'})
+  assert page.status_code == 200
+  assert b'The Harmonic Hop' in page.data
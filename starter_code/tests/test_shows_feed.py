@@ -0,0 +1,65 @@
+from datetime import datetime, timedelta, timezone
+import repository
+
+SOON = datetime.now(timezone.utc).replace(microsecond=0) + timedelta(days=10)
+HOUR = timedelta(hours=1)
+
+
+def _book(make, hours):
+  # one show per entry of `hours` (offsets from SOON), each with its own
+  # venue and artist so equal start times don't clash; returns the ids
+  return [make.show(make.venue(), make.artist(), SOON + offset * HOUR) for offset in hours]
+
+def _walk(client, limit, **params):
+  # every page of the JSON feed: (ids per page, cursors followed)
+  pages, cursors, after = [], [], None
+  while True:
+    query = dict(params, format='json', limit=limit)
+    if after:
+      query['after'] = after
+    response = client.get('/shows', query_string=query)
+    assert response.status_code == 200
+    body = response.get_json()
+    pages.append([show['show_id'] for show in body['shows']])
+    after = body['next']
+    if after is None:
+      return pages, cursors
+    cursors.append(after)
+
+def test_feed_pages_through_every_upcoming_show_once(client, make):
+  # three shows share a start time: the id breaks the tie
+  ids = _book(make, [3, 1, 2, 2, 2, 4, 0])
+  make.show(make.venue(), make.artist(), SOON - timedelta(days=20))
+  pages, cursors = _walk(client, 2)
+  expected = [ids[6], ids[1], ids[2], ids[3], ids[4], ids[0], ids[5]]
+  assert pages == [expected[0:2], expected[2:4], expected[4:6], expected[6:]]
+  assert len(cursors) == 3
+  # a page that ends exactly at the last show has no next cursor
+  assert _walk(client, 7) == ([expected], [])
+
+def test_cursor_is_stable_when_earlier_shows_are_added(client, make):
+  ids = _book(make, [1, 2, 3, 4])
+  first = client.get('/shows?format=json&limit=2').get_json()
+  assert [show['show_id'] for show in first['shows']] == ids[:2]
+  # an OFFSET would now repeat ids[1]; the keyset carries on where it was
+  _book(make, [0])
+  after = client.get('/shows', query_string={'format': 'json', 'limit': 2, 'after': first['next']}).get_json()
+  assert [show['show_id'] for show in after['shows']] == ids[2:]
+  assert after['next'] is None
+
+def test_cursor_round_trip_and_malformed_cursors(client, make):
+  start_time = SOON + timedelta(microseconds=250)
+  cursor = repository.encode_show_cursor(start_time, 42)
+  assert repository.decode_show_cursor(cursor) == (start_time, 42)
+  _book(make, [1])
+  for bad in ('not-a-cursor', 'W10', repository.encode_show_cursor(SOON, 1)[:-3]):
+    assert client.get('/shows', query_string={'format': 'json', 'after': bad}).status_code == 400
+
+def test_page_size_is_capped(app, client, make, monkeypatch):
+  monkeypatch.setitem(app.config, 'SHOWS_PAGE_SIZE_MAX', 3)
+  _book(make, range(5))
+  body = client.get('/shows?format=json&limit=100').get_json()
+  assert len(body['shows']) == 3
+  assert body['next'] is not None
+  # and a limit below one still returns a page
+  assert len(client.get('/shows?format=json&limit=0').get_json()['shows']) == 1
@@ -0,0 +1,74 @@
+import json
+import logging
+import re
+import pytest
+from flask import Flask, jsonify
+from sqlalchemy import create_engine, text
+import sqlstats
+from sqlstats import QueryBudgetExceeded, query_budget, statement_shape
+
+
+def test_statement_shape_collapses_whitespace_and_in_lists():
+  assert statement_shape('SELECT a\n  FROM t WHERE id IN (?, ?, ?)') == 'SELECT a FROM t WHERE id IN (...)'
+  assert statement_shape('SELECT a FROM t WHERE id IN (?)') == 'SELECT a FROM t WHERE id IN (?)'
+  assert statement_shape('WHERE id IN (%(id_1)s, %(id_2)s)') == statement_shape('WHERE id IN (:id_1,:id_2)')
+
+def test_query_budget_counts_this_threads_statements():
+  engine = create_engine('sqlite://')
+  with engine.connect() as connection:
+    with query_budget(3) as outer:
+      connection.execute(text('SELECT 1'))
+      with query_budget(1) as inner:
+        connection.execute(text('SELECT 2'))
+      connection.execute(text('SELECT 3'))
+    assert (outer.count, inner.count) == (3, 1)
+    assert [statement for statement, _ in inner.statements] == ['SELECT 2']
+    with pytest.raises(QueryBudgetExceeded, match=r'2 queries issued, budget is 1:\n  SELECT 1\n  SELECT 2'):
+      with query_budget(1):
+        connection.execute(text('SELECT 1'))
+        connection.execute(text('SELECT 2'))
+  # a failed statement is not recorded and doesn't upset the next timing
+  with engine.connect() as connection, query_budget(1) as log:
+    with pytest.raises(Exception):
+      connection.execute(text('SELECT * FROM missing'))
+    connection.execute(text('SELECT 1'))
+  assert [statement for statement, _ in log.statements] == ['SELECT 1']
+
+def test_responses_carry_server_timing(client, make):
+  make.venue()
+  with query_budget(10) as log:
+    response = client.get('/venues/1')
+  match = re.fullmatch(r'db;dur=(\d+\.\d);desc="(\d+) quer(y|ies)"', response.headers['Server-Timing'])
+  assert match is not None
+  assert int(match.group(2)) == log.count
+
+def test_endpoint_over_its_budget_fails_under_testing(app, client, make, monkeypatch):
+  make.venue()
+  monkeypatch.setitem(app.config, 'SQL_QUERY_BUDGETS', {'show_venue': 0})
+  with pytest.raises(QueryBudgetExceeded, match=r'GET /venues/1 issued \d+ queries, budget is 0'):
+    client.get('/venues/1')
+  monkeypatch.setattr(app, 'testing', False)
+  assert client.get('/venues/1').status_code == 200
+
+def test_repeated_statements_are_logged_as_n_plus_one(caplog):
+  engine = create_engine('sqlite://')
+  app = Flask('sqlstats_n_plus_one')
+  app.config.update(SQL_N_PLUS_ONE_THRESHOLD=3, SQL_QUERY_BUDGETS={'lookups': 10})
+  sqlstats.SQLStats(app)
+
+  @app.route('/lookups/<int:n>')
+  def lookups(n):
+    with engine.connect() as connection:
+      for value in range(n):
+        connection.execute(text('SELECT :value'), {'value': value})
+    return jsonify(n)
+
+  client = app.test_client()
+  with caplog.at_level(logging.INFO, logger=app.logger.name):
+    client.get('/lookups/2')
+    client.get('/lookups/3')
+  (fine, repeated) = [(record.levelname, json.loads(record.getMessage())) for record in caplog.records]
+  assert fine[0] == 'INFO' and 'n_plus_one' not in fine[1]
+  assert fine[1]['queries'] == 2 and fine[1]['budget'] == 10
+  assert repeated[0] == 'WARNING'
+  assert repeated[1]['n_plus_one'] == [{"count": 3, "sql": "SELECT ?"}]
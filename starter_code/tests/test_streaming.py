@@ -0,0 +1,74 @@
+import re
+from datetime import datetime, timedelta, timezone
+import pytest
+import cache
+import streaming
+
+SOON = datetime.now(timezone.utc).replace(microsecond=0) + timedelta(days=10)
+
+
+@pytest.fixture
+def streamed(app, monkeypatch):
+  monkeypatch.setitem(app.config, 'STREAM_TEMPLATES', True)
+  monkeypatch.setitem(app.config, 'STREAM_YIELD_PER', 2)
+  monkeypatch.setitem(app.config, 'STREAM_BUFFER_SIZE', 256)
+
+def test_chunks_pass_the_shell_then_buffer_rows():
+  rows = streaming._Rows(iter(range(3)))
+  def fragments():
+    yield 'head'
+    yield 'nav'
+    for row in rows:
+      yield 'row{} '.format(row) * 2
+    yield 'foot'
+  assert list(streaming._chunks(fragments(), [rows], 20)) == [
+    'head', 'nav', 'row0 row0 row1 row1 ', 'row2 row2 foot']
+
+def test_shell_is_sent_before_the_first_row_is_fetched(app):
+  fetched = []
+  def rows():
+    for n in range(3):
+      fetched.append(n)
+      yield {"id": n + 1, "name": 'Artist {}'.format(n + 1)}
+  with app.test_request_context('/artists'):
+    response = streaming.render('pages/artists.html', rows={'artists': rows()})
+    assert response.is_streamed
+    chunks = iter(response.response)
+    first = next(chunks)
+    assert first.startswith('<!doctype html>')
+    assert fetched == []
+    rest = ''.join(chunks)
+  assert fetched == [0, 1, 2]
+  assert 'Artist 3' in rest
+
+def test_streamed_artists_match_the_buffered_page(app, client, make, streamed, monkeypatch):
+  for n in range(7):
+    make.artist(name='Streamed Artist {}'.format(n))
+  response = client.get('/artists')
+  assert response.is_streamed
+  streamed_body = response.get_data(as_text=True)
+  monkeypatch.setitem(app.config, 'STREAM_TEMPLATES', False)
+  buffered_body = client.get('/artists').get_data(as_text=True)
+  names = lambda body: re.findall(r'Streamed Artist \d', body)
+  assert names(streamed_body) == names(buffered_body) == ['Streamed Artist {}'.format(n) for n in range(7)]
+
+def test_streamed_shows_page_links_the_next_cursor(client, make, streamed):
+  venue = make.venue()
+  for hours in range(5):
+    make.show(venue, make.artist(name='Headliner {}'.format(hours)), SOON + timedelta(hours=3 * hours))
+  body = client.get('/shows?limit=3').get_data(as_text=True)
+  assert re.findall(r'Headliner \d', body) == ['Headliner 0', 'Headliner 1', 'Headliner 2']
+  after = re.search(r'href="/shows\?after=([\w-]+)"', body).group(1)
+  body = client.get('/shows?limit=3&after=' + after).get_data(as_text=True)
+  assert re.findall(r'Headliner \d', body) == ['Headliner 3', 'Headliner 4']
+  assert 'More shows' not in body
+  # a malformed cursor fails before anything is streamed
+  assert client.get('/shows?after=nonsense').status_code == 400
+
+def test_streamed_pages_are_not_cached(app, client, make, streamed, monkeypatch):
+  page_cache = app.extensions['page_cache']
+  monkeypatch.setattr(page_cache, 'backend', cache.MemoryBackend(16))
+  make.artist()
+  client.get('/artists')
+  client.get('/artists')
+  assert page_cache.backend._entries == {}
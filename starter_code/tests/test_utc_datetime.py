@@ -0,0 +1,73 @@
+import importlib.util
+import io
+import os
+import subprocess
+import sys
+import types
+from datetime import datetime, timedelta, timezone
+from alembic import op
+from alembic.migration import MigrationContext
+from alembic.operations import Operations
+from sqlalchemy.dialects import postgresql, sqlite
+from models import db, Show, UTCDateTime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MIGRATION = os.path.join(ROOT, 'migrations', 'versions', '5f0b7c2d9a41_timezone_aware_show_times.py')
+BERLIN = timezone(timedelta(hours=2))
+
+
+def test_bind_values_are_utc_naive_only_without_zone_support():
+  column = UTCDateTime()
+  local = datetime(2031, 6, 1, 22, 30, tzinfo=BERLIN)
+  assert column.process_bind_param(local, postgresql.dialect()) == datetime(2031, 6, 1, 20, 30, tzinfo=timezone.utc)
+  assert column.process_bind_param(local, sqlite.dialect()) == datetime(2031, 6, 1, 20, 30)
+  # naive values are taken to be UTC already
+  assert column.process_bind_param(datetime(2031, 6, 1, 20, 30), sqlite.dialect()) == datetime(2031, 6, 1, 20, 30)
+  assert column.process_result_value(datetime(2031, 6, 1, 20, 30), sqlite.dialect()).tzinfo is timezone.utc
+  assert column.process_bind_param(None, sqlite.dialect()) is None
+
+def test_show_times_round_trip_as_aware_utc(app, make):
+  venue, artist = make.venue(), make.artist()
+  local = datetime(2031, 6, 1, 22, 30, tzinfo=BERLIN)
+  show = make.show(venue, artist, local)
+  with app.app_context():
+    stored = db.session.get(Show, show)
+    assert stored.start_time == local
+    assert stored.start_time.utcoffset() == timedelta(0)
+    assert stored.end_time - stored.start_time == timedelta(hours=2)
+    # comparisons bind the other zone's instant, not its wall clock
+    assert Show.query.filter(Show.start_time == local.astimezone(timezone(timedelta(hours=-7)))).count() == 1
+    assert Show.query.filter(Show.start_time > datetime(2031, 6, 1, 21, 0, tzinfo=timezone.utc)).count() == 0
+
+def _migration_sql(monkeypatch, step):
+  spec = importlib.util.spec_from_file_location('timezone_aware_show_times', MIGRATION)
+  migration = importlib.util.module_from_spec(spec)
+  spec.loader.exec_module(migration)
+  output = io.StringIO()
+  context = MigrationContext.configure(dialect_name='postgresql', opts={'as_sql': True, 'output_buffer': output})
+  with Operations.context(context):
+    # offline there is no connection; the migration only asks for the dialect
+    monkeypatch.setattr(op, 'get_bind', lambda: types.SimpleNamespace(dialect=context.dialect))
+    getattr(migration, step)()
+  return [line for line in output.getvalue().splitlines() if line.strip()]
+
+def test_migration_reinterprets_stored_values_as_utc_on_postgresql(monkeypatch):
+  assert _migration_sql(monkeypatch, 'upgrade') == [
+    'ALTER TABLE "Show" ALTER COLUMN start_time TYPE TIMESTAMP WITH TIME ZONE USING start_time AT TIME ZONE \'UTC\';',
+    'ALTER TABLE counter_state ALTER COLUMN rolled_until TYPE TIMESTAMP WITH TIME ZONE USING rolled_until AT TIME ZONE \'UTC\';',
+  ]
+  assert _migration_sql(monkeypatch, 'downgrade') == [
+    'ALTER TABLE "Show" ALTER COLUMN start_time TYPE TIMESTAMP WITHOUT TIME ZONE USING start_time AT TIME ZONE \'UTC\';',
+    'ALTER TABLE counter_state ALTER COLUMN rolled_until TYPE TIMESTAMP WITHOUT TIME ZONE USING rolled_until AT TIME ZONE \'UTC\';',
+  ]
+
+def test_migrations_upgrade_and_downgrade_across_it_on_sqlite(tmp_path):
+  env = dict(os.environ, DATABASE_URL='sqlite:///' + str(tmp_path / 'migrated.db'))
+  def flask_db(*args):
+    result = subprocess.run([sys.executable, '-m', 'flask', '--app', 'app', 'db'] + list(args),
+                            cwd=ROOT, env=env, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    return result.stderr
+  flask_db('upgrade')
+  assert 'Running downgrade 5f0b7c2d9a41 -> ad4768e1d91c' in flask_db('downgrade', 'ad4768e1d91c')
+  assert 'Running upgrade ad4768e1d91c -> 5f0b7c2d9a41' in flask_db('upgrade')
@@ -0,0 +1,15 @@
+import sqlstats
+
+
+def test_venues_listing_query_count_is_flat(client, seed):
+  # /venues reads the persisted upcoming show counters (see counters.py), so
+  # ten times the venues and shows still cost one query.
+  counts = []
+  for scale in (20, 200):
+    seed(scale)
+    with sqlstats.query_budget(1) as log:
+      response = client.get('/venues')
+    assert response.status_code == 200
+    assert response.data.count(b'href="/venues/') >= scale
+    counts.append(log.count)
+  assert counts == [1, 1]